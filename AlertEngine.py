@@ -0,0 +1,299 @@
+import asyncio, math, threading
+from collections import namedtuple
+
+from Alerter import Alerter, InProcessAlerter
+from Clock import wallClock
+
+
+# An alerting rule. "kind" is either "count", for which the rule is in "High" state while at least "threshold" matching events
+# occur within the last "winLenSecs" seconds, or "ratio", for which it is in "High" state while matching events make up at least
+# "threshold" of the events within the window (and there are at least "minNumEvents" of them). Events match if "statusClass"
+# is None, or if their status code is in that class (e.g. "5xx").
+AlertRule = namedtuple('AlertRule', ('name', 'statusClass', 'kind', 'threshold', 'winLenSecs', 'minNumEvents'))
+
+# A ratio rule stays in "Low" state while there are fewer events than this in its window, unless its spec says otherwise.
+RATIO_MIN_NUM_EVENTS = 10
+
+
+def parseRuleSpec(spec):
+    '''Returns the AlertRule described by the passed string "<statusClass>:<kind>:<threshold>:<winLenSecs>[:<minNumEvents>]",
+    e.g. "5xx:ratio:0.05:60" or "all:count:1000:10". The spec is also the name of the rule.'''
+
+    parts = spec.split(':')
+    if len(parts) not in (4, 5) or parts[1] not in ('count', 'ratio'):
+        raise ValueError('Invalid alert rule "%s": expected "<statusClass>:<count|ratio>:<threshold>:<winLenSecs>[:<minNumEvents>]"' % spec)
+    statusClass = None if parts[0] == 'all' else parts[0]
+    if statusClass is not None and (len(statusClass) != 3 or not statusClass[0].isdigit() or statusClass[1 :] != 'xx'):
+        raise ValueError('Invalid status class "%s" in alert rule "%s": expected e.g. "5xx" or "all"' % (parts[0], spec))
+    minNumEvents = int(parts[4]) if len(parts) == 5 else RATIO_MIN_NUM_EVENTS if parts[1] == 'ratio' else 1
+    return AlertRule(spec, statusClass, parts[1], float(parts[2]), float(parts[3]), minNumEvents)
+
+
+class RuleCounter:
+    '''Counts the events (and the matching events) of an AlertRule in a ring of fixed-width time buckets covering its window. Adding
+    an event takes O(1) amortized time, and memory depends on the window length only (not on the threshold or the number of events).'''
+
+    # Buckets are "Alerter.SAMPLING_DELAY_SECS" wide, unless the window would need more buckets than this.
+    MAX_NUM_BUCKETS = 3600
+
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.bucketSecs = max(Alerter.SAMPLING_DELAY_SECS, rule.winLenSecs / RuleCounter.MAX_NUM_BUCKETS)
+        numSlots = math.ceil(rule.winLenSecs / self.bucketSecs) + 2
+        self.bucketIds = [None] * numSlots  # The bucket ID (time divided by bucket width) each slot currently holds.
+        self.numEvents = [0] * numSlots
+        self.numMatches = [0] * numSlots
+        self.startId = None  # Buckets with smaller IDs are out of the window.
+        self.winNumEvents = self.winNumMatches = 0  # Totals over the buckets in the window.
+
+
+    def addEvents(self, tssSecs, statuses):
+        '''Adds events with the passed (non-decreasing) timestamps and status codes ("statuses" may be None if they are unknown).'''
+
+        # Consecutive events mostly fall into the same bucket, so we count them locally and add them to their bucket at once.
+        statusChar = None if self.rule.statusClass is None else self.rule.statusClass[0]
+        runId, runNumEvents, runNumMatches = None, 0, 0
+        for i, tsSecs in enumerate(tssSecs):
+            bucketId = math.floor(tsSecs / self.bucketSecs)
+            if bucketId != runId:
+                if runNumEvents > 0:
+                    self.addToBucket(runId, runNumEvents, runNumMatches)
+                runId, runNumEvents, runNumMatches = bucketId, 0, 0
+            runNumEvents += 1
+            if statusChar is None or (statuses is not None and statuses[i] is not None and statuses[i][0] == statusChar):
+                runNumMatches += 1
+        if runNumEvents > 0:
+            self.addToBucket(runId, runNumEvents, runNumMatches)
+
+
+    def addToBucket(self, bucketId, numEvents, numMatches):
+        '''Adds the passed numbers of events and matching events to the bucket with the passed ID.'''
+
+        numSlots = len(self.bucketIds)
+        if self.startId is None or bucketId >= self.startId + numSlots:
+            # Make room for the bucket.
+            self.advance(bucketId - numSlots + 1)
+        elif bucketId < self.startId:
+            # The events are already out of the window.
+            return
+
+        slot = bucketId % numSlots
+        if self.bucketIds[slot] != bucketId:
+            self.bucketIds[slot] = bucketId
+            self.numEvents[slot] = self.numMatches[slot] = 0
+        self.numEvents[slot] += numEvents
+        self.numMatches[slot] += numMatches
+        self.winNumEvents += numEvents
+        self.winNumMatches += numMatches
+
+
+    def advance(self, startId):
+        '''Drops the buckets with IDs smaller than "startId" from the window.'''
+
+        if self.startId is None:
+            self.startId = startId
+        numSlots = len(self.bucketIds)
+        for bucketId in range(self.startId, min(startId, self.startId + numSlots)):
+            slot = bucketId % numSlots
+            if self.bucketIds[slot] == bucketId:
+                self.winNumEvents -= self.numEvents[slot]
+                self.winNumMatches -= self.numMatches[slot]
+                self.bucketIds[slot] = None
+        self.startId = max(self.startId, startId)
+
+
+    def isHigh(self, currSecs):
+        '''Returns whether the rule holds for the window ending at the passed time.'''
+
+        # A bucket is in the window as long as any part of it is, so events may be counted up to one bucket width too long.
+        self.advance(math.floor((currSecs - self.rule.winLenSecs) / self.bucketSecs))
+        if self.rule.kind == 'count':
+            return self.winNumMatches >= self.rule.threshold
+        return self.winNumEvents >= max(self.rule.minNumEvents, 1) and self.winNumMatches >= self.rule.threshold * self.winNumEvents
+
+
+    def getDeadline(self, isHigh):
+        '''Returns the earliest time at which the rule may stop (or start) holding without any new events, or None if it cannot.
+        "isHigh" is the current state of the rule, as returned by the last call to "isHigh()".'''
+
+        if self.rule.kind == 'count' and not isHigh:
+            # The count only drops as time passes.
+            return None
+
+        numSlots, numMatchesLeft = len(self.bucketIds), self.winNumMatches
+        for bucketId in range(self.startId, self.startId + numSlots):
+            slot = bucketId % numSlots
+            if self.bucketIds[slot] != bucketId:
+                continue
+            numMatchesLeft -= self.numMatches[slot]
+            # A ratio may change whenever any bucket leaves the window, a count only once enough matches left it.
+            if self.rule.kind == 'ratio' or numMatchesLeft < self.rule.threshold:
+                # The bucket leaves the window once the window starts after it.
+                return (bucketId + 1) * self.bucketSecs + self.rule.winLenSecs + AlertEngine.DEADLINE_SLACK_SECS
+        return None
+
+
+class AlertEngine(InProcessAlerter):
+    '''An alerter evaluating any number of AlertRules, each with its own window. Rules are evaluated when events arrive and when
+    a rule may change state because events leave its window, instead of once every "Alerter.SAMPLING_DELAY_SECS". Adding an event
+    takes O(number of rules) time and memory does not depend on the thresholds (see RuleCounter).
+
+    The alerter always has a "hits" rule created from the passed "minNumEvents" and "winLenSecs", which behaves like "Alerter"
+    (up to the width of the buckets), and whose alerts "getAlerts()" returns. "getRuleAlerts()" returns the alerts of all rules.'''
+
+    # We evaluate rules this long after a deadline, so that rounding errors do not make us evaluate them right before it.
+    DEADLINE_SLACK_SECS = 0.001
+
+
+    def __init__(self, minNumEvents, winLenSecs, clock = wallClock):
+        # We deliberately do not call "InProcessAlerter.__init__()", since we keep different state.
+        self.minNumEvents, self.winLenSecs, self.clock = minNumEvents, winLenSecs, clock
+
+        # This lock grants exclusive access to the variables below.
+        self.lock = threading.Lock()
+
+        self.counters = []  # A RuleCounter for every rule.
+        self.states = []  # Whether each rule is in "High" state.
+        self.lastTsSecs = None  # The latest event timestamp seen so far.
+        # A chronologically ordered list of tuples (ruleName, transition, tsSecs), returned and cleared by "getRuleAlerts()".
+        self.ruleAlerts = []
+        # When the runner needs to evaluate the rules next, or None if only new events can change the state of a rule.
+        self.nextDeadlineSecs = None
+        self.genAlertHistogram = None
+
+        # Setting this event makes the runner evaluate the rules (and recompute "self.nextDeadlineSecs"). "runAlerterAsync()" waits
+        # on an asyncio.Event instead, which it creates when it starts (see "wake()").
+        self.wakeup = threading.Event()
+        self.asyncWakeup = None
+        # Setting this event makes "runAlerter()" return.
+        self.stopEvent = threading.Event()
+
+        self.addRule(AlertRule(Alerter.HITS_RULE_NAME, None, 'count', minNumEvents, winLenSecs, 1))
+
+
+    def addRule(self, rule):
+        '''Adds the passed AlertRule, which starts in "Low" state.'''
+
+        with self.lock:
+            self.counters.append(RuleCounter(rule))
+            self.states.append(False)
+
+
+    def getRules(self):
+        '''Returns the list of AlertRules.'''
+
+        return [counter.rule for counter in self.counters]
+
+
+    def addEvent(self, tsSecs, status = None):
+        '''Adds event with the passed timestamp and status code.'''
+
+        self.addEvents([tsSecs], None if status is None else [status])
+
+
+    def addEvents(self, tssSecs, statuses = None):
+        '''Adds events with the passed timestamps and status codes (if not None, a list as long as "tssSecs") in the passed order,
+        and evaluates the rules.'''
+
+        with self.lock:
+            # Clip out-of-order timestamps, exactly like "Alerter.addEvent()" does.
+            clippedTss = []
+            for tsSecs in tssSecs:
+                if self.lastTsSecs is not None and tsSecs < self.lastTsSecs:
+                    tsSecs = self.lastTsSecs
+                clippedTss.append(tsSecs)
+                self.lastTsSecs = tsSecs
+            for counter in self.counters:
+                counter.addEvents(clippedTss, statuses)
+
+            numAlerts = len(self.ruleAlerts)
+            self.evaluate(self.clock())
+            # New events only change deadlines if they made a rule enter "High" state, or if a ratio rule has no deadline yet.
+            if len(self.ruleAlerts) > numAlerts or (self.nextDeadlineSecs is None and any(counter.rule.kind == 'ratio' for counter in self.counters)):
+                self.wake()
+
+
+    def wake(self):
+        '''Makes the runner evaluate the rules (and recompute "self.nextDeadlineSecs").'''
+
+        self.wakeup.set()
+        if self.asyncWakeup is not None:
+            # Events are added in the thread of the event loop, so the asyncio.Event can be set directly.
+            self.asyncWakeup.set()
+
+
+    def evaluate(self, currSecs):
+        '''Evaluates all rules for windows ending at "currSecs", recording state transitions. This method assumes the caller has
+        acquired the lock.'''
+
+        for i, counter in enumerate(self.counters):
+            isHigh = counter.isHigh(currSecs)
+            if isHigh != self.states[i]:
+                self.ruleAlerts.append((counter.rule.name, 'EnterHigh' if isHigh else 'EnterLow', currSecs))
+                self.states[i] = isHigh
+
+
+    def genAlert(self, currSecs = None):
+        '''Evaluates all rules for windows ending at "currSecs", which defaults to the current time of our clock, and computes when
+        they need to be evaluated next. This method assumes the caller has acquired the lock.'''
+
+        self.evaluate(self.clock() if currSecs is None else currSecs)
+        deadlines = [deadline for deadline in (counter.getDeadline(self.states[i]) for i, counter in enumerate(self.counters))
+                     if deadline is not None]
+        self.nextDeadlineSecs = min(deadlines) if len(deadlines) > 0 else None
+
+
+    def stopRunner(self, runner):
+        '''Stops the runner returned by "makeRunner()" and waits for it to finish.'''
+
+        self.stopEvent.set()
+        self.wakeup.set()
+        runner.join()
+
+
+    def runAlerter(self):
+        '''This method runs the alerter until "stopRunner()" is called. It should be run in a separate thread. It sleeps until the
+        next deadline, or until new events need the rules to be evaluated.'''
+
+        while not self.stopEvent.is_set():
+            with self.lock:
+                timeoutSecs = None if self.nextDeadlineSecs is None else max(0, self.nextDeadlineSecs - self.clock())
+            self.wakeup.wait(timeoutSecs)
+            self.wakeup.clear()
+            with self.lock:
+                self.genAlertTimed()
+
+
+    async def runAlerterAsync(self):
+        '''Like "runAlerter()", but as a task of an asyncio event loop running in the thread that adds the events. It runs until
+        cancelled.'''
+
+        self.asyncWakeup = asyncio.Event()
+        while True:
+            with self.lock:
+                timeoutSecs = None if self.nextDeadlineSecs is None else max(0, self.nextDeadlineSecs - self.clock())
+            try:
+                await asyncio.wait_for(self.asyncWakeup.wait(), timeoutSecs)
+            except asyncio.TimeoutError:
+                pass
+            self.asyncWakeup.clear()
+            with self.lock:
+                self.genAlertTimed()
+
+
+    def getRuleAlerts(self):
+        '''Returns tuples (ruleName, transition, tsSecs) indicating "EnterHigh" or "EnterLow" transitions of all rules and the
+        timestamp of their occurrence since the last time this method (or "getAlerts()") was called.'''
+
+        with self.lock:
+            ret = self.ruleAlerts
+            self.ruleAlerts = []
+        return ret
+
+
+    def getAlerts(self):
+        '''Returns tuples (transition, tsSecs) of the "hits" rule, like "Alerter.getAlerts()" does. The alerts of other rules are
+        discarded.'''
+
+        return [(transition, tsSecs) for ruleName, transition, tsSecs in self.getRuleAlerts() if ruleName == Alerter.HITS_RULE_NAME]
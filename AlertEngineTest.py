@@ -0,0 +1,100 @@
+import time, unittest
+from unittest.mock import patch
+
+from AlertEngine import AlertEngine, AlertRule, parseRuleSpec
+from AlerterTest import AlerterTest
+
+
+class AlertEngineTest(AlerterTest):
+    '''Runs the "Alerter" tests against AlertEngine (whose "hits" rule must behave the same), plus tests of other rules.'''
+
+    ALERTER_CLASS = AlertEngine
+
+
+    @patch.object(time, 'time', return_value = 8)
+    def testAddEvents(self, timeMock):
+        self.alerter.addEvents([4, 5])
+        self.alerter.genAlert()
+        self.assertEqual([], self.alerter.getAlerts())
+
+        # The out-of-order timestamp is clipped to 5, so all 3 events fall within the window.
+        self.alerter.addEvents([3])
+        self.assertEqual([('EnterHigh', 8)], self.alerter.getAlerts())
+
+        timeMock.return_value = 20
+        self.alerter.addEvents([6, 7, 17, 18])
+        self.assertEqual([('EnterLow', 20)], self.alerter.getAlerts())
+        self.alerter.addEvents([19])
+        self.assertEqual([('EnterHigh', 20)], self.alerter.getAlerts())
+
+
+    @unittest.skip('AlertEngine has no circular array of timestamps')
+    def testLongBatchMatchesSingleEvents(self):
+        pass
+
+
+    def testParseRuleSpec(self):
+        self.assertEqual(AlertRule('5xx:ratio:0.05:60', '5xx', 'ratio', 0.05, 60, 10), parseRuleSpec('5xx:ratio:0.05:60'))
+        self.assertEqual(AlertRule('all:count:1000:10:1', None, 'count', 1000, 10, 1), parseRuleSpec('all:count:1000:10:1'))
+        for spec in ('5xx:ratio:0.05', '5xx:sum:1:60', 'xx5:count:1:60'):
+            with self.assertRaises(ValueError):
+                parseRuleSpec(spec)
+
+
+    @patch.object(time, 'time', return_value = 101)
+    def testRulesHaveTheirOwnWindows(self, timeMock):
+        self.alerter.addRule(parseRuleSpec('4xx:count:2:10'))
+        self.alerter.addRule(parseRuleSpec('5xx:ratio:0.5:2:2'))
+        self.alerter.addEvents([100, 100, 101, 101], ['404', '500', '500', '200'])
+        self.assertEqual([('hits', 'EnterHigh', 101), ('5xx:ratio:0.5:2:2', 'EnterHigh', 101)], self.alerter.getRuleAlerts())
+
+        timeMock.return_value = 102
+        self.alerter.addEvents([102, 102], ['404', '200'])
+        self.assertEqual([('4xx:count:2:10', 'EnterHigh', 102), ('5xx:ratio:0.5:2:2', 'EnterLow', 102)], self.alerter.getRuleAlerts())
+
+        # The "hits" rule only counts the events of the last 4 seconds, the 4xx rule those of the last 10 seconds.
+        self.alerter.genAlert(106)
+        self.assertEqual([('hits', 'EnterLow', 106)], self.alerter.getRuleAlerts())
+        self.alerter.genAlert(112)
+        self.assertEqual([('4xx:count:2:10', 'EnterLow', 112)], self.alerter.getRuleAlerts())
+
+
+    @patch.object(time, 'time', return_value = 102)
+    def testDeadlines(self, timeMock):
+        self.alerter.addRule(parseRuleSpec('5xx:ratio:0.5:2:1'))
+        self.alerter.addEvents([100, 101, 102], ['200', '500', '500'])
+        self.assertEqual([('hits', 'EnterHigh', 102), ('5xx:ratio:0.5:2:1', 'EnterHigh', 102)], self.alerter.getRuleAlerts())
+
+        # The "hits" rule (3 events in 4 seconds) stays in "High" state until the event at 100 leaves its window at 105. The ratio
+        # rule may change whenever a bucket leaves its window, first at 103.
+        self.alerter.genAlert()
+        self.assertAlmostEqual(103 + AlertEngine.DEADLINE_SLACK_SECS, self.alerter.nextDeadlineSecs)
+        self.alerter.genAlert(self.alerter.nextDeadlineSecs)
+        self.assertAlmostEqual(104 + AlertEngine.DEADLINE_SLACK_SECS, self.alerter.nextDeadlineSecs)
+        self.alerter.genAlert(self.alerter.nextDeadlineSecs)
+        self.assertAlmostEqual(105 + AlertEngine.DEADLINE_SLACK_SECS, self.alerter.nextDeadlineSecs)
+        self.assertEqual([], self.alerter.getRuleAlerts())
+
+        self.alerter.genAlert(self.alerter.nextDeadlineSecs)
+        self.assertEqual(['hits', '5xx:ratio:0.5:2:1'], [ruleName for ruleName, transition, tsSecs in self.alerter.getRuleAlerts()])
+        # Only new events can change the state of the rules now, so there is nothing to wait for.
+        self.assertIsNone(self.alerter.nextDeadlineSecs)
+
+
+    def testRunnerEvaluatesAtDeadline(self):
+        runner = self.alerter.makeRunner()
+        runner.start()
+        try:
+            # Three events that leave the 4 second window (of 1 second buckets) within 1.5 seconds.
+            tsSecs = time.time() - 3.5
+            self.alerter.addEvents([tsSecs] * 3)
+            self.assertEqual(['EnterHigh'], [transition for transition, tsSecs in self.alerter.getAlerts()])
+            time.sleep(1.6)
+            self.assertEqual(['EnterLow'], [transition for transition, tsSecs in self.alerter.getAlerts()])
+        finally:
+            self.alerter.stopRunner(runner)
+        self.assertFalse(runner.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,75 @@
-import bisect, multiprocessing, time
+import asyncio, bisect, multiprocessing, threading, time
 
+from Clock import wallClock
 
-class Alerter:
+
+class PeriodicAlerter:
+    '''The runner logic shared by all alerters: every "SAMPLING_DELAY_SECS" seconds, "genAlert()" is called under "self.lock".
+    Subclasses set "self.lock" and "self.genAlertHistogram", and implement "genAlert()", "makeRunner()" and "stopRunner()".'''
 
     # We check for state change every this many seconds.
     SAMPLING_DELAY_SECS = 1
 
 
-    def __init__(self, minNumEvents, winLenSecs):
+    async def runAlerterAsync(self):
+        '''Like "runAlerter()", but as a task of an asyncio event loop running in the thread that adds the events, so that no
+        process or thread of its own is needed. It runs until cancelled.'''
+
+        while True:
+            await asyncio.sleep(PeriodicAlerter.SAMPLING_DELAY_SECS)
+            with self.lock:
+                self.genAlertTimed()
+
+
+    def genAlertTimed(self):
+        '''Calls "genAlert()", recording its duration in "self.genAlertHistogram" (if set). This method assumes the caller has
+        acquired the lock.'''
+
+        if self.genAlertHistogram is None:
+            self.genAlert()
+        else:
+            startSecs = time.perf_counter()
+            self.genAlert()
+            self.genAlertHistogram.observe(time.perf_counter() - startSecs)
+
+
+class ThreadedAlerter(PeriodicAlerter):
+    '''A PeriodicAlerter run by a daemon thread of the current process. Subclasses also set "self.stopEvent" to a threading.Event,
+    which makes the thread return.'''
+
+    def makeRunner(self):
+        '''Returns a (not yet started) daemon thread that runs the alerter.'''
+
+        return threading.Thread(target = self.runAlerter, daemon = True)
+
+
+    def stopRunner(self, runner):
+        '''Stops the runner returned by "makeRunner()" and waits for it to finish.'''
+
+        self.stopEvent.set()
+        runner.join()
+
+
+    def runAlerter(self):
+        '''This method runs the alerter until "stopRunner()" is called. It should be run in a separate thread.'''
+
+        while not self.stopEvent.wait(PeriodicAlerter.SAMPLING_DELAY_SECS):
+            with self.lock:
+                self.genAlertTimed()
+
+
+class Alerter(PeriodicAlerter):
+
+    # The name under which "getRuleAlerts()" reports our alerts. Alerters with several rules use it for the rule we implement.
+    HITS_RULE_NAME = 'hits'
+
+
+    def __init__(self, minNumEvents, winLenSecs, clock = wallClock):
         '''We create a "High" alert if at least "minNumEvents" occur within the last "winLenSecs" seconds.
-        The alert is silenced when this condition no longer holds true.'''
+        The alert is silenced when this condition no longer holds true. "clock()" returns the current time in seconds, which
+        is when the window ends unless "genAlert()" is told otherwise (see "Clock.SimulatedClock" for replaying logs).'''
 
-        self.minNumEvents, self.winLenSecs = minNumEvents, winLenSecs
+        self.minNumEvents, self.winLenSecs, self.clock = minNumEvents, winLenSecs, clock
 
         # Since we need to share the variables below between 2 processes, we need to use a Manager object to create proxies for them.
         # https://docs.python.org/3.6/library/multiprocessing.html#managers
@@ -34,9 +92,12 @@ class Alerter:
         # This is a recently reported bug: https://bugs.python.org/issue33088
         self.alerts = manager.Value(list, [])
 
+        # If set to a "Metrics.Histogram", the duration of every "genAlert()" call made by "runAlerter()" is recorded in it.
+        self.genAlertHistogram = None
 
-    def addEvent(self, tsSecs):
-        '''Adds event with the passed timestamp.'''
+
+    def addEvent(self, tsSecs, status = None):
+        '''Adds event with the passed timestamp. The status code is ignored (it is only used by alerters with other rules).'''
 
         with self.lock:
             if len(self.tss) > 0:
@@ -55,18 +116,71 @@ class Alerter:
                 self.idx.set((self.idx.value + 1) % self.minNumEvents)
 
 
+    def addEvents(self, tssSecs, statuses = None):
+        '''Adds events with the passed timestamps (in the passed order) under a single lock acquisition. The status codes are
+        ignored, like in "addEvent()".'''
+
+        with self.lock:
+            # Work on a local copy of the circular array, so that the number of accesses to the shared state does not depend on
+            # the number of events.
+            tss, idx = self.tss[:], self.idx.value
+            numSkipped = len(tssSecs) - self.minNumEvents
+            if numSkipped > 0:
+                # Only the last "minNumEvents" events end up in the circular array, and the earlier ones only matter for clipping
+                # them. So we skip them, leaving the array as long and "idx" where they would have, and the latest of them (which
+                # is what the next event is clipped to) in place of the last one.
+                numAppended = min(numSkipped, self.minNumEvents - len(tss))
+                tsSecsPrev = max(tssSecs[: numSkipped]) if len(tss) == 0 else max(tss[idx - 1], max(tssSecs[: numSkipped]))
+                tss.extend([tsSecsPrev] * numAppended)
+                idx = (idx + numSkipped - numAppended) % self.minNumEvents
+                tss[idx - 1] = tsSecsPrev
+                tssSecs = tssSecs[numSkipped :]
+            for tsSecs in tssSecs:
+                if len(tss) > 0:
+                    # Clip out-of-order timestamps, exactly like "addEvent()" does.
+                    tsSecsPrev = tss[idx - 1]
+                    tsSecs = tsSecs if tsSecsPrev <= tsSecs else tsSecsPrev
+
+                if len(tss) < self.minNumEvents:
+                    tss.append(tsSecs)
+                else:
+                    tss[idx] = tsSecs
+                    idx = (idx + 1) % self.minNumEvents
+            self.tss[:] = tss
+            self.idx.set(idx)
+
+
+    def addRule(self, rule):
+        '''Only alerters with several rules (see "AlertEngine") support adding rules.'''
+
+        raise NotImplementedError('This alerter only supports the "%s" rule' % Alerter.HITS_RULE_NAME)
+
+
+    def makeRunner(self):
+        '''Returns a (not yet started) process that runs the alerter.'''
+
+        return multiprocessing.Process(target = self.runAlerter)
+
+
+    def stopRunner(self, runner):
+        '''Stops the runner returned by "makeRunner()" and waits for it to finish.'''
+
+        runner.terminate()
+        runner.join()
+
+
     def runAlerter(self):
         '''This method runs the alerter. It does not return and should be run in a separate thread.'''
 
         while True:
-            time.sleep(Alerter.SAMPLING_DELAY_SECS)
+            time.sleep(PeriodicAlerter.SAMPLING_DELAY_SECS)
             with self.lock:
-                self.genAlert()
+                self.genAlertTimed()
 
 
-    def genAlert(self):
-        '''Generates an alert If the number of events in the sliding window crosses the alerting threshold.
-        This method assumes the caller has acquired the lock.'''
+    def genAlert(self, currSecs = None):
+        '''Generates an alert If the number of events in the sliding window crosses the alerting threshold. The window ends at
+        "currSecs", which defaults to the current time of our clock. This method assumes the caller has acquired the lock.'''
 
         if len(self.tss) < self.minNumEvents:
             # Not enough events yet.
@@ -74,7 +188,8 @@ class Alerter:
 
         # Determine whether or not all timestamps occur on or after the timestamp corresponding to the beginning of our window.
         # https://docs.python.org/3.6/library/bisect.html
-        currSecs = time.time()
+        if currSecs is None:
+            currSecs = self.clock()
         winStartSecs = currSecs - self.winLenSecs
         if bisect.bisect_left(self.tss, winStartSecs, self.idx.value) != self.idx.value:
             # If we are in the "High" state, we need to transition to the "Low" state. Otherwise, we don't need to do anything.
@@ -100,3 +215,45 @@ class Alerter:
             ret = self.alerts.value
             self.alerts.set([])
         return ret
+
+
+    def getRuleAlerts(self):
+        '''Returns tuples (ruleName, transition, tsSecs) like "AlertEngine.getRuleAlerts()" does, i.e. the alerts returned by
+        "getAlerts()" attributed to the "hits" rule.'''
+
+        return [(Alerter.HITS_RULE_NAME, transition, tsSecs) for transition, tsSecs in self.getAlerts()]
+
+
+class LocalValue:
+    '''A stand-in for "multiprocessing.managers.ValueProxy" holding the value in the current process.'''
+
+    def __init__(self, value):
+        self.value = value
+
+
+    def get(self):
+        return self.value
+
+
+    def set(self, value):
+        self.value = value
+
+
+class InProcessAlerter(ThreadedAlerter, Alerter):
+    '''An Alerter that keeps its state in the current process and runs on a thread. Unlike "Alerter", whose every access to shared state
+    is a round trip to the manager process, adding an event here costs a lock acquisition and a few list operations.'''
+
+    def __init__(self, minNumEvents, winLenSecs, clock = wallClock):
+        # We deliberately do not call "Alerter.__init__()", since it would start a manager process.
+        self.minNumEvents, self.winLenSecs, self.clock = minNumEvents, winLenSecs, clock
+
+        # The variables below have the same meaning as in "Alerter", but they are plain objects guarded by a thread lock.
+        self.lock = threading.Lock()
+        self.tss = []
+        self.idx = LocalValue(0)
+        self.state = LocalValue('Low')
+        self.alerts = LocalValue([])
+        self.genAlertHistogram = None
+
+        # Setting this event makes "runAlerter()" return.
+        self.stopEvent = threading.Event()
@@ -1,13 +1,18 @@
 import time, unittest
 from unittest.mock import patch
 
-from Alerter import Alerter
+from Alerter import Alerter, InProcessAlerter
+from Clock import SimulatedClock
 
 
 class AlerterTest(unittest.TestCase):
 
+    # Subclasses override this to run the same tests against another Alerter backend.
+    ALERTER_CLASS = Alerter
+
+
     def setUp(self):
-        self.alerter = Alerter(3, 4)
+        self.alerter = self.ALERTER_CLASS(3, 4)
 
 
     def tearDown(self):
@@ -80,5 +85,63 @@ class AlerterTest(unittest.TestCase):
         self.assertEqual([('EnterHigh', 8), ('EnterLow', 10), ('EnterHigh', 11)], self.alerter.getAlerts())
 
 
+    @patch.object(time, 'time', return_value = 8)
+    def testAddEvents(self, timeMock):
+        self.alerter.addEvents([4, 5])
+        self.alerter.genAlert()
+        self.assertEqual([], self.alerter.getAlerts())
+
+        # The out-of-order timestamp is clipped to 5, so all 3 events fall within the window.
+        self.alerter.addEvents([3])
+        self.alerter.genAlert()
+        self.assertEqual([('EnterHigh', 8)], self.alerter.getAlerts())
+
+        # The batch wraps around the circular array.
+        timeMock.return_value = 20
+        self.alerter.addEvents([6, 7, 17, 18, 19])
+        self.alerter.genAlert()
+        self.assertEqual([], self.alerter.getAlerts())
+        self.assertEqual([18, 19, 17], list(self.alerter.tss))
+        self.assertEqual(2, self.alerter.idx.value)
+
+
+    @patch.object(time, 'time', return_value = 8)
+    def testLongBatchMatchesSingleEvents(self, timeMock):
+        otherAlerter = self.ALERTER_CLASS(3, 4)
+        for tssSecs in ([5], [4, 6, 2, 7, 7, 3], [8], [1, 2, 3, 4], [9, 10, 11, 12, 13, 14, 15]):
+            self.alerter.addEvents(tssSecs)
+            for tsSecs in tssSecs:
+                otherAlerter.addEvent(tsSecs)
+            self.assertEqual(list(otherAlerter.tss), list(self.alerter.tss))
+            self.assertEqual(otherAlerter.idx.value, self.alerter.idx.value)
+
+
+    def testSimulatedClock(self):
+        # Without "time.time()" being patched, the window ends at the time of the passed clock.
+        clock = SimulatedClock(8)
+        alerter = self.ALERTER_CLASS(3, 4, clock = clock)
+        for tsSecs in (4, 5, 7):
+            alerter.addEvent(tsSecs)
+        alerter.genAlert()
+        self.assertEqual([('EnterHigh', 8)], alerter.getAlerts())
+
+        clock.set(10)
+        clock.set(9)  # The clock does not go backwards.
+        alerter.genAlert()
+        self.assertEqual([('EnterLow', 10)], alerter.getAlerts())
+
+
+class InProcessAlerterTest(AlerterTest):
+
+    ALERTER_CLASS = InProcessAlerter
+
+
+    def testRunnerStops(self):
+        runner = self.alerter.makeRunner()
+        runner.start()
+        self.alerter.stopRunner(runner)
+        self.assertFalse(runner.is_alive())
+
+
 if __name__ == '__main__':
     unittest.main()
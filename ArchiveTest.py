@@ -0,0 +1,108 @@
+import os, shutil, tempfile, unittest
+from unittest.mock import patch
+
+from Archive import Archive, ArchiveWriter, getColumnPath, getDictPath
+from ClfParser import ClfParser, LogRecord
+from LogStats import LogStats
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirPath = tempfile.mkdtemp()
+        self.archivePath = os.path.join(self.dirPath, 'archive')
+        clfParser = ClfParser()
+        with open('source.log') as f:
+            self.records = [record for record in (clfParser.parse(line.strip()) for line in f) if record is not None]
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dirPath)
+
+
+    def writeRecords(self, records):
+        writer = ArchiveWriter(self.archivePath)
+        for record in records:
+            writer.addRecord(record, LogStats.getSection(record.urlPath))
+        writer.flush()
+        return writer
+
+
+    def testQueriesMatchRecords(self):
+        self.writeRecords(self.records)
+        # Small blocks, so that time ranges cover some blocks fully and some partially.
+        with patch.object(Archive, 'BLOCK_SIZE', 7), Archive(self.archivePath) as archive:
+            self.assertEqual(len(self.records), archive.count())
+            startSecs, endSecs = self.records[10].tsSecs, self.records[-10].tsSecs
+            inRange = [record for record in self.records if startSecs <= record.tsSecs < endSecs]
+            self.assertEqual(len(inRange), archive.count(startSecs, endSecs))
+
+            section2count = {}
+            for record in inRange:
+                if record.status == '200':
+                    section = LogStats.getSection(record.urlPath)
+                    section2count[section] = section2count.get(section, 0) + 1
+            self.assertEqual(section2count, archive.groupBy('section', startSecs, endSecs, where = {'status': '200'}))
+            self.assertEqual(sorted(section2count.items(), key = lambda t: t[1], reverse = True)[: 2],
+                             archive.topK('section', 2, startSecs, endSecs, where = {'status': '200'}))
+
+            self.assertEqual(sum(record.responseBytes or 0 for record in self.records if record.method == 'GET'),
+                             archive.sumResponseBytes(where = {'method': 'GET'}))
+            self.assertEqual(0, archive.count(where = {'status': '999'}))
+            with self.assertRaises(ValueError):
+                archive.groupBy('tsSecs')
+
+
+    def testNoneValues(self):
+        self.writeRecords([LogRecord(1, None, None, '400', None), LogRecord(2, 'GET', '/a/b', '200', 10, '10.0.0.1')])
+        with Archive(self.archivePath) as archive:
+            self.assertEqual({None: 1, '/a': 1}, archive.groupBy('section'))
+            self.assertEqual({None: 1, 'GET': 1}, archive.groupBy('method'))
+            self.assertEqual(10, archive.sumResponseBytes())
+
+
+    def testAppendAndTruncate(self):
+        self.writeRecords(self.records[: 5])
+        writer = self.writeRecords(self.records[5 : 8])
+        self.assertEqual(8, writer.numRecords)
+        with Archive(self.archivePath) as archive:
+            self.assertEqual(8, archive.count())
+
+        # A partially written record (e.g. after a crash) is dropped.
+        with open(getColumnPath(self.archivePath, 'tsSecs'), 'ab') as f:
+            f.write(b'\0' * 8)
+        writer = ArchiveWriter(self.archivePath)
+        self.assertEqual(8, writer.numRecords)
+        writer.truncate(6)
+        with Archive(self.archivePath) as archive:
+            self.assertEqual(6, archive.count())
+            self.assertEqual(len({LogStats.getSection(record.urlPath) for record in self.records[: 8]}), len(archive.column2values['section']) - 1)
+
+
+    def testIncompleteDictLine(self):
+        self.writeRecords(self.records[: 5])
+        # A crash in the middle of appending to a dictionary leaves part of a line.
+        with open(getDictPath(self.archivePath, 'remoteHost'), 'ab') as f:
+            f.write(b'"10.0.')
+        with Archive(self.archivePath) as archive:
+            self.assertEqual(5, archive.count())
+            self.assertEqual(len({record.remoteHost for record in self.records[: 5]}), len(archive.column2values['remoteHost']) - 1)
+
+        # The writer cuts it off, so that the values appended later are read back.
+        self.writeRecords(self.records[5 : 20])
+        with Archive(self.archivePath) as archive:
+            remoteHost2count = {}
+            for record in self.records[: 20]:
+                remoteHost2count[record.remoteHost] = remoteHost2count.get(record.remoteHost, 0) + 1
+            self.assertEqual(remoteHost2count, archive.groupBy('remoteHost'))
+
+
+    def testEmptyArchive(self):
+        ArchiveWriter(self.archivePath)
+        with Archive(self.archivePath) as archive:
+            self.assertEqual(0, archive.count())
+            self.assertEqual({}, archive.groupBy('status'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,243 @@
+import asyncio, ctypes, ctypes.util, os, struct
+
+
+# Constants of the inotify(7) API.
+IN_MODIFY = 0x2
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+# The header of an inotify event: "wd", "mask", "cookie" and the length of the name that follows it.
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# The maximum number of bytes of lines processed before the other tasks get to run, so that a large backlog (e.g. when
+# resuming from a checkpoint) does not delay reports and alerts.
+READ_SIZE_BYTES = 1 << 18
+
+
+class Inotify:
+    '''A minimal wrapper of the Linux inotify(7) API, called through ctypes. Raises OSError if it is not available.'''
+
+    def __init__(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+            initFunc = self.libc.inotify_init1
+        except (AttributeError, OSError, TypeError) as e:
+            raise OSError('inotify is not available: %s' % e)
+        self.fd = initFunc(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+
+    def addWatch(self, path, mask):
+        '''Watches the passed file or directory for the events in "mask" and returns the watch descriptor. Watching the same file
+        again (e.g. under another path) returns the same descriptor.'''
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+
+    def readEvents(self):
+        '''Returns a list of tuples (wd, mask, name) of the pending events. "name" is the name of the file an event of a watched
+        directory is about, and '' for the events of a watched file.'''
+
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return events
+            i = 0
+            while i < len(buf):
+                wd, mask, cookie, nameLen = INOTIFY_EVENT.unpack_from(buf, i)
+                i += INOTIFY_EVENT.size
+                events.append((wd, mask, os.fsdecode(buf[i : i + nameLen].rstrip(b'\0'))))
+                i += nameLen
+
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    '''Tells an asyncio task when any of the passed files may have been written to, created (e.g. after a log rotation) or
+    truncated. Unlike a watchdog observer, which reports every change in the directory of a file, it is only woken up for the
+    files it watches: with inotify, the files themselves are watched for writes, and their directories only for files being
+    created or moved into them. Where inotify is not available (or with "usePolling"), the files are polled instead.
+
+    "start()" and "wait()" must be called from the thread running the event loop.'''
+
+    # How often the files are polled when inotify is not used.
+    POLL_INTERVAL_SECS = 0.25
+
+
+    def __init__(self, filePaths, usePolling = False):
+        self.filePaths = list(filePaths)
+        self.usePolling = usePolling
+
+        self.changedPaths = set()  # The files that may have changed since the last "wait()".
+        self.changed = None  # An asyncio.Event set when "self.changedPaths" is not empty.
+        self.inotify = None
+        self.wd2path = {}  # The file watched by each file watch descriptor.
+        self.dirWd2name2path = {}  # The files (by name) of each watched directory.
+        self.pollTask = None
+
+
+    def start(self):
+        '''Starts watching the files, with inotify if possible.'''
+
+        loop = asyncio.get_event_loop()
+        self.changed = asyncio.Event()
+        if not self.usePolling:
+            try:
+                self.inotify = Inotify()
+                for filePath in self.filePaths:
+                    dirWd = self.inotify.addWatch(os.path.dirname(filePath) or '.', IN_CREATE | IN_MOVED_TO)
+                    self.dirWd2name2path.setdefault(dirWd, {})[os.path.basename(filePath)] = filePath
+                    self.watchFile(filePath)
+                loop.add_reader(self.inotify.fd, self.onInotifyEvents)
+            except OSError:
+                # E.g. not on Linux, or out of inotify watches.
+                if self.inotify is not None:
+                    self.inotify.close()
+                    self.inotify = None
+        if self.inotify is None:
+            self.pollTask = loop.create_task(self.poll())
+
+
+    def close(self):
+        if self.inotify is not None:
+            asyncio.get_event_loop().remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+        if self.pollTask is not None:
+            self.pollTask.cancel()
+            self.pollTask = None
+
+
+    async def wait(self):
+        '''Waits until some of the files may have changed, and returns the set of their paths.'''
+
+        await self.changed.wait()
+        self.changed.clear()
+        changedPaths, self.changedPaths = self.changedPaths, set()
+        return changedPaths
+
+
+    def setChanged(self, filePath):
+        self.changedPaths.add(filePath)
+        self.changed.set()
+
+
+    def watchFile(self, filePath):
+        '''Watches the file currently at the passed path (if any) for writes.'''
+
+        try:
+            self.wd2path[self.inotify.addWatch(filePath, IN_MODIFY)] = filePath
+        except FileNotFoundError:
+            # It will be watched once it is created.
+            pass
+
+
+    def onInotifyEvents(self):
+        for wd, mask, name in self.inotify.readEvents():
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so any file may have changed.
+                for filePath in self.filePaths:
+                    self.setChanged(filePath)
+            elif wd in self.dirWd2name2path:
+                filePath = self.dirWd2name2path[wd].get(name)
+                if filePath is not None:
+                    # A new file took the place of one of ours. The old one stays watched until it is deleted, since it may
+                    # still have lines appended to it before it is read for the last time.
+                    self.watchFile(filePath)
+                    self.setChanged(filePath)
+            elif mask & IN_IGNORED:
+                # The watched file was deleted.
+                self.wd2path.pop(wd, None)
+            elif wd in self.wd2path:
+                self.setChanged(self.wd2path[wd])
+
+
+    async def poll(self):
+        '''Polls the files for changes of their inode, size or modification time.'''
+
+        path2stat = {filePath: FileWatcher.getStatKey(filePath) for filePath in self.filePaths}
+        while True:
+            await asyncio.sleep(FileWatcher.POLL_INTERVAL_SECS)
+            for filePath in self.filePaths:
+                statKey = FileWatcher.getStatKey(filePath)
+                if statKey != path2stat[filePath]:
+                    path2stat[filePath] = statKey
+                    self.setChanged(filePath)
+
+
+    @staticmethod
+    def getStatKey(filePath):
+        try:
+            stat = os.stat(filePath)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+async def tailLogStats(stats, watcher):
+    '''Processes the lines appended to the log file of the passed LogStats, at first and whenever the passed FileWatcher tells us
+    it changed. Lines are processed READ_SIZE_BYTES at a time, letting the other tasks run in between.'''
+
+    while True:
+        while stats.consumeLogFile(READ_SIZE_BYTES):
+            await asyncio.sleep(0)
+        await watcher.wait()
+
+
+async def runPeriodically(func, delaySecs):
+    '''Calls "func()" every "delaySecs" seconds (without drifting, however long it takes).'''
+
+    loop = asyncio.get_event_loop()
+    nextSecs = loop.time()
+    while True:
+        nextSecs += delaySecs
+        await asyncio.sleep(max(0, nextSecs - loop.time()))
+        func()
+
+
+async def runStats(stats, outputDelaySecs, outputStats, usePolling = False):
+    '''Tails the log file of the passed LogStats, runs its alerters and calls "outputStats()" every "outputDelaySecs" seconds, all as
+    tasks of the current event loop. The LogStats object must have been created with the "asyncio" runtime, so that it did not
+    start runners of its own. Runs until cancelled (or until one of the tasks fails).'''
+
+    watcher = FileWatcher([stats.config.logFilePath], usePolling)
+    watcher.start()
+    loop = asyncio.get_event_loop()
+    coros = [tailLogStats(stats, watcher), stats.alerter.runAlerterAsync(), runPeriodically(outputStats, outputDelaySecs)]
+    if stats.sectionAlerter is not None:
+        coros.append(stats.sectionAlerter.runAlerterAsync())
+    tasks = [loop.create_task(coro) for coro in coros]
+    try:
+        # None of the tasks returns, so this only ends if one of them fails or we are cancelled.
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions = True)
+        watcher.close()
+
+
+def run(stats, outputDelaySecs, outputStats):
+    '''Runs "runStats()" on a new event loop. It never returns, unless interrupted (e.g. by Ctrl+C).'''
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    task = loop.create_task(runStats(stats, outputDelaySecs, outputStats))
+    try:
+        loop.run_until_complete(task)
+    finally:
+        # Let the tasks clean up, e.g. after a KeyboardInterrupt.
+        task.cancel()
+        loop.run_until_complete(asyncio.gather(task, return_exceptions = True))
+        loop.close()
@@ -0,0 +1,105 @@
+import asyncio, os, shutil, tempfile, unittest
+from unittest.mock import patch
+
+import AsyncRuntime
+from Alerter import PeriodicAlerter
+from AsyncRuntime import FileWatcher
+from LogStats import Config, LogStats
+
+
+class AsyncRuntimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirPath = tempfile.mkdtemp()
+        self.logFilePath = os.path.join(self.dirPath, 'access.log')
+        open(self.logFilePath, 'w').close()
+        with open('source.log') as f:
+            self.lines = f.readlines()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.dirPath)
+
+
+    def appendLines(self, lines, filePath = None):
+        with open(filePath or self.logFilePath, 'a') as f:
+            f.writelines(lines)
+
+
+    async def waitFor(self, watcher, timeoutSecs = 1):
+        '''Returns the paths returned by "watcher.wait()", or None if it did not return within "timeoutSecs" seconds.'''
+
+        try:
+            return await asyncio.wait_for(watcher.wait(), timeoutSecs)
+        except asyncio.TimeoutError:
+            return None
+
+
+    async def checkFileWatcher(self, usePolling):
+        watcher = FileWatcher([self.logFilePath], usePolling)
+        watcher.start()
+        try:
+            self.assertEqual(usePolling, watcher.inotify is None)
+
+            # Other files in the same directory are ignored.
+            self.appendLines(self.lines[: 1], os.path.join(self.dirPath, 'other.log'))
+            self.assertIsNone(await self.waitFor(watcher, 2 * FileWatcher.POLL_INTERVAL_SECS))
+
+            self.appendLines(self.lines[: 1])
+            self.assertEqual({self.logFilePath}, await self.waitFor(watcher))
+
+            # Rotation, then writes to the new file.
+            os.rename(self.logFilePath, self.logFilePath + '.1')
+            open(self.logFilePath, 'w').close()
+            self.assertEqual({self.logFilePath}, await self.waitFor(watcher))
+            self.appendLines(self.lines[1 : 2])
+            self.assertEqual({self.logFilePath}, await self.waitFor(watcher))
+        finally:
+            watcher.close()
+
+
+    def testFileWatcherWithInotify(self):
+        self.loop.run_until_complete(self.checkFileWatcher(usePolling = False))
+
+
+    def testFileWatcherWithPolling(self):
+        self.loop.run_until_complete(self.checkFileWatcher(usePolling = True))
+
+
+    async def checkRunStats(self, stats, reports):
+        task = self.loop.create_task(AsyncRuntime.runStats(stats, 0.05, lambda: reports.append(str(stats))))
+        try:
+            await asyncio.sleep(0.1)
+            self.appendLines(self.lines[: 10])
+            # Wait for the lines to be counted and for the next report.
+            for i in range(100):
+                await asyncio.sleep(0.05)
+                if stats.numHits == 10 and any('High traffic generated an alert' in report for report in reports):
+                    break
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions = True)
+
+
+    def testRunStats(self):
+        for alerterBackend in ('thread', 'engine'):
+            stats = LogStats(Config(logFilePath = self.logFilePath, numHitsToGenAlert = 10, alertWinLenSecs = 60, useCurrTimestamps = True,
+                                    alerterBackend = alerterBackend, sectionAlertHits = 5, runtime = 'asyncio'))
+            # No runner threads are started: the alerters run on the event loop.
+            self.assertFalse(hasattr(stats, 'alerterProc') or hasattr(stats, 'sectionAlerterThread'))
+
+            reports = []
+            with patch.object(PeriodicAlerter, 'SAMPLING_DELAY_SECS', 0.05):
+                self.loop.run_until_complete(self.checkRunStats(stats, reports))
+            self.assertEqual(10, stats.numHits)
+            report = ''.join(reports)
+            self.assertIn('High traffic generated an alert - hits >= 10', report)
+            self.assertIn('High traffic of section /css generated an alert - hits >= 5', report)
+            del stats
+
+
+if __name__ == '__main__':
+    unittest.main()
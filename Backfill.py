@@ -0,0 +1,220 @@
+import bz2, gzip, lzma, math, multiprocessing, os, queue, threading
+
+from HyperLogLog import HyperLogLog
+from LineReader import LineReader
+from LogParser import LogParser
+from LogStats import Config, LogStats
+from Replay import Replayer, getTimelineStr
+from StatsBatch import StatsBatch
+
+
+# Each worker process gets about this many byte ranges, so that a slow range does not leave the other workers idle.
+NUM_RANGES_PER_WORKER = 4
+
+# Byte ranges are at most about this long, so that large files are parsed (and their statistics held) a bounded range at a time.
+MAX_RANGE_BYTES = 16 << 20
+
+# The modules decompressing the log files with these extensions (e.g. rotated logs like "access.log.1.gz").
+DECOMPRESSORS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+# Compressed files are decompressed this many bytes at a time, and at most this many decompressed chunks wait to be parsed.
+DECOMPRESSED_CHUNK_BYTES = 1 << 20
+MAX_NUM_PENDING_CHUNKS = 8
+
+
+def isCompressed(filePath):
+    '''Returns whether the passed log file is compressed, judging by its extension.'''
+
+    return os.path.splitext(filePath)[1] in DECOMPRESSORS
+
+
+def openLogFile(filePath):
+    '''Opens the passed log file for reading bytes, decompressing it on the fly if it is compressed.'''
+
+    if isCompressed(filePath):
+        return DECOMPRESSORS[os.path.splitext(filePath)[1]].open(filePath, 'rb')
+    return open(filePath, 'rb')
+
+
+def getFirstTsSecs(filePath, useFastParser = True):
+    '''Returns the timestamp of the first request in the passed log file, or None if none is found in its first chunk.'''
+
+    logParser = LogParser(useFastParser)
+    with openLogFile(filePath) as f:
+        for line in LineReader().feed(f.read(DECOMPRESSED_CHUNK_BYTES)):
+            record = logParser.parse(line)
+            if record is not None:
+                return record.tsSecs
+    return None
+
+
+def sortChronologically(filePaths, useFastParser = True):
+    '''Returns the passed log files (e.g. a log and its rotated predecessors) sorted by the timestamp of their first request,
+    oldest first. Files without requests come last.'''
+
+    filePath2tsSecs = {filePath: getFirstTsSecs(filePath, useFastParser) for filePath in filePaths}
+    return sorted(filePaths, key = lambda filePath: (filePath2tsSecs[filePath] is None, filePath2tsSecs[filePath] or 0, filePath))
+
+
+def splitFile(filePath, numRanges):
+    '''Splits the passed file into at most "numRanges" byte ranges [start, end) of roughly equal size, such that every range
+    starts at the beginning of a line.'''
+
+    fileSize = os.path.getsize(filePath)
+    offsets = [0]
+    with open(filePath, 'rb') as f:
+        for i in range(1, numRanges):
+            offset = fileSize * i // numRanges
+            if offset <= offsets[-1]:
+                continue
+            # Move to the beginning of the next line.
+            f.seek(offset - 1)
+            f.readline()
+            offset = f.tell()
+            if offsets[-1] < offset < fileSize:
+                offsets.append(offset)
+    offsets.append(fileSize)
+    return list(zip(offsets[: -1], offsets[1 :]))
+
+
+def parseRange(filePath, start, end, useFastParser = True, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION):
+    '''Parses the lines in the passed byte range of the passed file and returns their statistics as a StatsBatch. A compressed file
+    cannot be split, so it is parsed as a whole (and "start" and "end" are ignored).'''
+
+    if isCompressed(filePath):
+        return LogStats.parseLogLines(readCompressed(filePath), LogParser(useFastParser), clientSketchPrecision = clientSketchPrecision)
+    with open(filePath, 'rb', buffering = 0) as f:
+        return LogStats.parseLogLines(readRange(f, start, end), LogParser(useFastParser), clientSketchPrecision = clientSketchPrecision)
+
+
+def readRange(f, start, end):
+    '''Yields the (non-blank) lines in the passed byte range of the passed binary file object, as returned by
+    "LineReader.readLines()". Each line must be used before the next one is asked for, since they share the reader's buffer.'''
+
+    reader = LineReader()
+    f.seek(start)
+    while start < end:
+        lines = reader.readLines(f, end - start, final = True)
+        if f.tell() == start:
+            break
+        start = f.tell()
+        yield from lines
+
+
+def decompress(filePath, chunkQueue):
+    '''Puts the decompressed data of the passed file into "chunkQueue" a chunk at a time, followed by an empty chunk (or by the
+    exception that stopped it). Runs on a thread of its own: the decompressors release the GIL, so the file is decompressed
+    while the previous chunks are parsed.'''
+
+    try:
+        with openLogFile(filePath) as f:
+            while True:
+                chunk = f.read(DECOMPRESSED_CHUNK_BYTES)
+                chunkQueue.put(chunk)
+                if len(chunk) == 0:
+                    return
+    except Exception as e:
+        chunkQueue.put(e)
+
+
+def readCompressed(filePath):
+    '''Yields the (non-blank) lines of the passed compressed file like "readRange()" does, as they are decompressed by another
+    thread (see "decompress()").'''
+
+    chunkQueue = queue.Queue(MAX_NUM_PENDING_CHUNKS)
+    decompressor = threading.Thread(target = decompress, args = (filePath, chunkQueue), daemon = True)
+    decompressor.start()
+    reader = LineReader()
+    while True:
+        chunk = chunkQueue.get()
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield from reader.feed(chunk, final = len(chunk) == 0)
+        if len(chunk) == 0:
+            break
+    decompressor.join()
+
+
+def parseRangeArgs(args):
+    '''"parseRange()" taking a single tuple of arguments, for use with "multiprocessing.Pool.imap()".'''
+
+    return parseRange(*args)
+
+
+def parseBatches(filePaths, numWorkers, useFastParser = True, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION):
+    '''Parses the whole passed log files using "numWorkers" processes and yields the statistics of their parts as StatsBatches:
+    the consecutive byte ranges of every uncompressed file, and every compressed file as a whole. Different files are parsed
+    concurrently, but their statistics are yielded in chronological order (see "sortChronologically()"), so that the timestamps
+    of a log and of its rotated predecessors are in order too.'''
+
+    filePaths = sortChronologically(filePaths, useFastParser)
+    # The uncompressed bytes are split into about "NUM_RANGES_PER_WORKER" ranges per worker.
+    numBytes = sum(os.path.getsize(filePath) for filePath in filePaths if not isCompressed(filePath))
+    rangeBytes = MAX_RANGE_BYTES if numWorkers <= 1 else min(MAX_RANGE_BYTES, numBytes / (numWorkers * NUM_RANGES_PER_WORKER))
+    argsList = []
+    for filePath in filePaths:
+        if isCompressed(filePath):
+            argsList.append((filePath, None, None, useFastParser, clientSketchPrecision))
+        else:
+            numRanges = max(1, math.ceil(os.path.getsize(filePath) / max(1, rangeBytes)))
+            argsList.extend((filePath, start, end, useFastParser, clientSketchPrecision) for start, end in splitFile(filePath, numRanges))
+
+    if numWorkers <= 1:
+        yield from map(parseRangeArgs, argsList)
+    else:
+        with multiprocessing.Pool(numWorkers) as pool:
+            # "imap()" returns the partial results in the order of the ranges, so the timestamps stay in order.
+            yield from pool.imap(parseRangeArgs, argsList)
+
+
+def backfill(filePaths, numWorkers, useFastParser = True, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION, replayers = ()):
+    '''Computes statistics over the whole passed log files (compressed or not, see "parseBatches()") using "numWorkers" processes
+    and returns them as a StatsBatch. The result is the same as if the files were parsed one after the other, in chronological
+    order, by a single process, except that it holds no timestamps: the requests of every part are replayed through the passed
+    Replayers (see "Replay.Replayer") as soon as it is parsed, and then dropped, so that memory does not grow with the number of
+    lines. The Replayers are finished at the end.'''
+
+    stats = StatsBatch(clientSketchPrecision)
+    for batch in parseBatches(filePaths, numWorkers, useFastParser, clientSketchPrecision):
+        stats.merge(batch, mergeTss = False)
+        for replayer in replayers:
+            replayer.addEvents(batch.tss, batch.statuses, batch.sections)
+    for replayer in replayers:
+        replayer.finish()
+    return stats
+
+
+def replayFiles(filePaths, configs, numWorkers, useFastParser = True):
+    '''Parses the whole passed log files using "numWorkers" processes and replays their requests, in chronological order, through
+    the alerters of every passed config (see "Replay.Replayer"), a part at a time (see "parseBatches()"), so that the files are
+    never held in memory at once. Returns the list of the finished Replayers.'''
+
+    replayers = [Replayer(config) for config in configs]
+    for batch in parseBatches(filePaths, numWorkers, useFastParser):
+        for replayer in replayers:
+            replayer.addEvents(batch.tss, batch.statuses, batch.sections)
+    for replayer in replayers:
+        replayer.finish()
+    return replayers
+
+
+def replayAlerts(tss, minNumEvents, winLenSecs):
+    '''Replays the passed timestamps through an InProcessAlerter in event time (see "Replay.Replayer") and returns the transitions
+    it generated, as returned by "Alerter.getAlerts()".'''
+
+    replayer = Replayer(Config(None, minNumEvents, winLenSecs, False, alerterBackend = 'thread'))
+    replayer.addEvents(tss, [None] * len(tss), [None] * len(tss))
+    return [(transition, tsSecs) for tsSecs, ruleName, section, transition in replayer.finish()]
+
+
+def getReportStr(stats, replayer):
+    '''Returns a formatted string showing the statistics in the passed StatsBatch and the alerts of the passed finished Replayer
+    (e.g. both as returned by "backfill()").'''
+
+    section2count = {section: count for section, count in sorted(stats.section2count.items(), key = lambda t: t[1], reverse = True)
+                     [: LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW]}
+    return (LogStats.getStatsStr(section2count, len(stats.section2count), stats.numHits, stats.responseBytesTot, stats.numBadLines,
+                                 stats.retCode2count, stats.method2count, stats.clients.getCount(),
+                                 LogStats.getSection2numClients(section2count, stats.section2clients), stats.responseBytes,
+                                 {section: stats.section2responseBytes[section] for section in section2count if section in stats.section2responseBytes}) +
+            getTimelineStr(replayer.transitions, replayer.config))
@@ -0,0 +1,108 @@
+import bz2, gzip, lzma, os, shutil, tempfile, unittest
+
+import Backfill
+from LogParser import LogParser
+from LogStats import Config, LogStats
+from Replay import Replayer
+
+
+class BackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+
+    def tearDown(self):
+        pass
+
+
+    def testSplitFileOnLineBoundaries(self):
+        with open('source.log', 'rb') as f:
+            data = f.read()
+        ranges = Backfill.splitFile('source.log', 7)
+        self.assertEqual(7, len(ranges))
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(len(data), ranges[-1][1])
+        for (start, end), (nextStart, nextEnd) in zip(ranges, ranges[1 :]):
+            self.assertEqual(end, nextStart)
+            self.assertEqual(b'\n', data[nextStart - 1 : nextStart])
+
+
+    def testSplitSmallFile(self):
+        fd, filePath = tempfile.mkstemp(suffix = '.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write('a\nb\n')
+        try:
+            self.assertEqual([(0, 2), (2, 4)], Backfill.splitFile(filePath, 10))
+        finally:
+            os.remove(filePath)
+
+
+    @staticmethod
+    def getState(batch):
+        # "addedClients" is only a cache of recently added clients, which depends on how the lines were split. The timestamps
+        # (and status codes and sections) are replayed instead of being kept.
+        return {key: val for key, val in vars(batch).items() if key not in ('addedClients', 'tss', 'statuses', 'sections')}
+
+
+    def testParallelMatchesSingleProcess(self):
+        with open('source.log') as f:
+            expected = LogStats.parseLogLines(f.readlines(), LogParser())
+        config = Config(None, 10, 60, False, alerterBackend = 'thread', sectionAlertHits = 20)
+        expectedReplayer = Replayer(config)
+        expectedReplayer.addEvents(expected.tss, expected.statuses, expected.sections)
+        expectedReplayer.finish()
+        for numWorkers in (1, 3):
+            replayer = Replayer(config)
+            stats = Backfill.backfill(['source.log'], numWorkers, replayers = [replayer])
+            self.assertEqual(BackfillTest.getState(expected), BackfillTest.getState(stats))
+            # Every request was replayed as its part arrived, but none of them is kept.
+            self.assertEqual([], stats.tss)
+            self.assertEqual(len(expected.tss), replayer.numEvents)
+            self.assertEqual(expectedReplayer.transitions, replayer.transitions)
+            self.assertIn('High traffic generated an alert', Backfill.getReportStr(stats, replayer))
+
+
+    def testRotatedCompressedFiles(self):
+        # source.log split into a log and its rotated predecessors, the older ones compressed in various ways.
+        with open('source.log', 'rb') as f:
+            lines = f.readlines()
+        dirPath = tempfile.mkdtemp()
+        try:
+            parts = [(os.path.join(dirPath, 'access.log.3.xz'), lzma.open), (os.path.join(dirPath, 'access.log.2.bz2'), bz2.open),
+                     (os.path.join(dirPath, 'access.log.1.gz'), gzip.open), (os.path.join(dirPath, 'access.log'), open)]
+            numLines = len(lines) // len(parts) + 1
+            for i, (filePath, openFile) in enumerate(parts):
+                with openFile(filePath, 'wb') as f:
+                    f.writelines(lines[i * numLines : (i + 1) * numLines])
+            filePaths = [filePath for filePath, openFile in parts]
+            self.assertEqual([False, True, True, True], [Backfill.isCompressed(filePath) for filePath in reversed(filePaths)])
+            self.assertEqual(filePaths, Backfill.sortChronologically(sorted(filePaths)))
+
+            # The files are merged in chronological order, whatever the order they are passed in.
+            expected = Backfill.backfill(['source.log'], 1)
+            for numWorkers in (1, 3):
+                stats = Backfill.backfill(sorted(filePaths), numWorkers)
+                self.assertEqual(BackfillTest.getState(expected), BackfillTest.getState(stats))
+
+            # A decompression error is raised by the parsing thread.
+            with open(os.path.join(dirPath, 'corrupt.log.gz'), 'wb') as f:
+                f.write(b'not gzip data')
+            with self.assertRaises(OSError):
+                Backfill.parseRange(os.path.join(dirPath, 'corrupt.log.gz'), None, None)
+        finally:
+            shutil.rmtree(dirPath)
+
+
+    def testReplayAlerts(self):
+        # The alerter is evaluated at 5, 6, 7, ... so it enters "High" as soon as the third event arrives, and "Low" as soon as
+        # the first of the last 3 events falls out of the window.
+        self.assertEqual([('EnterHigh', 7), ('EnterLow', 9)], Backfill.replayAlerts([4, 5, 7], 3, 4))
+        self.assertEqual([('EnterHigh', 7), ('EnterLow', 10), ('EnterHigh', 20), ('EnterLow', 25)],
+                         Backfill.replayAlerts([4, 5, 7, 8, 20, 20, 20], 3, 4))
+        self.assertEqual([], Backfill.replayAlerts([4, 5, 20], 3, 4))
+        self.assertEqual([], Backfill.replayAlerts([], 3, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,955 @@
+import argparse, asyncio, contextlib, gc, json, math, multiprocessing, os, platform, random, resource, shutil, sys, tempfile, threading, time, tracemalloc
+from array import array
+from collections import Counter
+
+from watchdog.observers import Observer
+
+import AsyncRuntime, Backfill
+from AlertEngine import AlertEngine, parseRuleSpec
+from Archive import COLUMN2TYPECODE, Archive, ArchiveWriter
+from Alerter import Alerter
+from ClfParser import ClfParser
+from Heap import Heap
+from HyperLogLog import HyperLogLog
+from KeyedAlerter import KeyedAlerter
+from LineReader import LineReader
+from LogAnalyzer import LogAnalyzer
+from LogParser import LogParser
+from LogStats import ALERTER_BACKENDS, RUNTIMES, Config, LogStats
+from Replay import Replayer
+from Sharding import Coordinator
+from SpaceSaving import SpaceSaving
+from StatsBatch import StatsBatch
+
+
+def makeStats(logFilePath, **kwargs):
+    '''Returns a LogStats object for the passed log file with the in-process alerter and the passed config overrides.'''
+
+    return LogStats(Config(logFilePath = logFilePath, numHitsToGenAlert = 110, alertWinLenSecs = 120, useCurrTimestamps = False,
+                           alerterBackend = 'thread')._replace(**kwargs))
+
+
+def getStatsState(stats):
+    '''Returns a comparable snapshot of the statistics collected by the passed LogStats object.'''
+
+    with stats.lock:
+        return (stats.numHits, stats.numBadLines, stats.responseBytesTot, dict(stats.retCode2count), dict(stats.method2count),
+                stats.sectionIds.decode(stats.sectionTracker.getObjs()))
+
+
+def getPercentile(sortedVals, percent):
+    '''Returns the passed percentile of the passed sorted list (using the nearest-rank method).'''
+
+    return sortedVals[min(len(sortedVals) - 1, int(len(sortedVals) * percent / 100))]
+
+
+def benchParser(args):
+    '''Measures the throughput of the "apache_log_parser" and ClfParser parsing paths over the log file, both for parsing alone
+    and for processing lines one by one and in batches. Checks that both parsing paths produce the same statistics.'''
+
+    with open(args.logFilePath) as f:
+        lines = [line.strip() for line in f if len(line.strip()) > 0]
+
+    results, path2state = {}, {}
+    for name, useFastParser in (('apache_log_parser', False), ('ClfParser', True)):
+        # We point the LogStats objects at the log file itself. They seek to the end, so they will not read anything on their own.
+        stats = makeStats(args.logFilePath, useFastParser = useFastParser)
+        batchedStats = makeStats(args.logFilePath, useFastParser = useFastParser)
+
+        startSecs = time.perf_counter()
+        for i in range(args.numRepeats):
+            for line in lines:
+                stats.parseLogLine(line)
+        parseSecs = time.perf_counter() - startSecs
+
+        startSecs = time.perf_counter()
+        for line in lines:
+            stats.processLogLine(line)
+        processSecs = time.perf_counter() - startSecs
+
+        startSecs = time.perf_counter()
+        batchedStats.processNewLines(lines)
+        batchedSecs = time.perf_counter() - startSecs
+
+        path2state[name] = getStatsState(stats)
+        if getStatsState(batchedStats) != path2state[name]:
+            raise AssertionError('Batched and per-line processing produced different statistics.')
+
+        results[name] = {'parseLinesPerSec'    : args.numRepeats * len(lines) / parseSecs,
+                         'perLineLinesPerSec'  : len(lines) / processSecs,
+                         'batchedLinesPerSec'  : len(lines) / batchedSecs}
+        print('parser %-18s: %10.0f lines/sec parsing, %10.0f lines/sec processing per line, %10.0f lines/sec processing batches' %
+              (name, results[name]['parseLinesPerSec'], results[name]['perLineLinesPerSec'], results[name]['batchedLinesPerSec']))
+
+    if path2state['apache_log_parser'] != path2state['ClfParser']:
+        raise AssertionError('The two parsing paths produced different statistics.')
+    return results
+
+
+def benchSectionTrackers(args):
+    '''Measures the per-call cost of "addObj()" and "getMaxObjs()" of Heap and SpaceSaving at various numbers of distinct sections.'''
+
+    results = {}
+    rnd = random.Random(0)
+    for name, makeTracker in (('Heap', Heap), ('SpaceSaving', lambda: SpaceSaving(args.sectionTrackerCapacity))):
+        results[name] = {}
+        for numSections in args.sectionCardinalities:
+            sections = ['/section%d' % i for i in range(numSections)]
+            # A skewed access pattern, so that there is a meaningful top.
+            ops = [sections[min(numSections - 1, int(rnd.paretovariate(1)) - 1)] if i % 2 else sections[i % numSections]
+                   for i in range(args.numTrackerOps)]
+
+            tracker = makeTracker()
+            startSecs = time.perf_counter()
+            for section in ops:
+                tracker.addObj(section)
+            addObjSecs = (time.perf_counter() - startSecs) / len(ops)
+
+            numCalls = 1000
+            startSecs = time.perf_counter()
+            for i in range(numCalls):
+                tracker.getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)
+            getMaxObjsSecs = (time.perf_counter() - startSecs) / numCalls
+
+            results[name][str(numSections)] = {'addObjUsec': 1e6 * addObjSecs, 'getMaxObjsUsec': 1e6 * getMaxObjsSecs}
+            print('sectionTrackers %-11s %8d sections: %6.2f usec/addObj, %8.2f usec/getMaxObjs' %
+                  (name, numSections, 1e6 * addObjSecs, 1e6 * getMaxObjsSecs))
+    return results
+
+
+def benchSectionTrackerMemory(args):
+    '''Measures the memory used by Heap and SpaceSaving after adding a large number of synthetic unique sections (plus a few hot ones).'''
+
+    results = {}
+    for name, makeTracker in (('Heap', Heap), ('SpaceSaving', lambda: SpaceSaving(args.sectionTrackerCapacity))):
+        tracemalloc.start()
+        tracker = makeTracker()
+        for i in range(args.numSyntheticSections):
+            tracker.addObj('/section%d' % i)
+            # Every 10th request goes to one of a few hot sections.
+            if i % 10 == 0:
+                tracker.addObj('/hot%d' % (i % 7))
+        currBytes, peakBytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = {'memoryMB': currBytes / 2**20, 'peakMemoryMB': peakBytes / 2**20}
+        print('sectionTrackerMemory %-11s: %8.1f MB (peak %8.1f MB) after %d unique sections, top sections: %s' %
+              (name, currBytes / 2**20, peakBytes / 2**20, args.numSyntheticSections,
+               LogStats.getVal2CountStr(tracker.getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW))))
+    return results
+
+
+def countDistinctClients(events, makeCounter, addToCounter, getCount):
+    '''Counts the distinct clients overall and per section of the passed (client, section) events with counters created by
+    "makeCounter()". Returns the counts, the memory used by the counters and the time taken per event.'''
+
+    tracemalloc.start()
+    startSecs = time.perf_counter()
+    counter, section2counter = makeCounter(), {}
+    for client, section in events:
+        addToCounter(counter, client)
+        sectionCounter = section2counter.get(section)
+        if sectionCounter is None:
+            sectionCounter = section2counter[section] = makeCounter()
+        addToCounter(sectionCounter, client)
+    elapsedSecs = time.perf_counter() - startSecs
+    currBytes, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return getCount(counter), {section: getCount(counter) for section, counter in section2counter.items()}, currBytes, elapsedSecs / len(events)
+
+
+def benchDistinctClients(args):
+    '''Compares the memory used and the error of HyperLogLog sketches of various precisions to exact counting (with sets) of the
+    distinct clients overall and per section, both on the log file and on a large synthetic stream.'''
+
+    clfParser = ClfParser()
+    with open(args.logFilePath) as f:
+        records = [record for record in (clfParser.parse(line.strip()) for line in f) if record is not None]
+    rnd = random.Random(0)
+    streams = {
+        'logFile'  : [(record.remoteHost, LogStats.getSection(record.urlPath)) for record in records],
+        # Many distinct clients, spread over a few (skewed) sections.
+        'synthetic': [('10.%d.%d.%d' % (c >> 16 & 255, c >> 8 & 255, c & 255), '/section%d' % min(99, int(rnd.paretovariate(0.5)) - 1))
+                      for c in (rnd.randrange(args.numSyntheticClients) for i in range(args.numClientEvents))],
+    }
+
+    results = {}
+    for streamName, events in streams.items():
+        results[streamName] = {}
+        numClients, section2numClients, exactBytes, exactSecs = countDistinctClients(events, set, set.add, len)
+        results[streamName]['exact'] = {'memoryMB': exactBytes / 2**20, 'usecPerEvent': 1e6 * exactSecs}
+        print('distinctClients %-9s exact    : %8d clients, %4d sections, %8.2f MB, %5.2f usec/event' %
+              (streamName, numClients, len(section2numClients), exactBytes / 2**20, 1e6 * exactSecs))
+
+        for precision in args.clientSketchPrecisions:
+            estNumClients, estSection2numClients, sketchBytes, sketchSecs = countDistinctClients(
+                events, lambda: HyperLogLog(precision), HyperLogLog.add, HyperLogLog.getCount)
+            errorPct = 100 * abs(estNumClients - numClients) / numClients
+            # The error of sections with few clients is dominated by rounding, so we only look at sections with at least 100 of them.
+            sectionErrorPcts = [100 * abs(estSection2numClients[section] - count) / count for section, count in section2numClients.items() if count >= 100]
+            maxSectionErrorPct = max(sectionErrorPcts) if len(sectionErrorPcts) > 0 else 0
+            results[streamName]['precision%d' % precision] = {'memoryMB': sketchBytes / 2**20, 'usecPerEvent': 1e6 * sketchSecs,
+                                                              'errorPct': errorPct, 'maxSectionErrorPct': maxSectionErrorPct}
+            print('distinctClients %-9s precision %2d: %8d clients (error %5.2f%%, max section error %5.2f%%), %8.2f MB, %5.2f usec/event' %
+                  (streamName, precision, estNumClients, errorPct, maxSectionErrorPct, sketchBytes / 2**20, 1e6 * sketchSecs))
+    return results
+
+
+def makeEngineWithRules(numRules):
+    '''Returns an AlertEngine with "numRules" rules besides the "hits" one, alternating between status class counts and 5xx ratios.'''
+
+    alerter = AlertEngine(110, 120)
+    for i in range(numRules):
+        alerter.addRule(parseRuleSpec('%dxx:count:%d:%d' % (2 + i % 4, 100 + i, 10 + i) if i % 2 == 0 else '5xx:ratio:0.%02d:%d' % (i, 60 + i)))
+    return alerter
+
+
+def benchAlerter(args):
+    '''Measures the throughput of "addEvent()" and "addEvents()" of every Alerter backend, and of the "engine" backend with
+    "args.numAlertRules" additional rules.'''
+
+    name2makeAlerter = {backend: lambda alerterClass = alerterClass: alerterClass(110, 120) for backend, alerterClass in ALERTER_BACKENDS.items()}
+    name2makeAlerter['engine+%drules' % args.numAlertRules] = lambda: makeEngineWithRules(args.numAlertRules)
+
+    results = {}
+    for name, makeAlerter in sorted(name2makeAlerter.items()):
+        alerter = makeAlerter()
+        # The manager backend is orders of magnitude slower, so it gets fewer events.
+        numEvents = args.numAlerterEvents // 100 if type(alerter) is Alerter else args.numAlerterEvents
+        tsSecs = int(time.time())
+        # Every 20th request fails.
+        statuses = ['500' if i % 20 == 0 else '200' for i in range(numEvents)]
+
+        startSecs = time.perf_counter()
+        for i in range(numEvents):
+            alerter.addEvent(tsSecs + i // 100, statuses[i])
+        addEventSecs = time.perf_counter() - startSecs
+
+        batchSize = 1000
+        startSecs = time.perf_counter()
+        for i in range(0, numEvents, batchSize):
+            alerter.addEvents([tsSecs + j // 100 for j in range(i, i + batchSize)], statuses[i : i + batchSize])
+        addEventsSecs = time.perf_counter() - startSecs
+
+        results[name] = {'addEventEventsPerSec': numEvents / addEventSecs, 'addEventsEventsPerSec': numEvents / addEventsSecs}
+        print('alerter %-15s: %10.0f events/sec addEvent, %10.0f events/sec addEvents (batches of %d)' %
+              (name, numEvents / addEventSecs, numEvents / addEventsSecs, batchSize))
+    return results
+
+
+def addKeyedEvents(alerter, tss, keys, batchSize):
+    '''Adds the passed events to the passed KeyedAlerter in batches of "batchSize" (one by one if it is 1) and returns the time taken.'''
+
+    startSecs = time.perf_counter()
+    if batchSize == 1:
+        for tsSecs, key in zip(tss, keys):
+            alerter.addEvent(tsSecs, key)
+    else:
+        for i in range(0, len(tss), batchSize):
+            alerter.addEvents(tss[i : i + batchSize], keys[i : i + batchSize])
+    return time.perf_counter() - startSecs
+
+
+def benchKeyedAlerter(args):
+    '''Measures the throughput, memory and evaluation time of KeyedAlerter (i.e. per-section alerts) with "args.numAlertKeys"
+    distinct keys, at various capacities. Half of the events go to all keys round robin, the other half to a few hot keys.'''
+
+    rnd = random.Random(0)
+    keys = ['/section%d' % min(args.numAlertKeys - 1, int(rnd.paretovariate(1)) - 1) if i % 2 else '/section%d' % (i // 2 % args.numAlertKeys)
+            for i in range(args.numKeyedAlerterEvents)]
+    # The events span 2 windows of logged time, ending now.
+    winLenSecs, spanSecs = 60, 120
+    startTsSecs = time.time() - spanSecs
+    tss = [startTsSecs + i * spanSecs / len(keys) for i in range(len(keys))]
+    # A key with at least this many events per window is hot.
+    minNumEvents = len(keys) // 1000
+
+    results = {}
+    for capacity in args.keyedAlerterCapacities:
+        alerter = KeyedAlerter(minNumEvents, winLenSecs, capacity)
+        addEventSecs = addKeyedEvents(alerter, tss, keys, 1)
+        alerter = KeyedAlerter(minNumEvents, winLenSecs, capacity)
+        addEventsSecs = addKeyedEvents(alerter, tss, keys, 1000)
+        numKeys, numEvictedKeys, numAlerts = alerter.getNumKeys(), alerter.numEvictedKeys, len(alerter.getAlerts())
+
+        # Evaluate at the end of the events, and once the last bucket has left the window (when every key is silenced and evicted).
+        genAlertSecs = []
+        for currSecs in (tss[-1], tss[-1] + winLenSecs + alerter.bucketSecs):
+            startSecs = time.perf_counter()
+            with alerter.lock:
+                alerter.genAlert(currSecs)
+            genAlertSecs.append(time.perf_counter() - startSecs)
+        if alerter.getNumKeys() != 0:
+            raise AssertionError('Keys without events in the window were not evicted.')
+
+        tracemalloc.start()
+        alerter = KeyedAlerter(minNumEvents, winLenSecs, capacity)
+        addKeyedEvents(alerter, tss, keys, 1000)
+        currBytes, peakBytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results['capacity%d' % capacity] = {'addEventEventsPerSec': len(keys) / addEventSecs, 'addEventsEventsPerSec': len(keys) / addEventsSecs,
+                                            'memoryMB': currBytes / 2**20, 'numKeys': numKeys, 'numEvictedKeys': numEvictedKeys,
+                                            'numAlerts': numAlerts, 'genAlertMs': 1000 * genAlertSecs[0], 'evictAllMs': 1000 * genAlertSecs[1]}
+        print('keyedAlerter capacity %7d: %8.0f events/sec addEvent, %8.0f events/sec addEvents, %6.1f MB for %d of %d keys '
+              '(%d evicted early), %d alerts, genAlert %.2f ms, evicting all keys %.1f ms' %
+              (capacity, len(keys) / addEventSecs, len(keys) / addEventsSecs, currBytes / 2**20, numKeys, args.numAlertKeys, numEvictedKeys,
+               numAlerts, 1000 * genAlertSecs[0], 1000 * genAlertSecs[1]))
+    return results
+
+
+def benchArchive(args):
+    '''Measures how fast records are appended to an Archive, how much disk space they take, and how long typical queries take over
+    "args.numArchiveRecords" records (source.log repeated, one pass after the other). Checks the results of the queries.'''
+
+    clfParser = ClfParser()
+    with open(args.logFilePath) as f:
+        records = [record for record in (clfParser.parse(line.strip()) for line in f) if record is not None]
+    sections = [LogStats.getSection(record.urlPath) for record in records]
+    spanSecs = records[-1].tsSecs - records[0].tsSecs + 1
+
+    dirPath = tempfile.mkdtemp()
+    try:
+        archivePath = os.path.join(dirPath, 'archive')
+        writer = ArchiveWriter(archivePath)
+        startSecs = time.perf_counter()
+        for i in range(args.numArchiveRecords):
+            # Every pass over the log file is shifted in time, so that the archive covers a longer time range.
+            record = records[i % len(records)]
+            writer.addRecord(record._replace(tsSecs = record.tsSecs + i // len(records) * spanSecs), sections[i % len(records)])
+            if i % 100000 == 99999:
+                writer.flush()
+        writer.flush()
+        writeSecs = time.perf_counter() - startSecs
+        archiveBytes = sum(os.path.getsize(os.path.join(archivePath, fileName)) for fileName in os.listdir(archivePath))
+
+        # A time range covering the middle half of the records, and the expected results of the queries.
+        numPasses, numExtra = divmod(args.numArchiveRecords, len(records))
+        startTsSecs = records[0].tsSecs + numPasses * spanSecs // 4
+        endTsSecs = records[0].tsSecs + numPasses * spanSecs * 3 // 4
+        section2count = Counter()
+        for i, record in enumerate(records):
+            section2count[sections[i]] += numPasses + (1 if i < numExtra else 0)
+
+        results = {'writeRecordsPerSec': args.numArchiveRecords / writeSecs, 'bytesPerRecord': archiveBytes / args.numArchiveRecords}
+        print('archive: %d records written at %.0f records/sec, %.1f bytes/record on disk (%d of them in the columns)' %
+              (args.numArchiveRecords, args.numArchiveRecords / writeSecs, archiveBytes / args.numArchiveRecords,
+               sum(array(typecode).itemsize for typecode in COLUMN2TYPECODE.values())))
+
+        startSecs = time.perf_counter()
+        archive = Archive(archivePath)
+        queries = (
+            ('open'                , lambda: archive.getBlockRanges()),
+            ('count'               , lambda: archive.count()),
+            ('countTimeRange'      , lambda: archive.count(startTsSecs, endTsSecs)),
+            ('topSections'         , lambda: archive.topK('section', 10)),
+            ('topSectionsTimeRange', lambda: archive.topK('section', 10, startTsSecs, endTsSecs)),
+            ('topClientsWhere'     , lambda: archive.topK('remoteHost', 10, where = {'status': '301'})),
+            ('sumResponseBytes'    , lambda: archive.sumResponseBytes(startTsSecs, endTsSecs, where = {'method': 'GET'})),
+        )
+        name2result = {}
+        for name, query in queries:
+            querySecs = time.perf_counter()
+            name2result[name] = query()
+            # Opening includes memory-mapping the columns, which the first query (computing the block time ranges) pays for.
+            results[name + 'Ms'] = 1000 * (time.perf_counter() - (startSecs if name == 'open' else querySecs))
+            print('archive query %-20s: %8.1f ms' % (name, results[name + 'Ms']))
+        archive.close()
+    finally:
+        shutil.rmtree(dirPath)
+
+    if name2result['count'] != args.numArchiveRecords or name2result['topSections'] != section2count.most_common(10):
+        raise AssertionError('The archive queries returned wrong results.')
+    return results
+
+
+def writeLines(logFilePath, lines, linesPerSec, writeSecs):
+    '''Appends the passed lines to the log file at the passed rate (like EmitLogLinesMain does, only faster), recording in "writeSecs"
+    the time at which each line was flushed.'''
+
+    with open(logFilePath, 'a') as f:
+        startSecs = time.perf_counter()
+        for i, line in enumerate(lines):
+            delaySecs = startSecs + i / linesPerSec - time.perf_counter()
+            if delaySecs > 0:
+                time.sleep(delaySecs)
+            f.write(line)
+            f.flush()
+            writeSecs.append(time.perf_counter())
+
+
+def startTailing(stats, runtime):
+    '''Starts tailing the log file of the passed LogStats in the background, exactly like "LogAnalyzer.runForever()" does with the
+    passed runtime (but without reports). Returns a function that stops it.'''
+
+    if runtime == 'asyncio':
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(AsyncRuntime.runStats(stats, 3600, lambda: None))
+        thread = threading.Thread(target = lambda: loop.run_until_complete(asyncio.gather(task, return_exceptions = True)))
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join()
+            loop.close()
+        return stop
+
+    observer = Observer()
+    observer.schedule(stats, LogAnalyzer.getDirPath(stats.config.logFilePath), recursive = False)
+    observer.start()
+
+    def stop():
+        observer.stop()
+        observer.join()
+    return stop
+
+
+def measureLatency(sourceLines, linesPerSec, durationSecs, runtime = 'watchdog', writeOtherFile = False):
+    '''Returns the latencies in milliseconds between lines being written to a tailed log file at the passed rate and them being
+    counted (sorted), the times the lines were written, and the number of times the log file was read. With "writeOtherFile",
+    lines are also written at the same rate to another file in the same directory.'''
+
+    numLines = int(linesPerSec * durationSecs)
+    lines = [sourceLines[i % len(sourceLines)] for i in range(numLines)]
+
+    dirPath = tempfile.mkdtemp()
+    try:
+        logFilePath = os.path.join(dirPath, 'access.log')
+        open(logFilePath, 'w').close()
+        stats = makeStats(logFilePath, runtime = runtime)
+        stopTailing = startTailing(stats, runtime)
+
+        writeSecs, countSecs = [], []
+        writers = [threading.Thread(target = writeLines, args = (logFilePath, lines, linesPerSec, writeSecs))]
+        if writeOtherFile:
+            writers.append(threading.Thread(target = writeLines, args = (os.path.join(dirPath, 'other.log'), lines, linesPerSec, [])))
+        for writer in writers:
+            writer.start()
+
+        # Poll the number of hits and record when each line was counted.
+        timeoutSecs = time.perf_counter() + durationSecs + 10
+        while len(countSecs) < numLines and time.perf_counter() < timeoutSecs:
+            numHits = stats.numHits
+            if numHits > len(countSecs):
+                countSecs.extend([time.perf_counter()] * (numHits - len(countSecs)))
+            else:
+                time.sleep(0.0005)
+
+        for writer in writers:
+            writer.join()
+        stopTailing()
+        numConsumeCalls = stats.metrics.counter('consume_calls_total', '').value
+    finally:
+        shutil.rmtree(dirPath)
+
+    latenciesMs = sorted(1000 * (countSec - writeSec) for writeSec, countSec in zip(writeSecs, countSecs))
+    return latenciesMs, writeSecs, numConsumeCalls
+
+
+def benchLatency(args):
+    '''Measures the latency between a line being written to a tailed log file and it being counted, at various write rates.
+    The log file is tailed exactly like "LogAnalyzer.runForever()" does.'''
+
+    with open(args.logFilePath) as f:
+        sourceLines = f.readlines()
+
+    results = {}
+    for linesPerSec in args.latencyRates:
+        latenciesMs, writeSecs, numConsumeCalls = measureLatency(sourceLines, linesPerSec, args.latencyDurationSecs)
+        numLines = len(writeSecs)
+        achievedLinesPerSec = (numLines - 1) / (writeSecs[-1] - writeSecs[0]) if numLines > 1 else 0
+        results[str(linesPerSec)] = {'achievedLinesPerSec': achievedLinesPerSec, 'numLinesCounted': len(latenciesMs),
+                                     'p50LatencyMs': getPercentile(latenciesMs, 50), 'p90LatencyMs': getPercentile(latenciesMs, 90),
+                                     'p99LatencyMs': getPercentile(latenciesMs, 99), 'maxLatencyMs': latenciesMs[-1]}
+        print('latency %8d lines/sec (achieved %8.0f): %d of %d lines counted, latency p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms' %
+              (linesPerSec, achievedLinesPerSec, len(latenciesMs), numLines, getPercentile(latenciesMs, 50), getPercentile(latenciesMs, 90),
+               getPercentile(latenciesMs, 99), latenciesMs[-1]))
+    return results
+
+
+def benchRuntimes(args):
+    '''Compares the runtimes (see "LogStats.RUNTIMES") tailing a log file while another file in the same directory is written to
+    at the same rate: the latency of lines being counted, and how many times the log file is read per line written.'''
+
+    with open(args.logFilePath) as f:
+        sourceLines = f.readlines()
+
+    results = {}
+    for runtime in RUNTIMES:
+        latenciesMs, writeSecs, numConsumeCalls = measureLatency(sourceLines, args.runtimeRate, args.latencyDurationSecs, runtime,
+                                                                 writeOtherFile = True)
+        results[runtime] = {'numLinesCounted': len(latenciesMs), 'consumeCallsPerLine': numConsumeCalls / len(writeSecs),
+                            'p50LatencyMs': getPercentile(latenciesMs, 50), 'p99LatencyMs': getPercentile(latenciesMs, 99)}
+        print('runtimes %-8s: %d of %d lines counted, %.2f reads of the log file per line, latency p50 %.1f ms, p99 %.1f ms' %
+              (runtime, len(latenciesMs), len(writeSecs), numConsumeCalls / len(writeSecs), getPercentile(latenciesMs, 50),
+               getPercentile(latenciesMs, 99)))
+    return results
+
+
+def readWithReadlines(f, clfParser):
+    '''Parses all the lines of the passed binary file the way the analyzer used to: reading them all and decoding each one.'''
+
+    for line in [line.decode('utf-8', 'replace') for line in f.readlines()]:
+        line = line.strip()
+        if len(line) > 0:
+            clfParser.parse(line)
+
+
+def readWithLineReader(f, clfParser):
+    '''Parses all the lines of the passed binary file read with a LineReader.'''
+
+    reader = LineReader()
+    while True:
+        lines = reader.readLines(f)
+        if len(lines) == 0:
+            break
+        for line in lines:
+            clfParser.parse(line)
+
+
+def benchReader(args):
+    '''Measures the throughput and the peak memory of reading and parsing a burst of "args.numReaderLines" lines (source.log
+    repeated) appended to a log file at once, with "readlines()" and decoding every line, and with a LineReader.'''
+
+    with open(args.logFilePath, 'rb') as f:
+        sourceLines = f.readlines()
+    dirPath = tempfile.mkdtemp()
+    try:
+        filePath = os.path.join(dirPath, 'access.log')
+        with open(filePath, 'wb') as f:
+            for i in range(0, args.numReaderLines, len(sourceLines)):
+                f.writelines(sourceLines[: args.numReaderLines - i])
+
+        results = {}
+        for name, read, buffering in (('readlines', readWithReadlines, -1), ('LineReader', readWithLineReader, 0)):
+            with open(filePath, 'rb', buffering = buffering) as f:
+                startSecs = time.perf_counter()
+                read(f, ClfParser())
+                readSecs = time.perf_counter() - startSecs
+            with open(filePath, 'rb', buffering = buffering) as f:
+                tracemalloc.start()
+                read(f, ClfParser())
+                currBytes, peakBytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            results[name] = {'linesPerSec': args.numReaderLines / readSecs, 'peakMemoryMB': peakBytes / 1e6}
+            print('reader %-10s: %10.0f lines/sec reading and parsing, peak memory %8.1f MB' % (name, args.numReaderLines / readSecs, peakBytes / 1e6))
+    finally:
+        shutil.rmtree(dirPath)
+    return results
+
+
+def replayLines(logFilePath, numLines, numSections, batchSize):
+    '''Returns a tuple (usecPerLine, retainedBlocksPerLine, maxRssMB) of a LogStats object in the current process tailing a log
+    file to which "numLines" lines (the passed log file repeated, a third of them with one of "numSections" synthetic sections)
+    are appended chunk by chunk.'''
+
+    with open(logFilePath) as f:
+        sourceLines = f.readlines()
+    dirPath = tempfile.mkdtemp()
+    try:
+        tailedFilePath = os.path.join(dirPath, 'access.log')
+        open(tailedFilePath, 'w').close()
+        stats = makeStats(tailedFilePath, batchSize = batchSize)
+        gc.collect()
+        numBlocks, processSecs = sys.getallocatedblocks(), 0
+        for start in range(0, numLines, 10000):
+            with open(tailedFilePath, 'a') as f:
+                for i in range(start, min(start + 10000, numLines)):
+                    line = sourceLines[i % len(sourceLines)]
+                    f.write(line.replace('"GET /', '"GET /s%d/' % (i % numSections), 1) if i % 3 == 0 else line)
+            startSecs = time.perf_counter()
+            stats.on_modified(None)
+            processSecs += time.perf_counter() - startSecs
+        gc.collect()
+        if stats.numHits != numLines:
+            raise AssertionError('Counted %d of %d lines.' % (stats.numHits, numLines))
+        return (1e6 * processSecs / numLines, (sys.getallocatedblocks() - numBlocks) / numLines,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+    finally:
+        shutil.rmtree(dirPath)
+
+
+def benchReplay(args):
+    '''Measures the time, the memory blocks left allocated, and the peak memory of counting "args.numReplayLines" lines appended
+    to a tailed log file, one line at a time and in batches. Each mode runs in a fresh process, so that its peak memory is its own.'''
+
+    results = {}
+    for name, batchSize in (('perLine', 1), ('batched', 1000)):
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            usecPerLine, blocksPerLine, maxRssMB = pool.apply(replayLines, (args.logFilePath, args.numReplayLines, args.numReplaySections, batchSize))
+        results[name] = {'usecPerLine': usecPerLine, 'retainedBlocksPerLine': blocksPerLine, 'maxRssMB': maxRssMB}
+        print('replay %-7s: %6.2f usec/line, %6.3f retained memory blocks/line, max RSS %6.1f MB' % (name, usecPerLine, blocksPerLine, maxRssMB))
+    return results
+
+
+def flatten(dct, prefix = ''):
+    '''Returns a flat dict mapping dotted names (e.g. "parser.ClfParser.parseLinesPerSec") to the numbers in the passed nested dict.'''
+
+    ret = {}
+    for key, val in dct.items():
+        if isinstance(val, dict):
+            ret.update(flatten(val, prefix + key + '.'))
+        elif isinstance(val, (int, float)):
+            ret[prefix + key] = val
+    return ret
+
+
+def compareToBaseline(results, baseline):
+    '''Prints each metric in the passed results next to the same metric in the passed baseline results.'''
+
+    currName2val, baseName2val = flatten(results['scenarios']), flatten(baseline['scenarios'])
+    print('%-60s %14s %14s %9s' % ('Metric', 'Baseline', 'Current', 'Change'))
+    for name in sorted(currName2val):
+        if name in baseName2val:
+            baseVal, currVal = baseName2val[name], currName2val[name]
+            change = '%+8.1f%%' % (100 * (currVal - baseVal) / baseVal) if baseVal != 0 else ''
+            print('%-60s %14.2f %14.2f %9s' % (name, baseVal, currVal, change))
+
+
+# The benchmarks that can be selected on the command line. Metrics named "...PerSec" are better when higher, the others when lower.
+def countShardedLines(sourceLines, numFiles, numLinesPerFile, numWorkers):
+    '''Returns the number of lines per second counted by a Coordinator with "numWorkers" worker processes tailing "numFiles" log
+    files, to each of which "numLinesPerFile" lines (the passed lines repeated) are appended at once.'''
+
+    dirPath = tempfile.mkdtemp()
+    try:
+        filePaths = [os.path.join(dirPath, 'site%d.log' % i) for i in range(numFiles)]
+        for filePath in filePaths:
+            open(filePath, 'w').close()
+        config = Config(logFilePath = None, numHitsToGenAlert = 110, alertWinLenSecs = 120, useCurrTimestamps = False, alerterBackend = 'thread')
+        coordinator = Coordinator(config, filePaths, numWorkers)
+        try:
+            lines = [sourceLines[i % len(sourceLines)] for i in range(numLinesPerFile)]
+            numLinesRead = coordinator.stats.metrics.counter('lines_read_total', 'Number of log lines read.')
+            startSecs = time.perf_counter()
+            for filePath in filePaths:
+                with open(filePath, 'a') as f:
+                    f.writelines(lines)
+            timeoutSecs = startSecs + 600
+            while numLinesRead.value < numFiles * numLinesPerFile and time.perf_counter() < timeoutSecs:
+                coordinator.mergeDeltas(time.time() + 0.01)
+            if numLinesRead.value != numFiles * numLinesPerFile:
+                raise AssertionError('Counted %d of %d lines.' % (numLinesRead.value, numFiles * numLinesPerFile))
+            return numFiles * numLinesPerFile / (time.perf_counter() - startSecs)
+        finally:
+            coordinator.close()
+    finally:
+        shutil.rmtree(dirPath)
+
+
+def benchSharding(args):
+    '''Measures the throughput of tailing "args.numShardFiles" log files with various numbers of worker processes (see "Sharding"),
+    when "args.numShardLinesPerFile" lines are appended to each of them at once.'''
+
+    with open(args.logFilePath) as f:
+        sourceLines = f.readlines()
+
+    results = {}
+    for numWorkers in args.shardWorkers:
+        linesPerSec = countShardedLines(sourceLines, args.numShardFiles, args.numShardLinesPerFile, numWorkers)
+        results[str(numWorkers)] = {'linesPerSec': linesPerSec, 'speedup': linesPerSec / results[str(args.shardWorkers[0])]['linesPerSec']
+                                    if len(results) > 0 else 1.0}
+        print('sharding %2d workers: %10.0f lines/sec (%.2fx), %d CPUs' % (numWorkers, linesPerSec, results[str(numWorkers)]['speedup'], os.cpu_count()))
+    return results
+
+
+def benchCompressed(args):
+    '''Measures how fast "args.numCompressedFiles" rotated log files of "args.numCompressedLinesPerFile" lines each are backfilled
+    when they are plain or compressed, with various numbers of worker processes. Decompressing alone is measured too: with
+    decompression pipelined with parsing, backfilling a compressed file should take about as long as the slower of the two, not
+    their sum.'''
+
+    with open(args.logFilePath, 'rb') as f:
+        sourceLines = f.readlines()
+    lines = [sourceLines[i % len(sourceLines)] for i in range(args.numCompressedLinesPerFile)]
+    numLines = args.numCompressedFiles * args.numCompressedLinesPerFile
+
+    results = {}
+    dirPath = tempfile.mkdtemp()
+    try:
+        for extension in ('', '.gz', '.bz2', '.xz'):
+            filePaths = [os.path.join(dirPath, 'access.log.%d%s' % (i, extension)) for i in range(args.numCompressedFiles)]
+            for filePath in filePaths:
+                with (Backfill.DECOMPRESSORS[extension].open(filePath, 'wb') if len(extension) > 0 else open(filePath, 'wb')) as f:
+                    f.writelines(lines)
+            fileBytes = sum(os.path.getsize(filePath) for filePath in filePaths)
+
+            startSecs = time.perf_counter()
+            for filePath in filePaths:
+                with Backfill.openLogFile(filePath) as f:
+                    while len(f.read(Backfill.DECOMPRESSED_CHUNK_BYTES)) > 0:
+                        pass
+            readSecs = time.perf_counter() - startSecs
+
+            name = 'plain' if len(extension) == 0 else extension[1 :]
+            results[name] = {'fileBytes': fileBytes, 'readLinesPerSec': numLines / readSecs}
+            for numWorkers in args.compressedWorkers:
+                startSecs = time.perf_counter()
+                stats = Backfill.backfill(filePaths, numWorkers)
+                backfillSecs = time.perf_counter() - startSecs
+                assert stats.numHits + stats.numBadLines == numLines
+                results[name][str(numWorkers)] = {'linesPerSec': numLines / backfillSecs}
+                print('compressed %-5s: %5.1f MB, %10.0f lines/sec read (and decompressed), %10.0f lines/sec backfilled with %d workers' %
+                      (name, fileBytes / 1e6, numLines / readSecs, numLines / backfillSecs, numWorkers))
+            for filePath in filePaths:
+                os.remove(filePath)
+    finally:
+        shutil.rmtree(dirPath)
+    return results
+
+
+def renderUnderLock(stats):
+    '''Formats the statistics of the passed LogStats the way reports used to: entirely under its lock, reading the top sections by
+    popping them off the heap and pushing them back.'''
+
+    with stats.lock:
+        heap = stats.sectionTracker
+        sectionId2count = {}
+        for i in range(min(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW, heap.getNumObjs())):
+            sectionId, count = heap.popMaxObj()
+            sectionId2count[sectionId] = count
+        for sectionId, count in sectionId2count.items():
+            heap.addObj(sectionId, count)
+        ret = LogStats.getStatsStr(stats.sectionIds.decode(sectionId2count), heap.getNumObjs(), stats.numHits, stats.responseBytesTot,
+                                   stats.numBadLines, stats.retCode2count, stats.method2count, stats.clients.getCount(),
+                                   stats.sectionIds.decode(LogStats.getSection2numClients(sectionId2count, stats.sectionId2clients)),
+                                   stats.responseBytes,
+                                   stats.sectionIds.decode({sectionId: stats.sectionId2responseBytes[sectionId] for sectionId in sectionId2count
+                                                            if sectionId in stats.sectionId2responseBytes}))
+        nowSecs = time.time()
+        for numBuckets in sorted({1, stats.config.rollingNumBuckets}):
+            ret += LogStats.getWindowStr(stats.rollingStats.getWindow(numBuckets, nowSecs), stats.rollingStats.getWindowSecs(numBuckets, nowSecs))
+    return ret
+
+
+def pollDuringIngestion(stats, batches, poll, numPollers, pollIntervalSecs, durationSecs):
+    '''Merges the passed batches into the passed LogStats over and over for "durationSecs" seconds, while "numPollers" threads call
+    "poll()" every "pollIntervalSecs" seconds. Returns the sorted durations in milliseconds of the merges, and the number of polls.'''
+
+    stopEvent, numPolls = threading.Event(), [0]
+
+    def runPoller():
+        while not stopEvent.wait(pollIntervalSecs):
+            poll()
+            numPolls[0] += 1
+
+    pollers = [threading.Thread(target = runPoller) for i in range(numPollers)]
+    for poller in pollers:
+        poller.start()
+    mergeMs, endSecs = [], time.perf_counter() + durationSecs
+    while time.perf_counter() < endSecs:
+        for batch in batches:
+            startSecs = time.perf_counter()
+            stats.mergeBatch(batch)
+            mergeMs.append(1000 * (time.perf_counter() - startSecs))
+    stopEvent.set()
+    for poller in pollers:
+        poller.join()
+    return sorted(mergeMs), numPolls[0]
+
+
+def benchSnapshot(args):
+    '''Measures how reports and dashboards polling the statistics hold up ingestion: the duration of merging batches of lines into
+    LogStats holding "args.numSnapshotSections" sections, while "args.numPollers" threads (each polling every "args.pollIntervalSecs"
+    seconds) render reports under the lock (the way they used to be), render them from snapshots, or fetch the (cached) JSON snapshot.'''
+
+    with open(args.logFilePath) as f:
+        lines = f.readlines()
+    batches = [LogStats.parseLogLines(lines[i : i + 1000], LogParser()) for i in range(0, len(lines), 1000)]
+
+    dirPath = tempfile.mkdtemp()
+    try:
+        logFilePath = os.path.join(dirPath, 'access.log')
+        open(logFilePath, 'w').close()
+        # Short rolling buckets, so that the windows shown in reports are not empty.
+        stats = makeStats(logFilePath, rollingBucketSecs = 1)
+        for start in range(0, args.numSnapshotSections, 10000):
+            batch = StatsBatch()
+            for i in range(start, min(start + 10000, args.numSnapshotSections)):
+                batch.section2count['/s%d' % i] = 1 + i % 100
+            stats.mergeBatch(batch)
+
+        results = {}
+        for name, poll, numPollers in (('noPollers', None, 0), ('lockedRender', lambda: renderUnderLock(stats), args.numPollers),
+                                       ('snapshotRender', lambda: str(stats), args.numPollers),
+                                       ('snapshotJson', stats.getSnapshotJson, args.numPollers)):
+            mergeMs, numPolls = pollDuringIngestion(stats, batches, poll, numPollers, args.pollIntervalSecs, args.snapshotDurationSecs)
+            results[name] = {'mergesPerSec': len(mergeMs) / args.snapshotDurationSecs, 'p99MergeMs': getPercentile(mergeMs, 99),
+                             'maxMergeMs': mergeMs[-1], 'pollsPerSec': numPolls / args.snapshotDurationSecs}
+            print('snapshot %-14s: %7.0f merges/sec, merge p99 %6.2f ms, max %6.2f ms, %7.0f polls/sec' %
+                  (name, len(mergeMs) / args.snapshotDurationSecs, getPercentile(mergeMs, 99), mergeMs[-1], numPolls / args.snapshotDurationSecs))
+
+        stats.generation += 1
+        startSecs = time.perf_counter()
+        stats.getSnapshot()
+        results['snapshotMs'] = 1000 * (time.perf_counter() - startSecs)
+        startSecs = time.perf_counter()
+        renderUnderLock(stats)
+        results['lockedRenderMs'] = 1000 * (time.perf_counter() - startSecs)
+        print('snapshot taking a snapshot: %.3f ms, rendering under the lock: %.3f ms' % (results['snapshotMs'], results['lockedRenderMs']))
+    finally:
+        shutil.rmtree(dirPath)
+    return results
+
+
+def makeTraffic(numDays, rng):
+    '''Returns the lists (tss, statuses, sections) of "numDays" days of synthetic requests, one day starting at timestamp 0: about 2
+    requests per second on average, following a daily cycle, with a 10 minute burst of 5 times as many every 3 hours. Every 20th
+    request fails, and the sections are drawn from a few hundred with skewed popularity.'''
+
+    tss, statuses, sections = [], [], []
+    for tsSecs in range(numDays * 86400):
+        rate = 2 + 1.5 * math.sin(2 * math.pi * tsSecs / 86400)
+        if tsSecs % (3 * 3600) < 600:
+            rate *= 5
+        numEvents = int(rate + rng.random())
+        tss.extend([tsSecs] * numEvents)
+        for i in range(numEvents):
+            statuses.append('500' if rng.random() < 0.05 else '200')
+            sections.append('/section%d' % int(rng.paretovariate(1)))
+    return tss, statuses, sections
+
+
+def benchAlertTimeline(args):
+    '''Measures how fast "args.numAlertReplayDays" days of synthetic traffic are replayed in event time (see "Replay.Replayer")
+    through various alerters, and records the number of transitions they generate, which must not change unless the alerters do.'''
+
+    tss, statuses, sections = makeTraffic(args.numAlertReplayDays, random.Random(0))
+    rules = tuple('5xx:ratio:0.%02d:60' % (5 + i) if i % 2 == 0 else '%dxx:count:100:10' % (2 + i % 4) for i in range(args.numAlertRules))
+    name2config = {
+        'thread'                         : Config(None, 1000, 120, False, alerterBackend = 'thread'),
+        'engine'                         : Config(None, 1000, 120, False, alerterBackend = 'engine'),
+        'engine+%drules' % len(rules)    : Config(None, 1000, 120, False, alerterBackend = 'engine', alertRules = rules),
+        'thread+sections'                : Config(None, 1000, 120, False, alerterBackend = 'thread', sectionAlertHits = 200),
+    }
+
+    results = {}
+    for name, config in sorted(name2config.items()):
+        startSecs = time.perf_counter()
+        replayer = Replayer(config)
+        # Feed the events about a day at a time, like the byte ranges of a log file.
+        for i in range(0, len(tss), 200000):
+            replayer.addEvents(tss[i : i + 200000], statuses[i : i + 200000], sections[i : i + 200000])
+        transitions = replayer.finish()
+        elapsedSecs = time.perf_counter() - startSecs
+        results[name] = {'eventsPerSec': len(tss) / elapsedSecs, 'daysPerSec': args.numAlertReplayDays / elapsedSecs,
+                         'numTransitions': len(transitions)}
+        print('alertTimeline %-15s: %10.0f events/sec, %6.1f days/sec, %6d transitions' %
+              (name, len(tss) / elapsedSecs, args.numAlertReplayDays / elapsedSecs, len(transitions)))
+    return results
+
+
+SCENARIO2FUNC = {
+    'parser'              : benchParser,
+    'sectionTrackers'     : benchSectionTrackers,
+    'sectionTrackerMemory': benchSectionTrackerMemory,
+    'distinctClients'     : benchDistinctClients,
+    'alerter'             : benchAlerter,
+    'keyedAlerter'        : benchKeyedAlerter,
+    'archive'             : benchArchive,
+    'latency'             : benchLatency,
+    'runtimes'            : benchRuntimes,
+    'replay'              : benchReplay,
+    'reader'              : benchReader,
+    'sharding'            : benchSharding,
+    'snapshot'            : benchSnapshot,
+    'alertTimeline'       : benchAlertTimeline,
+    'compressed'          : benchCompressed,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', required = False, type = str, nargs = '+', default = sorted(SCENARIO2FUNC), choices = sorted(SCENARIO2FUNC),
+                        help = 'The benchmarks to run.')
+    parser.add_argument('--outputPath', required = False, type = str, default = None,
+                        help = 'The file to write the results to as JSON. By default they are written to stdout, and the progress '
+                               'of the benchmarks (always written to stderr) is kept out of it.')
+    parser.add_argument('--baselinePath', required = False, type = str, default = None,
+                        help = 'A JSON file written by an earlier run, to compare the results to.')
+    parser.add_argument('--logFilePath', required = False, type = str, default = 'source.log',
+                        help = 'The log file to run the benchmarks on.')
+    parser.add_argument('--numRepeats', required = False, type = int, default = 3,
+                        help = 'The number of passes over the log file when measuring parsing throughput.')
+    parser.add_argument('--sectionCardinalities', required = False, type = int, nargs = '+', default = [100, 10000, 100000],
+                        help = 'The numbers of distinct sections at which the section trackers are measured.')
+    parser.add_argument('--numTrackerOps', required = False, type = int, default = 200000,
+                        help = 'The number of "addObj()" calls made to each section tracker.')
+    parser.add_argument('--numSyntheticSections', required = False, type = int, default = 1000000,
+                        help = 'The number of unique sections added to each section tracker when measuring memory.')
+    parser.add_argument('--sectionTrackerCapacity', required = False, type = int, default = 10000,
+                        help = 'The capacity of the SpaceSaving section tracker.')
+    parser.add_argument('--numSyntheticClients', required = False, type = int, default = 1000000,
+                        help = 'The number of distinct clients requests of the synthetic stream are drawn from.')
+    parser.add_argument('--numClientEvents', required = False, type = int, default = 2000000,
+                        help = 'The number of requests in the synthetic stream used to measure distinct client counting.')
+    parser.add_argument('--clientSketchPrecisions', required = False, type = int, nargs = '+', default = [10, 12, 14],
+                        help = 'The HyperLogLog precisions compared to exact distinct client counting.')
+    parser.add_argument('--numAlerterEvents', required = False, type = int, default = 200000,
+                        help = 'The number of events added to the in-process alerter (the manager one gets 1%% of them).')
+    parser.add_argument('--numAlertRules', required = False, type = int, default = 10,
+                        help = 'The number of rules (besides the hits one) of the "engine" alerter measured with many rules.')
+    parser.add_argument('--numAlertKeys', required = False, type = int, default = 100000,
+                        help = 'The number of distinct keys (sections) of the events added to the per-key alerter.')
+    parser.add_argument('--numKeyedAlerterEvents', required = False, type = int, default = 1000000,
+                        help = 'The number of events added to the per-key alerter.')
+    parser.add_argument('--keyedAlerterCapacities', required = False, type = int, nargs = '+', default = [100000, 10000],
+                        help = 'The maximum numbers of keys of the per-key alerter to measure.')
+    parser.add_argument('--numArchiveRecords', required = False, type = int, default = 2000000,
+                        help = 'The number of records written to (and queried from) the archive.')
+    parser.add_argument('--numReplayLines', required = False, type = int, default = 300000,
+                        help = 'The number of lines appended to the tailed log file when measuring per-line costs and memory.')
+    parser.add_argument('--numReplaySections', required = False, type = int, default = 5000,
+                        help = 'The number of synthetic sections of the lines appended when measuring per-line costs and memory.')
+    parser.add_argument('--numReaderLines', required = False, type = int, default = 1000000,
+                        help = 'The number of lines of the burst read at once when comparing the ways of reading lines.')
+    parser.add_argument('--latencyRates', required = False, type = int, nargs = '+', default = [100, 1000, 10000],
+                        help = 'The rates (in lines per second) at which lines are written when measuring end-to-end latency.')
+    parser.add_argument('--latencyDurationSecs', required = False, type = float, default = 3,
+                        help = 'For how long lines are written at each rate when measuring end-to-end latency.')
+    parser.add_argument('--runtimeRate', required = False, type = int, default = 1000,
+                        help = 'The rate (in lines per second) at which lines are written when comparing the runtimes.')
+    parser.add_argument('--numShardFiles', required = False, type = int, default = 8,
+                        help = 'The number of log files tailed when measuring sharded ingestion.')
+    parser.add_argument('--numShardLinesPerFile', required = False, type = int, default = 100000,
+                        help = 'The number of lines appended to each log file when measuring sharded ingestion.')
+    parser.add_argument('--shardWorkers', required = False, type = int, nargs = '+', default = [1, 2, 4, 8],
+                        help = 'The numbers of worker processes at which sharded ingestion is measured.')
+    parser.add_argument('--numSnapshotSections', required = False, type = int, default = 100000,
+                        help = 'The number of sections of the statistics whose snapshots are measured.')
+    parser.add_argument('--numPollers', required = False, type = int, default = 4,
+                        help = 'The number of threads polling the statistics while lines are merged into them.')
+    parser.add_argument('--pollIntervalSecs', required = False, type = float, default = 0.05,
+                        help = 'How often each of the threads polls the statistics while lines are merged into them.')
+    parser.add_argument('--snapshotDurationSecs', required = False, type = float, default = 3,
+                        help = 'For how long lines are merged into the statistics in each snapshot scenario.')
+    parser.add_argument('--numAlertReplayDays', required = False, type = int, default = 7,
+                        help = 'The number of days of synthetic traffic replayed through the alerters in event time.')
+    parser.add_argument('--numCompressedFiles', required = False, type = int, default = 4,
+                        help = 'The number of rotated log files backfilled when measuring the ingestion of compressed logs.')
+    parser.add_argument('--numCompressedLinesPerFile', required = False, type = int, default = 100000,
+                        help = 'The number of lines of each rotated log file.')
+    parser.add_argument('--compressedWorkers', required = False, type = int, nargs = '+', default = [1, 4],
+                        help = 'The numbers of worker processes with which the rotated log files are backfilled.')
+    args = parser.parse_args()
+
+    # Only the results go to stdout, so that they can be redirected to a file and passed back as "--baselinePath". Whatever the
+    # benchmarks (and the comparison to the baseline) print goes to stderr.
+    results = {'python': platform.python_version(), 'platform': platform.platform(), 'timestamp': time.time(), 'scenarios': {}}
+    with contextlib.redirect_stdout(sys.stderr):
+        for scenario in args.scenarios:
+            results['scenarios'][scenario] = SCENARIO2FUNC[scenario](args)
+
+    if args.outputPath is None:
+        print(json.dumps(results, indent = 2, sort_keys = True))
+    else:
+        with open(args.outputPath, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+    if args.baselinePath is not None:
+        with open(args.baselinePath) as f, contextlib.redirect_stdout(sys.stderr):
+            compareToBaseline(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
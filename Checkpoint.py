@@ -0,0 +1,42 @@
+import json, os
+from collections import namedtuple
+
+from StatsBatch import StatsBatch
+
+
+# The state needed to resume analyzing a log file: the inode of the file, the byte offset up to which it has been consumed,
+# a StatsBatch holding the statistics of everything consumed so far, and the number of records in the archive (see "Archive"),
+# or None if there is no archive.
+Checkpoint = namedtuple('Checkpoint', ('inode', 'offset', 'stats', 'archiveNumRecords'))
+Checkpoint.__new__.__defaults__ = (None,)
+
+
+def saveCheckpoint(filePath, checkpoint):
+    '''Atomically replaces the checkpoint stored at the passed file path. The checkpoint is first written to a temporary file
+    in the same directory, which is then renamed over the old checkpoint, so a crash never leaves a partially written checkpoint.
+    The directory is synced after the rename, so that a crash cannot undo it and roll back to an older checkpoint.'''
+
+    tmpFilePath = filePath + '.tmp'
+    with open(tmpFilePath, 'w') as f:
+        json.dump({'inode': checkpoint.inode, 'offset': checkpoint.offset, 'stats': checkpoint.stats.toDict(),
+                   'archiveNumRecords': checkpoint.archiveNumRecords}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFilePath, filePath)
+    dirFd = os.open(os.path.dirname(os.path.abspath(filePath)), os.O_RDONLY)
+    try:
+        os.fsync(dirFd)
+    finally:
+        os.close(dirFd)
+
+
+def loadCheckpoint(filePath):
+    '''Returns the checkpoint stored at the passed file path, or None if there is none.'''
+
+    try:
+        with open(filePath) as f:
+            dct = json.load(f)
+    except FileNotFoundError:
+        return None
+    # Checkpoints written by older versions do not have the number of archived records.
+    return Checkpoint(dct['inode'], dct['offset'], StatsBatch.fromDict(dct['stats']), dct.get('archiveNumRecords'))
@@ -0,0 +1,117 @@
+import calendar, re
+from datetime import datetime
+from collections import namedtuple
+
+
+# A parsed log line reduced to the fields "LogStats.updateStats()" needs. "method" and "urlPath" are None for lines like
+# '... "-" 408 -' (no request line), and "responseBytes" is None when the log shows '-' instead of a byte count. "remoteHost" is
+# the client address, which defaults to None.
+LogRecord = namedtuple('LogRecord', ('tsSecs', 'method', 'urlPath', 'status', 'responseBytes', 'remoteHost'))
+LogRecord.__new__.__defaults__ = (None,)
+
+
+class ClfParser:
+    '''A fast parser for Common Log Format lines. A single precompiled pattern covers both the regular format
+    ('%a %l %u %t "%m %U %H" %s %b') and the alternative one without a request line ('%a %l %u %t "-" %s %b').
+    Lines that do not match, or whose timestamp is out of range (e.g. "31/Feb"), are left to the caller, which is expected to
+    fall back to "apache_log_parser".'''
+
+    # https://en.wikipedia.org/wiki/Common_Log_Format
+    # The pattern is deliberately strict: anything unusual (spaces inside the URL, odd timestamps, trailing fields) fails to match,
+    # so that the slower but more lenient "apache_log_parser" gets a chance to handle it.
+    PATTERN = re.compile(
+        r'((?:\d{1,3}\.){3}\d{1,3}) '                      # %a - IPv4 address. IPv6 addresses are rare and handled by the fallback.
+        r'\S+ \S+ '                                        # %l %u
+        r'\[(\d\d/\w\w\w/\d{4}:\d\d:\d\d:\d\d [+-]\d{4})\] '  # %t
+        r'"(?:(\S+) (\S+) \S+|-)" '                        # "%m %U %H" or "-"
+        r'(\d+|-) (\d+|-)$')                               # %s %b
+    # The same pattern for lines given as bytes-like objects (e.g. by a LineReader).
+    BYTES_PATTERN = re.compile(PATTERN.pattern.encode('ascii'))
+
+    MONTH2NUM = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6, 'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+
+    # The timestamp cache is cleared once it holds this many entries. Log lines arrive in (roughly) chronological order,
+    # so only the most recent few seconds are ever hit and there is no point in a smarter eviction policy.
+    MAX_CACHED_TIMESTAMPS = 1024
+
+
+    def __init__(self):
+        self.tsStr2secs = {}  # Cache of timestamp strings (with one second resolution) to seconds since the epoch.
+
+
+    def parse(self, line):
+        '''Returns a LogRecord for the passed (stripped) log line, or None if the line does not match the pattern. The line is
+        either a string or a bytes-like object, of which only the fields we keep are decoded.'''
+
+        if not isinstance(line, str):
+            return self.parseBytes(line)
+        match = ClfParser.PATTERN.match(line)
+        if match is None:
+            return None
+        remoteHost, tsStr, method, urlPath, status, responseBytes = match.groups()
+        tsSecs = self.getTsSecs(tsStr)
+        if tsSecs is None:
+            return None
+        return LogRecord(tsSecs, method, urlPath, status, None if responseBytes == '-' else int(responseBytes), remoteHost)
+
+
+    def parseBytes(self, line):
+        '''Like "parse()", for a bytes-like line (e.g. a memoryview returned by a LineReader).'''
+
+        match = ClfParser.BYTES_PATTERN.match(line)
+        if match is None:
+            return None
+        remoteHost, tsStr, method, urlPath, status, responseBytes = match.groups()
+        # The timestamp is only decoded when it is not in the cache, and "int()" takes bytes as they are.
+        tsSecs = self.getTsSecs(tsStr)
+        if tsSecs is None:
+            return None
+        return LogRecord(tsSecs, None if method is None else method.decode('utf-8', 'replace'),
+                         None if urlPath is None else urlPath.decode('utf-8', 'replace'), status.decode('ascii'),
+                         None if responseBytes == b'-' else int(responseBytes), remoteHost.decode('ascii'))
+
+
+    def getTsSecs(self, tsStr):
+        '''Converts a CLF timestamp string such as "21/Apr/2018:01:50:25 -0400" (or the same as bytes) to seconds since the epoch,
+        or returns None if the timestamp is out of range.'''
+
+        tsSecs = self.tsStr2secs.get(tsStr)
+        if tsSecs is None:
+            try:
+                tsSecs = ClfParser.convertTsStr(tsStr if isinstance(tsStr, str) else tsStr.decode('ascii'))
+            except ValueError:
+                return None
+            if len(self.tsStr2secs) >= ClfParser.MAX_CACHED_TIMESTAMPS:
+                self.tsStr2secs.clear()
+            self.tsStr2secs[tsStr] = tsSecs
+        return tsSecs
+
+
+    @staticmethod
+    def convertTsStr(tsStr):
+        '''Converts a CLF timestamp string to seconds since the epoch. Raises ValueError if a field is out of range.'''
+
+        fields = (int(tsStr[7:11]), ClfParser.MONTH2NUM[tsStr[3:6]], int(tsStr[0:2]), int(tsStr[12:14]), int(tsStr[15:17]), int(tsStr[18:20]))
+        # "calendar.timegm()" would carry e.g. "31/Feb" over to March, whereas datetime rejects it, like "apache_log_parser" does.
+        # This only runs once per distinct second thanks to the cache.
+        datetime(*fields)
+        tsSecs = calendar.timegm(fields)
+        # The local time is UTC plus the offset, so we subtract the offset to get back to UTC.
+        offsetSecs = int(tsStr[22:24]) * 3600 + int(tsStr[24:26]) * 60
+        return tsSecs - offsetSecs if tsStr[21] == '+' else tsSecs + offsetSecs
+
+
+    @staticmethod
+    def fromApacheTokens(toks):
+        '''Converts the dictionary returned by an "apache_log_parser" parser to a LogRecord.'''
+
+        # https://github.com/rory/apache-log-parser
+        # https://stackoverflow.com/questions/8777753/converting-datetime-date-to-utc-timestamp-in-python/8778548#8778548
+        tsSecs = calendar.timegm(toks['time_received_utc_datetimeobj'].timetuple())
+        try:
+            responseBytes = int(toks['response_bytes_clf'])
+        except ValueError:
+            # Raised if the string cannot be interpreted as an integer. In that case, it should be a '-'.
+            responseBytes = None
+        # Method and URL path will be missing if LOG_FORMAT_ALT was used to parse the log line.
+        return LogRecord(tsSecs, toks.get('method'), toks.get('url_path'), toks['status'], responseBytes, toks.get('remote_ip'))
@@ -0,0 +1,87 @@
+import unittest
+
+import apache_log_parser
+
+from ClfParser import ClfParser, LogRecord
+from LogParser import LogParser
+
+
+class ClfParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = ClfParser()
+
+
+    def tearDown(self):
+        pass
+
+
+    def testRegularLine(self):
+        record = self.parser.parse('174.64.3.184 - - [21/Apr/2018:01:50:25 -0400] "GET /transits/moon-trine-mercury/ HTTP/1.1" 200 15048')
+        self.assertEqual(LogRecord(1524289825, 'GET', '/transits/moon-trine-mercury/', '200', 15048, '174.64.3.184'), record)
+
+
+    def testLineWithoutRequest(self):
+        record = self.parser.parse('77.118.251.160 - - [21/Apr/2018:02:19:03 -0400] "-" 408 -')
+        self.assertEqual(LogRecord(1524291543, None, None, '408', None, '77.118.251.160'), record)
+
+
+    def testPositiveOffset(self):
+        record = self.parser.parse('10.0.0.1 - - [01/Jan/2018:05:30:00 +0530] "GET / HTTP/1.1" 200 1')
+        self.assertEqual(1514764800, record.tsSecs)
+
+
+    def testUnusualLinesAreLeftToFallback(self):
+        self.assertIsNone(self.parser.parse('10.0.0.1 - - [21/Apr/2018:01:50:25 -0400] "GET /a b HTTP/1.1" 200 1'))
+        self.assertIsNone(self.parser.parse('10.0.0.1 - - [21/Apr/2018:01:50:25 -0400] "GET / HTTP/1.1" 200 1 "extra"'))
+        self.assertIsNone(self.parser.parse('garbage'))
+
+
+    def testOutOfRangeTimestampsAreBadLines(self):
+        logParser, slowLogParser = LogParser(), LogParser(useFastParser = False)
+        for tsStr in ('31/Feb/2020:10:00:00 +0000', '29/Feb/2019:10:00:00 +0000', '00/Apr/2020:10:00:00 +0000', '30/Apr/2020:24:00:00 +0000',
+                      '30/Apr/2020:10:60:00 +0000', '30/Apr/2020:10:00:60 +0000'):
+            line = '10.0.0.1 - - [%s] "GET / HTTP/1.1" 200 1' % tsStr
+            # The fast parser leaves them to the fallback (rather than carrying e.g. "31/Feb" over to March), which rejects them too.
+            self.assertIsNone(self.parser.parse(line))
+            self.assertIsNone(self.parser.parse(memoryview(line.encode())))
+            self.assertIsNone(logParser.parse(line))
+            self.assertIsNone(slowLogParser.parse(line))
+        line = '10.0.0.1 - - [29/Feb/2020:10:00:00 +0000] "GET / HTTP/1.1" 200 1'
+        self.assertEqual(1582970400, self.parser.parse(line).tsSecs)
+        self.assertEqual(self.parser.parse(line), slowLogParser.parse(line))
+
+
+    def testBytesLinesMatchStrings(self):
+        logParser = LogParser()
+        with open('source.log', 'rb') as f:
+            lines = [line.strip() for line in f] + [b'10.0.0.1 - - [21/Apr/2018:01:50:25 -0400] "GET /a b HTTP/1.1" 200 1', b'garbage']
+        for line in lines:
+            self.assertEqual(self.parser.parse(line.decode()), self.parser.parse(memoryview(line)))
+            self.assertEqual(logParser.parse(line.decode()), logParser.parse(memoryview(line)))
+        # The fallback parser gets the lines the fast one leaves.
+        self.assertIsNotNone(logParser.parse(memoryview(lines[-2])))
+
+
+    def testTimestampCacheIsBounded(self):
+        for secs in range(2 * ClfParser.MAX_CACHED_TIMESTAMPS):
+            tsStr = '21/Apr/2018:%02d:%02d:%02d -0400' % (secs // 3600, secs // 60 % 60, secs % 60)
+            self.assertEqual(1524283200 + secs, self.parser.getTsSecs(tsStr))
+        self.assertLessEqual(len(self.parser.tsStr2secs), ClfParser.MAX_CACHED_TIMESTAMPS)
+
+
+    def testMatchesApacheLogParserOnSourceLog(self):
+        logParser = apache_log_parser.make_parser(LogParser.LOG_FORMAT)
+        logParserAlt = apache_log_parser.make_parser(LogParser.LOG_FORMAT_ALT)
+        with open('source.log') as f:
+            for line in f:
+                line = line.strip()
+                try:
+                    logTokens = logParser(line)
+                except apache_log_parser.LineDoesntMatchException:
+                    logTokens = logParserAlt(line)
+                self.assertEqual(ClfParser.fromApacheTokens(logTokens), self.parser.parse(line))
+
+
+if __name__ == '__main__':
+    unittest.main()
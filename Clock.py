@@ -0,0 +1,26 @@
+import time
+
+
+def wallClock():
+    '''Returns the current time in seconds since the epoch. This is the default clock of the alerters. It looks up "time.time()"
+    on every call, so that patching it (e.g. in tests) affects alerters created earlier too.'''
+
+    return time.time()
+
+
+class SimulatedClock:
+    '''A clock that only moves when told to, for running alerters in event time (see "Replay"). Calling it returns the current
+    simulated time in seconds.'''
+
+    def __init__(self, nowSecs = 0):
+        self.nowSecs = nowSecs
+
+
+    def __call__(self):
+        return self.nowSecs
+
+
+    def set(self, nowSecs):
+        '''Moves the clock to the passed time. Time never goes backwards, so an earlier time is ignored.'''
+
+        self.nowSecs = max(self.nowSecs, nowSecs)
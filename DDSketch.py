@@ -0,0 +1,129 @@
+import math
+
+
+class DDSketch:
+    '''Estimates quantiles of a stream of non-negative numbers (the DDSketch algorithm of Masson et al.). Values are counted in
+    buckets whose bounds grow geometrically by a factor of gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy), so every
+    reported quantile is within "relativeAccuracy" of a value of the stream with the right rank. Adding a value takes O(1) time.
+
+    The number of buckets grows with the logarithm of the range of the values (e.g. about 1200 buckets for 1 byte to 10 GB with
+    the default accuracy of 1%), and is capped at "maxNumBuckets" by collapsing the lowest buckets, which only affects the accuracy
+    of the lowest quantiles. Sketches with the same accuracy are mergeable: merging adds up the bucket counts, which gives exactly
+    the sketch of the union of the streams.'''
+
+    DEFAULT_RELATIVE_ACCURACY = 0.01
+    DEFAULT_MAX_NUM_BUCKETS = 2048
+
+
+    def __init__(self, relativeAccuracy = DEFAULT_RELATIVE_ACCURACY, maxNumBuckets = DEFAULT_MAX_NUM_BUCKETS):
+        assert 0 < relativeAccuracy < 1 and maxNumBuckets > 0
+        self.relativeAccuracy, self.maxNumBuckets = relativeAccuracy, maxNumBuckets
+        self.gamma = (1 + relativeAccuracy) / (1 - relativeAccuracy)
+        self.logGamma = math.log(self.gamma)
+        self.idx2count = {}  # Maps bucket index i to the number of values v with gamma**(i - 1) < v <= gamma**i.
+        self.zeroCount = 0  # The number of values too small for any bucket (i.e. zeros).
+        self.count = 0
+        self.max = 0
+
+
+    def getIndex(self, value):
+        '''Returns the index of the bucket of the passed positive value.'''
+
+        return math.ceil(math.log(value) / self.logGamma)
+
+
+    def add(self, value):
+        '''Adds the passed non-negative value.'''
+
+        self.addIndex(self.getIndex(value) if value > 0 else None, value)
+
+
+    def addIndex(self, idx, value):
+        '''Adds the passed value, whose bucket index is "idx" (as returned by "getIndex()", or None for zero). Adding the same value
+        to several sketches this way saves computing its index more than once.'''
+
+        self.count += 1
+        if value > self.max:
+            self.max = value
+        if idx is None:
+            self.zeroCount += 1
+            return
+        count = self.idx2count.get(idx)
+        if count is None:
+            self.idx2count[idx] = 1
+            if len(self.idx2count) > self.maxNumBuckets:
+                self.collapse()
+        else:
+            self.idx2count[idx] = count + 1
+
+
+    def collapse(self):
+        '''Merges the lowest buckets into the next lowest one until there are at most "maxNumBuckets" buckets.'''
+
+        idxs = sorted(self.idx2count)
+        numCollapsed = len(idxs) - self.maxNumBuckets
+        self.idx2count[idxs[numCollapsed]] += sum(self.idx2count.pop(idx) for idx in idxs[: numCollapsed])
+
+
+    def getQuantile(self, q):
+        '''Returns an estimate of the passed quantile (between 0 and 1) of the values added so far, or None if there are none.'''
+
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeroCount
+        if seen > rank:
+            return 0
+        for idx in sorted(self.idx2count):
+            seen += self.idx2count[idx]
+            if seen > rank:
+                # The middle of the bucket (in terms of relative error), but never more than the largest value.
+                return min(2 * self.gamma ** idx / (self.gamma + 1), self.max)
+        return self.max
+
+
+    def merge(self, other):
+        '''Adds the values added to the "other" sketch to this one.'''
+
+        if other.relativeAccuracy != self.relativeAccuracy:
+            raise ValueError('Cannot merge sketches with different accuracies: %g and %g' % (self.relativeAccuracy, other.relativeAccuracy))
+        for idx, count in other.idx2count.items():
+            self.idx2count[idx] = self.idx2count.get(idx, 0) + count
+        if len(self.idx2count) > self.maxNumBuckets:
+            self.collapse()
+        self.zeroCount += other.zeroCount
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+
+    def __eq__(self, other):
+        '''Sketches are equal if they have the same accuracy and hold the same values (as far as the buckets can tell).'''
+
+        return (isinstance(other, DDSketch) and self.relativeAccuracy == other.relativeAccuracy and self.idx2count == other.idx2count and
+                self.zeroCount == other.zeroCount and self.count == other.count and self.max == other.max)
+
+
+    def copy(self):
+        '''Returns a copy of this sketch.'''
+
+        sketch = DDSketch(self.relativeAccuracy, self.maxNumBuckets)
+        sketch.idx2count = dict(self.idx2count)
+        sketch.zeroCount, sketch.count, sketch.max = self.zeroCount, self.count, self.max
+        return sketch
+
+
+    def toDict(self):
+        '''Returns a JSON-serializable dict holding this sketch.'''
+
+        return {'relativeAccuracy': self.relativeAccuracy, 'maxNumBuckets': self.maxNumBuckets, 'idx2count': sorted(self.idx2count.items()),
+                'zeroCount': self.zeroCount, 'count': self.count, 'max': self.max}
+
+
+    @staticmethod
+    def fromDict(dct):
+        '''Returns a DDSketch holding the sketch in the passed dict, as returned by "toDict()".'''
+
+        sketch = DDSketch(dct['relativeAccuracy'], dct['maxNumBuckets'])
+        sketch.idx2count = {idx: count for idx, count in dct['idx2count']}
+        sketch.zeroCount, sketch.count, sketch.max = dct['zeroCount'], dct['count'], dct['max']
+        return sketch
@@ -0,0 +1,65 @@
+import json, random, unittest
+
+from DDSketch import DDSketch
+
+
+class DDSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(0)
+        # Heavy-tailed, like response sizes, with some zeros.
+        self.values = [0 if i % 50 == 0 else int(rnd.paretovariate(1.2) * 500) for i in range(20000)]
+
+
+    def tearDown(self):
+        pass
+
+
+    @staticmethod
+    def makeSketch(values, **kwargs):
+        sketch = DDSketch(**kwargs)
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+
+    def testEmpty(self):
+        sketch = DDSketch()
+        self.assertIsNone(sketch.getQuantile(0.5))
+        self.assertEqual(0, sketch.count)
+
+
+    def testQuantilesAreWithinRelativeAccuracy(self):
+        sketch = DDSketchTest.makeSketch(self.values)
+        sortedValues = sorted(self.values)
+        for q in (0, 0.01, 0.5, 0.9, 0.99, 0.999, 1):
+            expected = sortedValues[int(q * (len(sortedValues) - 1))]
+            self.assertLessEqual(abs(sketch.getQuantile(q) - expected), DDSketch.DEFAULT_RELATIVE_ACCURACY * expected + 1e-9)
+        self.assertEqual(max(self.values), sketch.max)
+        self.assertEqual(len(self.values), sketch.count)
+
+
+    def testMergeEqualsUnion(self):
+        sketch = DDSketchTest.makeSketch(self.values[: 7000])
+        sketch.merge(DDSketchTest.makeSketch(self.values[7000 :]))
+        self.assertEqual(DDSketchTest.makeSketch(self.values), sketch)
+
+        with self.assertRaises(ValueError):
+            sketch.merge(DDSketch(relativeAccuracy = 0.05))
+
+
+    def testNumBucketsIsCapped(self):
+        sketch = DDSketchTest.makeSketch([1.5 ** i for i in range(200)], maxNumBuckets = 50)
+        self.assertEqual(50, len(sketch.idx2count))
+        # Only the lowest quantiles are affected.
+        self.assertAlmostEqual(1.5 ** 199, sketch.getQuantile(1), delta = 0.01 * 1.5 ** 199)
+        self.assertAlmostEqual(1.5 ** 179, sketch.getQuantile(0.9), delta = 0.01 * 1.5 ** 179)
+
+
+    def testToDictRoundTrip(self):
+        sketch = DDSketchTest.makeSketch(self.values)
+        self.assertEqual(sketch, DDSketch.fromDict(json.loads(json.dumps(sketch.toDict()))))
+
+
+if __name__ == '__main__':
+    unittest.main()
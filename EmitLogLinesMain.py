@@ -1,10 +1,19 @@
-import os, random, time
+import argparse, bisect, multiprocessing, os, random, time
 
-def main():
-    with open('source.log') as f:
-        lines = f.readlines()
+from ClfParser import ClfParser
+
+
+# Default rate (in lines per second) of the "rate", "burst" and "ramp" modes. Can be overriden using CLI arguments.
+LINES_PER_SEC = 10000
+
+# Writers write at most this many lines at once, so that a writer that fell behind does not produce one huge write.
+MAX_LINES_PER_WRITE = 10000
 
-    with open('target.log', 'a+') as f:
+
+def emitRandomly(lines, targetPath):
+    '''The original mode: writes the lines one by one with a random delay between them, printing each line.'''
+
+    with open(targetPath, 'a+') as f:
         for line in lines:
             f.write(line)
             f.flush()
@@ -15,5 +24,136 @@ def main():
             # This results in a new log line to be written to the target file every 1 second ON AVERAGE.
             time.sleep(random.uniform(0.5, 1.5))
 
+
+class Schedule:
+    '''Maps the number of seconds since a writer started to the number of lines it should have written by then, for the mode given
+    by "args.mode". This is a class rather than a closure so that it can be passed to writer processes on every platform.'''
+
+    def __init__(self, args, offsetsSecs, share):
+        '''"offsetsSecs" are the (non-decreasing) times at which the writer's lines are due (only used in "replay" mode). The rates
+        in "args" are totals over all writers, of which this writer gets the fraction "share" (not used in "replay" mode).'''
+
+        self.args, self.offsetsSecs, self.share = args, offsetsSecs, share
+
+
+    def getNumLines(self, secs):
+        args = self.args
+        if args.mode == 'rate':
+            return self.share * args.linesPerSec * secs
+        if args.mode == 'burst':
+            # Alternate between "args.burstSecs" seconds at "args.burstLinesPerSec" and "args.idleSecs" seconds at "args.linesPerSec".
+            numPeriods, secsInPeriod = divmod(secs, args.burstSecs + args.idleSecs)
+            burstSecs = min(secsInPeriod, args.burstSecs)
+            return self.share * (numPeriods * (args.burstLinesPerSec * args.burstSecs + args.linesPerSec * args.idleSecs) +
+                                 args.burstLinesPerSec * burstSecs + args.linesPerSec * (secsInPeriod - burstSecs))
+        if args.mode == 'ramp':
+            # Increase the rate linearly from "args.linesPerSec" to "args.rampLinesPerSec" over "args.rampSecs" seconds, then keep it.
+            rampSecs = min(secs, args.rampSecs)
+            slope = (args.rampLinesPerSec - args.linesPerSec) / args.rampSecs
+            return self.share * (args.linesPerSec * rampSecs + slope * rampSecs * rampSecs / 2 + args.rampLinesPerSec * (secs - rampSecs))
+        if args.mode == 'replay':
+            return bisect.bisect_right(self.offsetsSecs, secs)
+        raise NotImplementedError('Unknown mode: "%s"' % args.mode)
+
+
+def emitOnSchedule(lines, targetPath, schedule, useFsync, results):
+    '''Appends the lines to the target file according to the passed Schedule, and puts a tuple
+    (targetPath, numLines, startSecs, endSecs) into the "results" queue when done.'''
+
+    numWritten = 0
+    with open(targetPath, 'a') as f:
+        startSecs = time.time()
+        while numWritten < len(lines):
+            numDue = min(len(lines), int(schedule.getNumLines(time.time() - startSecs)), numWritten + MAX_LINES_PER_WRITE)
+            if numDue <= numWritten:
+                time.sleep(0.001)
+                continue
+            f.write(''.join(lines[numWritten : numDue]))
+            f.flush()
+            if useFsync:
+                os.fsync(f.fileno())
+            numWritten = numDue
+        endSecs = time.time()
+    results.put((targetPath, numWritten, startSecs, endSecs))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sourcePath', required = False, type = str, default = 'source.log',
+                        help = 'The log file whose lines are written.')
+    parser.add_argument('--targetPaths', required = False, type = str, nargs = '+', default = ['target.log'],
+                        help = 'The log files the lines are appended to. Writers are assigned to them round robin.')
+    parser.add_argument('--mode', required = False, type = str, default = 'random', choices = ('random', 'rate', 'burst', 'ramp', 'replay'),
+                        help = '"random": one line every 0.5 to 1.5 seconds (the original behavior); "rate": a constant rate; '
+                               '"burst": alternate bursts and quieter periods; "ramp": increase the rate linearly; '
+                               '"replay": keep the spacing of the logged timestamps, sped up.')
+    parser.add_argument('--numLines', required = False, type = int, default = None,
+                        help = 'The number of lines to write. The source lines are repeated if needed (except in "replay" mode). '
+                               'Defaults to the number of source lines.')
+    parser.add_argument('--linesPerSec', required = False, type = float, default = LINES_PER_SEC,
+                        help = 'The rate of the "rate" mode, the rate between bursts of the "burst" mode, and the starting rate of the "ramp" mode.')
+    parser.add_argument('--burstLinesPerSec', required = False, type = float, default = 10 * LINES_PER_SEC,
+                        help = 'The rate during bursts in "burst" mode.')
+    parser.add_argument('--burstSecs', required = False, type = float, default = 1,
+                        help = 'The length of bursts in "burst" mode.')
+    parser.add_argument('--idleSecs', required = False, type = float, default = 4,
+                        help = 'The length of the periods between bursts in "burst" mode.')
+    parser.add_argument('--rampLinesPerSec', required = False, type = float, default = 10 * LINES_PER_SEC,
+                        help = 'The final rate of the "ramp" mode.')
+    parser.add_argument('--rampSecs', required = False, type = float, default = 10,
+                        help = 'For how long the rate increases in "ramp" mode.')
+    parser.add_argument('--speedup', required = False, type = float, default = 60,
+                        help = 'How many times faster than the logged timestamps the lines are written in "replay" mode.')
+    parser.add_argument('--numWriters', required = False, type = int, default = 1,
+                        help = 'The number of writer processes. Each writes every n-th line at 1/n of the rate.')
+    parser.add_argument('--fsync', action = 'store_true',
+                        help = 'Call fsync() after every write (not just flush()).')
+    args = parser.parse_args()
+
+    with open(args.sourcePath) as f:
+        sourceLines = f.readlines()
+    numLines = len(sourceLines) if args.numLines is None else args.numLines
+    if args.mode == 'replay':
+        numLines = min(numLines, len(sourceLines))
+    lines = [sourceLines[i % len(sourceLines)] for i in range(numLines)]
+
+    if args.mode == 'random':
+        emitRandomly(lines, args.targetPaths[0])
+        return
+
+    # In "replay" mode, every line is due when its logged timestamp (relative to the first one) is reached, sped up "args.speedup"
+    # times. Lines that cannot be parsed or are out of order are due together with the previous line.
+    offsetsSecs = []
+    if args.mode == 'replay':
+        clfParser, firstTsSecs = ClfParser(), None
+        for line in lines:
+            record = clfParser.parse(line.strip())
+            if record is not None and firstTsSecs is None:
+                firstTsSecs = record.tsSecs
+            offsetSecs = 0 if record is None else (record.tsSecs - firstTsSecs) / args.speedup
+            offsetsSecs.append(offsetSecs if len(offsetsSecs) == 0 else max(offsetSecs, offsetsSecs[-1]))
+
+    results = multiprocessing.Queue()
+    writers = []
+    for i in range(args.numWriters):
+        # Every writer writes every "numWriters"-th line, and the rates are split evenly between the writers.
+        schedule = Schedule(args, offsetsSecs[i :: args.numWriters], 1 / args.numWriters)
+        writer = multiprocessing.Process(target = emitOnSchedule, args = (lines[i :: args.numWriters], args.targetPaths[i % len(args.targetPaths)],
+                                                                          schedule, args.fsync, results))
+        writer.start()
+        writers.append(writer)
+
+    writerResults = [results.get() for writer in writers]
+    for writer in writers:
+        writer.join()
+
+    for targetPath, numWritten, startSecs, endSecs in writerResults:
+        print('Wrote %d lines to %s in %.2f seconds (%.0f lines/sec)' %
+              (numWritten, targetPath, endSecs - startSecs, numWritten / max(endSecs - startSecs, 1e-9)))
+    numWritten = sum(result[1] for result in writerResults)
+    elapsedSecs = max(result[3] for result in writerResults) - min(result[2] for result in writerResults)
+    print('Wrote %d lines in total in %.2f seconds (%.0f lines/sec achieved)' % (numWritten, elapsedSecs, numWritten / max(elapsedSecs, 1e-9)))
+
+
 if __name__ == '__main__':
     main()
@@ -1,3 +1,6 @@
+import heapq
+
+
 class EmptyHeapException(Exception):
     '''This exception is raised when there is an attempt to pop an object from an empty heap.'''
     pass
@@ -29,21 +32,27 @@ class Heap:
         self.updateHeap(idx)
 
 
-    def getMaxObjs(self, numObjs):
-        '''Returns a dict of "numObjs" objects with the highest counts (or fewer if the size of the heap is less than "numObjs").'''
+    def getObjs(self):
+        '''Returns a dict of all objects in the heap and their counts. This does not modify the heap.'''
+
+        return {obj: count for obj, count in self.heap}
 
-        dct = {}
-        for i in range(numObjs):
-            try:
-                obj, count = self.popMaxObj()
-                dct[obj] = count
-            except EmptyHeapException:
-                break
 
-        # Now we need to re-insert the popped objects. This still results in O(k log n) running time, where "k = numObjs" and n is the heap size.
-        for obj, count in dct.items():
-            self.addObj(obj, count)
+    def getMaxObjs(self, numObjs):
+        '''Returns a dict of "numObjs" objects with the highest counts (or fewer if the size of the heap is less than "numObjs").
+        This does not modify the heap, so it only needs to be protected from concurrent writers, not from concurrent readers.'''
 
+        # Walk the heap best-first: the next highest count is always a child of an element already taken (or the root). This
+        # takes O(k log k) time, where "k = numObjs".
+        dct = {}
+        candidates = [] if len(self.heap) == 0 else [(-self.heap[0][1], 0)]
+        while len(candidates) > 0 and len(dct) < numObjs:
+            negCount, idx = heapq.heappop(candidates)
+            obj, count = self.heap[idx]
+            dct[obj] = count
+            for childIdx in (2 * idx + 1, 2 * idx + 2):
+                if childIdx < len(self.heap):
+                    heapq.heappush(candidates, (-self.heap[childIdx][1], childIdx))
         return dct
 
 
@@ -85,6 +94,7 @@ class Heap:
 
             if self.heap[childIdx][1] > self.heap[idx][1]:
                 self.heap[idx], self.heap[childIdx] = self.heap[childIdx], self.heap[idx]
+                self.obj2idx[self.heap[idx][0]] = idx  # The child moved up, so its index changed too.
                 idx = childIdx
             else:
                 break
@@ -96,6 +106,7 @@ class Heap:
             parentIdx = (idx - 1) >> 1
             if self.heap[idx][1] > self.heap[parentIdx][1]:
                 self.heap[idx], self.heap[parentIdx] = self.heap[parentIdx], self.heap[idx]
+                self.obj2idx[self.heap[idx][0]] = idx  # The parent moved down, so its index changed too.
                 idx = parentIdx
             else:
                 break
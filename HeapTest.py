@@ -0,0 +1,64 @@
+import random, unittest
+from collections import Counter
+
+from Heap import EmptyHeapException, Heap
+
+
+class HeapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.heap = Heap()
+
+
+    def tearDown(self):
+        pass
+
+
+    def testEmptyHeap(self):
+        self.assertEqual(0, self.heap.getNumObjs())
+        self.assertEqual({}, self.heap.getMaxObjs(3))
+        self.assertRaises(EmptyHeapException, self.heap.popMaxObj)
+
+
+    def testCountsMatchCounter(self):
+        rnd = random.Random(0)
+        counter = Counter()
+        for i in range(5000):
+            obj, count = rnd.randrange(100), rnd.randint(1, 3)
+            self.heap.addObj(obj, count)
+            counter[obj] += count
+
+        self.assertEqual(len(counter), self.heap.getNumObjs())
+        self.assertEqual(dict(counter), self.heap.getMaxObjs(len(counter)))
+        # "getMaxObjs()" must leave the heap intact.
+        self.assertEqual(dict(counter), {obj: count for obj, count in self.heap.heap})
+        for obj, idx in self.heap.obj2idx.items():
+            self.assertEqual(obj, self.heap.heap[idx][0])
+
+
+    def testGetMaxObjsDoesNotModifyHeap(self):
+        rnd = random.Random(0)
+        for i in range(1000):
+            self.heap.addObj(rnd.randrange(300), rnd.randint(1, 3))
+        heap = [list(elem) for elem in self.heap.heap]
+        counter = Counter(self.heap.getObjs())
+        for numObjs in (1, 3, 50):
+            maxObjs = self.heap.getMaxObjs(numObjs)
+            self.assertEqual(numObjs, len(maxObjs))
+            # Ties may be broken either way, so we compare the counts.
+            self.assertEqual([count for obj, count in counter.most_common(numObjs)], sorted(maxObjs.values(), reverse = True))
+            self.assertTrue(all(counter[obj] == count for obj, count in maxObjs.items()))
+        self.assertEqual(heap, self.heap.heap)
+
+
+    def testPopMaxObj(self):
+        for obj, count in (('a', 2), ('b', 5), ('c', 1), ('a', 4)):
+            self.heap.addObj(obj, count)
+        self.assertEqual(('a', 6), self.heap.popMaxObj())
+        self.assertEqual(('b', 5), self.heap.popMaxObj())
+        self.assertEqual(('c', 1), self.heap.popMaxObj())
+        self.assertEqual(0, self.heap.getNumObjs())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+import base64, hashlib, math
+
+
+class HyperLogLog:
+    '''Estimates the number of distinct strings added to it (the HyperLogLog algorithm of Flajolet et al.) using 2**precision
+    one-byte registers, no matter how many strings are added. The relative standard error is about 1.04 / sqrt(2**precision),
+    e.g. 1.6% with the default precision of 12 (4 KB).
+
+    Sketches are mergeable: the sketch of the union of two streams is the register-wise maximum of their sketches, so partial
+    results (of batches, parallel workers or checkpoints) can be combined without losing accuracy. Strings are hashed with a hash
+    that does not depend on the process, so sketches built by different processes (or runs) can be merged too.
+
+    Most sketches see few distinct strings (e.g. the clients of a rarely requested section), so until a sketch has a few registers
+    set, it keeps them in a dict instead of allocating all of them.'''
+
+    DEFAULT_PRECISION = 12
+    MIN_PRECISION, MAX_PRECISION = 4, 16
+
+    # The number of bits of the hash of every string.
+    HASH_BITS = 64
+
+
+    def __init__(self, precision = DEFAULT_PRECISION):
+        if not HyperLogLog.MIN_PRECISION <= precision <= HyperLogLog.MAX_PRECISION:
+            raise ValueError('Precision must be between %d and %d: %d' % (HyperLogLog.MIN_PRECISION, HyperLogLog.MAX_PRECISION, precision))
+        self.precision = precision
+        self.sparse = {}  # Maps the index of each non-zero register to its value, until "self.registers" is allocated.
+        self.registers = None  # A bytearray of all 2**precision registers, or None while the sketch is sparse.
+
+
+    @staticmethod
+    def hash(s):
+        '''Returns a 64-bit hash of the passed string. Unlike "hash()", it is the same in every process.'''
+
+        return int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size = 8).digest(), 'big')
+
+
+    def add(self, s):
+        '''Adds the passed string.'''
+
+        self.addHash(HyperLogLog.hash(s))
+
+
+    def addHash(self, h):
+        '''Adds a string with the passed hash, as returned by "HyperLogLog.hash()". Adding the same string to several sketches
+        this way saves hashing it more than once.'''
+
+        # The first "precision" bits select the register, which keeps the maximum position of the first 1 in the remaining bits.
+        numRestBits = HyperLogLog.HASH_BITS - self.precision
+        self.setRegister(h >> numRestBits, numRestBits - (h & ((1 << numRestBits) - 1)).bit_length() + 1)
+
+
+    def setRegister(self, idx, value):
+        '''Sets the register with the passed index to the passed value, unless it already holds a larger one.'''
+
+        if self.registers is not None:
+            if value > self.registers[idx]:
+                self.registers[idx] = value
+        elif value > self.sparse.get(idx, 0):
+            self.sparse[idx] = value
+            # A dict entry takes more than 32 times the memory of a register.
+            if len(self.sparse) > (1 << self.precision) // 32:
+                self.registers = bytearray(1 << self.precision)
+                for idx, value in self.sparse.items():
+                    self.registers[idx] = value
+                self.sparse = None
+
+
+    def getRegisters(self):
+        '''Returns an iterable of (index, value) tuples of the non-zero registers.'''
+
+        if self.registers is None:
+            return self.sparse.items()
+        return ((idx, value) for idx, value in enumerate(self.registers) if value > 0)
+
+
+    def getCount(self):
+        '''Returns the estimated number of distinct strings added so far.'''
+
+        numRegisters = 1 << self.precision
+        if self.registers is None:
+            numZeros = numRegisters - len(self.sparse)
+            tot = numZeros + sum(2.0 ** -value for value in self.sparse.values())
+        else:
+            numZeros = self.registers.count(0)
+            tot = sum(2.0 ** -value for value in self.registers)
+
+        if numRegisters >= 128:
+            alpha = 0.7213 / (1 + 1.079 / numRegisters)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[numRegisters]
+        count = alpha * numRegisters * numRegisters / tot
+        # The raw estimate is biased for small counts, for which linear counting (based on the number of empty registers) is better.
+        # With 64-bit hashes, there is no need for a correction of large counts.
+        if count <= 2.5 * numRegisters and numZeros > 0:
+            count = numRegisters * math.log(numRegisters / numZeros)
+        return int(round(count))
+
+
+    def merge(self, other):
+        '''Adds the strings added to the "other" sketch to this one. If the precisions differ, the result has the lower one.'''
+
+        if other.precision > self.precision:
+            other = other.fold(self.precision)
+        elif other.precision < self.precision:
+            folded = self.fold(other.precision)
+            self.precision, self.sparse, self.registers = folded.precision, folded.sparse, folded.registers
+
+        if self.registers is not None and other.registers is not None:
+            self.registers = HyperLogLog.maxRegisters(self.registers, other.registers)
+        else:
+            for idx, value in other.getRegisters():
+                self.setRegister(idx, value)
+
+
+    @staticmethod
+    def maxRegisters(registers, otherRegisters):
+        '''Returns a bytearray of the register-wise maximum of the passed bytearrays of registers (of the same length). Registers
+        are less than 128, so all of them are compared at once, as the bytes of two big integers: in every byte of (a | 0x80) - b,
+        the high bit is set if and only if a >= b (and the subtraction never borrows from the next byte).'''
+
+        numBytes = len(registers)
+        a, b = int.from_bytes(registers, 'little'), int.from_bytes(otherRegisters, 'little')
+        highBits = int.from_bytes(b'\x80' * numBytes, 'little')
+        geBits = ((a | highBits) - b) & highBits
+        # Turn every 0x80 into 0xff.
+        mask = (geBits << 1) - (geBits >> 7)
+        return bytearray(((a & mask) | (b & ~mask)).to_bytes(numBytes, 'little'))
+
+
+    def fold(self, precision):
+        '''Returns a copy of this sketch with the passed (lower or equal) precision, as if the strings were added to it directly.'''
+
+        assert precision <= self.precision
+        numFoldedBits = self.precision - precision
+        folded = HyperLogLog(precision)
+        for idx, value in self.getRegisters():
+            # The folded bits of the index become the first bits of the remaining hash bits.
+            foldedBits = idx & ((1 << numFoldedBits) - 1)
+            folded.setRegister(idx >> numFoldedBits, numFoldedBits - foldedBits.bit_length() + 1 if foldedBits != 0 else numFoldedBits + value)
+        return folded
+
+
+    def __eq__(self, other):
+        '''Sketches are equal if they have the same precision and register values (whether they are sparse or not).'''
+
+        return isinstance(other, HyperLogLog) and self.precision == other.precision and dict(self.getRegisters()) == dict(other.getRegisters())
+
+
+    def copy(self):
+        '''Returns a copy of this sketch.'''
+
+        sketch = HyperLogLog(self.precision)
+        if self.registers is None:
+            sketch.sparse = dict(self.sparse)
+        else:
+            sketch.sparse, sketch.registers = None, bytearray(self.registers)
+        return sketch
+
+
+    def toDict(self):
+        '''Returns a JSON-serializable dict holding this sketch.'''
+
+        if self.registers is None:
+            return {'precision': self.precision, 'sparse': sorted(self.sparse.items())}
+        return {'precision': self.precision, 'registers': base64.b64encode(self.registers).decode('ascii')}
+
+
+    @staticmethod
+    def fromDict(dct):
+        '''Returns a HyperLogLog holding the sketch in the passed dict, as returned by "toDict()".'''
+
+        sketch = HyperLogLog(dct['precision'])
+        if 'registers' in dct:
+            sketch.sparse, sketch.registers = None, bytearray(base64.b64decode(dct['registers']))
+        else:
+            sketch.sparse = {idx: value for idx, value in dct['sparse']}
+        return sketch
@@ -0,0 +1,72 @@
+import json, unittest
+
+from HyperLogLog import HyperLogLog
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+
+    def tearDown(self):
+        pass
+
+
+    @staticmethod
+    def makeSketch(strs, precision = HyperLogLog.DEFAULT_PRECISION):
+        sketch = HyperLogLog(precision)
+        for s in strs:
+            sketch.add(s)
+        return sketch
+
+
+    def testEmpty(self):
+        self.assertEqual(0, HyperLogLog().getCount())
+
+
+    def testSmallCountsAreNearlyExact(self):
+        sketch = HyperLogLogTest.makeSketch(['10.0.0.%d' % (i % 50) for i in range(1000)])
+        self.assertIsNone(sketch.registers)  # Still sparse.
+        self.assertEqual(50, sketch.getCount())
+
+
+    def testErrorIsWithinBounds(self):
+        for precision in (8, 12):
+            numStrs = 50000
+            sketch = HyperLogLogTest.makeSketch(('client%d' % i for i in range(numStrs)), precision)
+            self.assertIsNotNone(sketch.registers)  # Dense.
+            # Four standard errors.
+            self.assertLess(abs(sketch.getCount() - numStrs) / numStrs, 4 * 1.04 / (1 << precision) ** 0.5)
+
+
+    def testMergeEqualsUnion(self):
+        strs1, strs2 = ['a%d' % i for i in range(3000)], ['a%d' % i for i in range(2000, 5000)]
+        for numStrs in (10, 3000):
+            sketch = HyperLogLogTest.makeSketch(strs1[: numStrs])
+            sketch.merge(HyperLogLogTest.makeSketch(strs2[: numStrs]))
+            self.assertEqual(HyperLogLogTest.makeSketch(strs1[: numStrs] + strs2[: numStrs]), sketch)
+
+
+    def testMaxRegisters(self):
+        registers, otherRegisters = bytearray([0, 1, 5, 64, 127, 0, 127, 3]), bytearray([0, 2, 4, 64, 0, 127, 126, 3])
+        self.assertEqual(bytearray(map(max, registers, otherRegisters)), HyperLogLog.maxRegisters(registers, otherRegisters))
+
+
+    def testMergeFoldsToLowerPrecision(self):
+        strs1, strs2 = ['a%d' % i for i in range(3000)], ['b%d' % i for i in range(100)]
+        self.assertEqual(HyperLogLogTest.makeSketch(strs1, 10), HyperLogLogTest.makeSketch(strs1, 14).fold(10))
+
+        sketch = HyperLogLogTest.makeSketch(strs1, 14)
+        sketch.merge(HyperLogLogTest.makeSketch(strs2, 10))
+        self.assertEqual(HyperLogLogTest.makeSketch(strs1 + strs2, 10), sketch)
+
+
+    def testToDictRoundTrip(self):
+        for numStrs in (10, 3000):
+            sketch = HyperLogLogTest.makeSketch('a%d' % i for i in range(numStrs))
+            self.assertEqual(sketch, HyperLogLog.fromDict(json.loads(json.dumps(sketch.toDict()))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+from array import array
+
+
+class Interner:
+    '''Maps values (e.g. sections) to consecutive integer IDs starting at 0, and back. Statistics keyed by ID share a single copy
+    of every value, and hashing an ID is cheaper than hashing a string that was just parsed (whose hash is not computed yet).
+    Values are never removed, so an Interner should only be used for values of bounded cardinality, or whose statistics are kept
+    for every value anyway (like the sections counted by a Heap). Otherwise, use an IdentityInterner.'''
+
+    def __init__(self):
+        self.value2id = {}
+        self.values = []  # The value of every ID.
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def getId(self, value):
+        '''Returns the ID of the passed hashable value, assigning it the next ID if it has none yet.'''
+
+        valueId = self.value2id.get(value)
+        if valueId is None:
+            valueId = self.value2id[value] = len(self.values)
+            self.values.append(value)
+        return valueId
+
+
+    def getValue(self, valueId):
+        '''Returns the value with the passed ID.'''
+
+        return self.values[valueId]
+
+
+    def decode(self, id2val):
+        '''Returns a copy of the passed dict keyed by IDs, keyed by the values instead.'''
+
+        return {self.values[valueId]: val for valueId, val in id2val.items()}
+
+
+class IdentityInterner:
+    '''Has the interface of an Interner, but every value is its own ID, so statistics are keyed by the values themselves and nothing
+    is remembered. This is for values of unbounded cardinality whose statistics are bounded, like the sections tracked by
+    SpaceSaving: an Interner would keep every one of them ever seen.'''
+
+    def __len__(self):
+        return 0
+
+
+    def getId(self, value):
+        return value
+
+
+    def getValue(self, valueId):
+        return valueId
+
+
+    def decode(self, id2val):
+        '''Returns a copy of the passed dict.'''
+
+        return dict(id2val)
+
+
+class IdCounter:
+    '''Counts of the values of an Interner, kept in an array indexed by ID. It reads like a dict mapping every value with a non-zero
+    count to its count (e.g. "dict(counter)" and "counter.items()" work), so code showing the counts does not need to know about IDs.'''
+
+    def __init__(self, interner):
+        self.interner = interner
+        self.counts = array('q')
+
+
+    def addId(self, valueId, count = 1):
+        '''Increments the count of the value with the passed ID by "count".'''
+
+        counts = self.counts
+        if valueId >= len(counts):
+            counts.extend(bytes(valueId + 1 - len(counts)))
+        counts[valueId] += count
+
+
+    def add(self, value, count = 1):
+        '''Increments the count of the passed value by "count".'''
+
+        self.addId(self.interner.getId(value), count)
+
+
+    def items(self):
+        return [(self.interner.values[valueId], count) for valueId, count in enumerate(self.counts) if count != 0]
+
+
+    def keys(self):
+        return [value for value, count in self.items()]
+
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+    def __len__(self):
+        return len(self.counts) - self.counts.count(0)
+
+
+    def __getitem__(self, value):
+        valueId = self.interner.value2id.get(value)
+        return 0 if valueId is None or valueId >= len(self.counts) else self.counts[valueId]
@@ -0,0 +1,53 @@
+import unittest
+
+from Interner import IdCounter, IdentityInterner, Interner
+
+
+class InternerTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+
+    def tearDown(self):
+        pass
+
+
+    def testIdsAreConsecutiveAndStable(self):
+        interner = Interner()
+        self.assertEqual([0, 1, 0, 2], [interner.getId(value) for value in ('/a', '/b', '/a', None)])
+        self.assertEqual(3, len(interner))
+        self.assertEqual('/b', interner.getValue(1))
+        self.assertEqual({'/a': 5, None: 7}, interner.decode({0: 5, 2: 7}))
+
+
+    def testInternedValueIsShared(self):
+        interner = Interner()
+        value = ''.join(['/se', 'ction'])
+        self.assertIs(value, interner.getValue(interner.getId(value)))
+        self.assertIs(value, interner.getValue(interner.getId(''.join(['/sec', 'tion']))))
+
+
+    def testIdentityInternerRemembersNothing(self):
+        interner = IdentityInterner()
+        self.assertEqual(['/a', '/b', '/a'], [interner.getId(value) for value in ('/a', '/b', '/a')])
+        self.assertEqual('/b', interner.getValue('/b'))
+        self.assertEqual({'/a': 5}, interner.decode({'/a': 5}))
+        self.assertEqual(0, len(interner))
+
+
+    def testIdCounterReadsLikeDict(self):
+        interner = Interner()
+        interner.getId('301')  # Values with no count are not shown.
+        counter = IdCounter(interner)
+        counter.add('200')
+        counter.add('404', 3)
+        counter.addId(interner.getId('200'), 2)
+        self.assertEqual({'200': 3, '404': 3}, dict(counter))
+        self.assertEqual(2, len(counter))
+        self.assertEqual(['200', '404'], sorted(counter))
+        self.assertEqual((3, 0, 0), (counter['404'], counter['301'], counter['500']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import math, threading
+from collections import OrderedDict
+
+from Alerter import ThreadedAlerter
+from Clock import wallClock
+
+
+class KeyCounts:
+    '''The event counts of one key in a ring of time buckets, the newest of which has ID "lastId" (time divided by bucket width).'''
+
+    __slots__ = ('lastId', 'total', 'counts', 'isHigh')
+
+
+    def __init__(self, lastId, numSlots):
+        self.lastId = lastId
+        self.counts = [0] * numSlots  # The count of bucket ID i is at index i % numSlots, for the last "numSlots" bucket IDs.
+        self.total = 0  # The sum of "self.counts".
+        self.isHigh = False  # Whether the key is in "High" state.
+
+
+class KeyedAlerter(ThreadedAlerter):
+    '''Creates an alert for every key (e.g. a section) for which at least "minNumEvents" events occur within the last "winLenSecs"
+    seconds, and silences it when this condition no longer holds true. Unlike running one Alerter per key, a key costs a fixed,
+    small amount of memory: its events are counted in "NUM_BUCKETS_PER_WINDOW" coarse time buckets.
+
+    Keys without events in the window (and not in "High" state) are evicted when the alerter is evaluated, and at most "maxNumKeys"
+    keys are kept: adding a new key beyond that evicts the least recently seen one, so memory is bounded no matter how many distinct
+    keys there are. An evicted key in "High" state gets an "EnterLow" transition, so that every alert is eventually silenced.
+
+    Like "Alerter", it reads the current time from "clock()", which is the time of the transitions when keys enter "High" state.'''
+
+    # Every window is covered by this many buckets. A bucket is in the window as long as any part of it is, so events may be
+    # counted up to "winLenSecs / NUM_BUCKETS_PER_WINDOW" seconds too long.
+    NUM_BUCKETS_PER_WINDOW = 12
+
+    DEFAULT_MAX_NUM_KEYS = 10000
+
+
+    def __init__(self, minNumEvents, winLenSecs, maxNumKeys = DEFAULT_MAX_NUM_KEYS, clock = wallClock):
+        self.minNumEvents, self.winLenSecs, self.maxNumKeys, self.clock = minNumEvents, winLenSecs, maxNumKeys, clock
+        self.bucketSecs = winLenSecs / KeyedAlerter.NUM_BUCKETS_PER_WINDOW
+        # The window overlaps one more bucket than it covers, unless it starts exactly at a bucket boundary.
+        self.numSlots = KeyedAlerter.NUM_BUCKETS_PER_WINDOW + 1
+
+        # This lock grants exclusive access to the variables below.
+        self.lock = threading.Lock()
+
+        # Maps every key to its KeyCounts, from the least to the most recently seen key. Since timestamps are clipped to be
+        # non-decreasing, this is also the order of the last bucket IDs.
+        self.key2counts = OrderedDict()
+        self.highKeys = set()  # The keys in "High" state.
+        self.lastTsSecs = None  # The latest event timestamp seen so far.
+        # A chronologically ordered list of tuples (key, transition, tsSecs), returned and cleared by "getAlerts()".
+        self.alerts = []
+        # The number of keys evicted because of "maxNumKeys" while they still had events in the window.
+        self.numEvictedKeys = 0
+        # If set to a "Metrics.Histogram", the duration of every "genAlert()" call made by "runAlerter()" is recorded in it.
+        self.genAlertHistogram = None
+
+        # Setting this event makes "runAlerter()" return.
+        self.stopEvent = threading.Event()
+
+
+    def addEvent(self, tsSecs, key):
+        '''Adds event with the passed timestamp for the passed key.'''
+
+        self.addEvents([tsSecs], [key])
+
+
+    def addEvents(self, tssSecs, keys):
+        '''Adds events with the passed timestamps for the passed keys (a list as long as "tssSecs") in the passed order. Events
+        whose key is None are ignored. Keys that reach the threshold enter "High" state right away.'''
+
+        currSecs = self.clock()
+        with self.lock:
+            startId = self.getStartId(currSecs)
+            # This loop runs for every hit, so we look up the attributes it uses once.
+            key2counts, bucketSecs, numSlots, lastTsSecs = self.key2counts, self.bucketSecs, self.numSlots, self.lastTsSecs
+            for tsSecs, key in zip(tssSecs, keys):
+                # Clip out-of-order timestamps, exactly like "Alerter.addEvent()" does.
+                if lastTsSecs is not None and tsSecs < lastTsSecs:
+                    tsSecs = lastTsSecs
+                lastTsSecs = tsSecs
+                if key is None:
+                    continue
+
+                bucketId = math.floor(tsSecs / bucketSecs)
+                counts = key2counts.get(key)
+                if counts is None:
+                    if len(key2counts) >= self.maxNumKeys:
+                        self.evictKey(startId, currSecs)
+                    counts = key2counts[key] = KeyCounts(bucketId, numSlots)
+                else:
+                    key2counts.move_to_end(key)
+                    if bucketId > counts.lastId:
+                        self.advance(counts, bucketId)
+                counts.counts[bucketId % numSlots] += 1
+                counts.total += 1
+
+                # The total is an upper bound of the count in the window, which is only computed when it may reach the threshold.
+                if not counts.isHigh and counts.total >= self.minNumEvents and self.getCount(counts, startId) >= self.minNumEvents:
+                    counts.isHigh = True
+                    self.highKeys.add(key)
+                    self.alerts.append((key, 'EnterHigh', currSecs))
+            self.lastTsSecs = lastTsSecs
+
+
+    def advance(self, counts, bucketId):
+        '''Makes the passed KeyCounts end with the bucket with the passed (larger) ID, dropping the buckets that no longer fit.'''
+
+        if bucketId - counts.lastId >= self.numSlots:
+            counts.counts = [0] * self.numSlots
+            counts.total = 0
+        else:
+            for droppedId in range(counts.lastId + 1, bucketId + 1):
+                slot = droppedId % self.numSlots
+                counts.total -= counts.counts[slot]
+                counts.counts[slot] = 0
+        counts.lastId = bucketId
+
+
+    def getStartId(self, currSecs):
+        '''Returns the ID of the first bucket in the window ending at the passed time.'''
+
+        return math.floor((currSecs - self.winLenSecs) / self.bucketSecs)
+
+
+    def getCount(self, counts, startId):
+        '''Returns the number of events in the passed KeyCounts in the buckets with IDs of at least "startId".'''
+
+        if counts.lastId < startId:
+            return 0
+        count = counts.total
+        for bucketId in range(counts.lastId - self.numSlots + 1, startId):
+            count -= counts.counts[bucketId % self.numSlots]
+        return count
+
+
+    def evictKey(self, startId, currSecs):
+        '''Evicts the least recently seen key. This method assumes the caller has acquired the lock.'''
+
+        key, counts = self.key2counts.popitem(last = False)
+        if counts.isHigh:
+            self.highKeys.discard(key)
+            self.alerts.append((key, 'EnterLow', currSecs))
+        if counts.lastId >= startId:
+            self.numEvictedKeys += 1
+
+
+    def genAlert(self, currSecs = None):
+        '''Silences the alerts of keys that no longer reach the threshold in the window ending at "currSecs", which defaults to the
+        current time of our clock, and evicts the keys without events in that window. This takes time proportional to the number of keys in
+        "High" state and of evicted keys. This method assumes the caller has acquired the lock.'''
+
+        if currSecs is None:
+            currSecs = self.clock()
+        startId = self.getStartId(currSecs)
+
+        for key in [key for key in self.highKeys if self.getCount(self.key2counts[key], startId) < self.minNumEvents]:
+            self.key2counts[key].isHigh = False
+            self.highKeys.remove(key)
+            self.alerts.append((key, 'EnterLow', currSecs))
+
+        # Keys are ordered by their last bucket ID, so the idle ones are at the front. Keys in "High" state are skipped rather than
+        # ending the scan, so that they never keep the idle keys behind them.
+        idleKeys = []
+        for key, counts in self.key2counts.items():
+            if counts.lastId >= startId:
+                break
+            if not counts.isHigh:
+                idleKeys.append(key)
+        for key in idleKeys:
+            del self.key2counts[key]
+
+
+    def getAlerts(self):
+        '''Returns tuples (key, transition, tsSecs) indicating "EnterHigh" or "EnterLow" transitions of keys and the timestamp of
+        their occurrence since the last time this method was called.'''
+
+        with self.lock:
+            ret = self.alerts
+            self.alerts = []
+        return ret
+
+
+    def getNumKeys(self):
+        '''Returns the number of keys currently kept.'''
+
+        return len(self.key2counts)
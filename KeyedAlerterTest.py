@@ -0,0 +1,104 @@
+import time, unittest
+from unittest.mock import patch
+
+from KeyedAlerter import KeyedAlerter
+
+
+class KeyedAlerterTest(unittest.TestCase):
+
+    def setUp(self):
+        # With a 12 second window, buckets are 1 second wide.
+        self.alerter = KeyedAlerter(3, 12, maxNumKeys = 3)
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testKeysHaveTheirOwnCounts(self, timeMock):
+        self.alerter.addEvents([10, 11, 12, 13], ['/a', '/b', '/a', None])
+        self.assertEqual([], self.alerter.getAlerts())
+
+        self.alerter.addEvents([14, 15], ['/a', '/b'])
+        self.assertEqual([('/a', 'EnterHigh', 20)], self.alerter.getAlerts())
+
+        # Adding another "qualifying" event should not generate another alert.
+        self.alerter.addEvent(16, '/a')
+        self.assertEqual([], self.alerter.getAlerts())
+        self.assertEqual(2, self.alerter.getNumKeys())
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testAlertsRecoverAsEventsLeaveTheWindow(self, timeMock):
+        self.alerter.addEvents([10, 11, 12, 13, 14], ['/a', '/a', '/a', '/b', '/a'])
+        self.assertEqual([('/a', 'EnterHigh', 20)], self.alerter.getAlerts())
+
+        # The window starts at 12, so the events at 12 and 14 are left.
+        self.alerter.genAlert(24)
+        self.assertEqual([('/a', 'EnterLow', 24)], self.alerter.getAlerts())
+        self.assertEqual(2, self.alerter.getNumKeys())
+
+        # Once their events leave the window, keys are evicted.
+        self.alerter.genAlert(26)
+        self.assertEqual(1, self.alerter.getNumKeys())
+        self.alerter.genAlert(27)
+        self.assertEqual(0, self.alerter.getNumKeys())
+        self.assertEqual([], self.alerter.getAlerts())
+        self.assertEqual(0, self.alerter.numEvictedKeys)
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testHighKeysDoNotKeepIdleKeys(self, timeMock):
+        alerter = KeyedAlerter(3, 12, maxNumKeys = 10)
+        alerter.addEvents([10, 10, 10, 11, 12], ['/a', '/a', '/a', '/b', '/c'])
+        self.assertEqual([('/a', 'EnterHigh', 20)], alerter.getAlerts())
+        # Keep "/a" in "High" state however few events it has left, so that it stays at the front of the keys.
+        alerter.minNumEvents = 0
+
+        # "/b" and "/c" are idle once their events leave the window, even though "/a" is ahead of them.
+        alerter.genAlert(30)
+        self.assertEqual(['/a'], list(alerter.key2counts))
+        self.assertEqual({'/a'}, alerter.highKeys)
+        self.assertEqual([], alerter.getAlerts())
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testOldBucketsAreReused(self, timeMock):
+        self.alerter.addEvents([0, 1, 2], ['/a', '/a', '/a'])
+        self.assertEqual([], self.alerter.getAlerts())
+
+        # The buckets of the events at 1 and 2 are reused for the events at 14 and 15.
+        self.alerter.addEvents([14, 15], ['/a', '/a'])
+        self.assertEqual([], self.alerter.getAlerts())
+        self.alerter.addEvent(19, '/a')
+        self.assertEqual([('/a', 'EnterHigh', 20)], self.alerter.getAlerts())
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testOutOfOrderTimestampsAreClipped(self, timeMock):
+        self.alerter.addEvents([15, 3, 2], ['/a', '/a', '/a'])
+        self.assertEqual([('/a', 'EnterHigh', 20)], self.alerter.getAlerts())
+
+
+    @patch.object(time, 'time', return_value = 20)
+    def testMaxNumKeys(self, timeMock):
+        self.alerter.addEvents([15, 15, 15, 16], ['/a', '/a', '/a', '/b'])
+        self.assertEqual([('/a', 'EnterHigh', 20)], self.alerter.getAlerts())
+        self.alerter.addEvents([17, 18], ['/c', '/b'])
+        self.assertEqual(3, self.alerter.getNumKeys())
+
+        # "/a" is the least recently seen key, so it makes room for "/d" and its alert is silenced.
+        self.alerter.addEvent(19, '/d')
+        self.assertEqual([('/a', 'EnterLow', 20)], self.alerter.getAlerts())
+        self.assertEqual(['/c', '/b', '/d'], list(self.alerter.key2counts))
+        self.assertEqual(1, self.alerter.numEvictedKeys)
+        self.alerter.genAlert()
+        self.assertEqual([], self.alerter.getAlerts())
+
+
+    def testRunnerStops(self):
+        runner = self.alerter.makeRunner()
+        runner.start()
+        self.alerter.stopRunner(runner)
+        self.assertFalse(runner.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+class LineReader:
+    '''Reads the lines of a binary file into a reusable buffer, at most a buffer's worth at a time, and returns them as memoryviews
+    of the buffer without the line terminator and surrounding whitespace. Reading therefore neither decodes nor copies the lines,
+    and the memory it takes does not depend on how much is waiting in the file: the parser only decodes the fields it needs.
+
+    The lines returned by a read are only valid until the next read, which overwrites the buffer.'''
+
+    DEFAULT_BUFFER_SIZE = 1 << 20
+
+    # The byte values "str.strip()" strips from ASCII text.
+    WHITESPACE = frozenset(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f')
+
+
+    def __init__(self, bufferSize = DEFAULT_BUFFER_SIZE):
+        self.buf = bytearray(bufferSize)
+        # The range of the buffer holding the partial line left by the last call to "feed()".
+        self.partialStart = self.partialEnd = 0
+
+
+    def readLines(self, f, maxBytes = -1, final = False):
+        '''Reads from the current position of the passed binary file object (ideally unbuffered, i.e. opened with "buffering = 0")
+        and returns the list of the complete, non-blank lines read. At most the size of the buffer is read, and at most "maxBytes"
+        if it is not negative. The file is left positioned right after the last complete line, so that a partial line is read
+        again by the next call, unless "final" is True and the read reached the end of the file or "maxBytes" (i.e. the data ends
+        with a complete line even if it has no line terminator). A line longer than the buffer makes the buffer grow rather than
+        being split, even beyond "maxBytes" unless "final" is True.'''
+
+        size = len(self.buf) if maxBytes < 0 else min(len(self.buf), maxBytes)
+        while True:
+            numBytes = f.readinto(memoryview(self.buf)[: size])
+            atEnd = numBytes < size or numBytes == maxBytes
+            if final and atEnd:
+                end = numBytes
+            else:
+                end = self.buf.rfind(b'\n', 0, numBytes) + 1
+                if end == 0 and numBytes == size and size > 0:
+                    # Not even one complete line fits, so we try again with a larger buffer.
+                    f.seek(-numBytes, 1)
+                    size *= 2
+                    if maxBytes >= 0:
+                        if final:
+                            size = min(size, maxBytes)
+                        else:
+                            maxBytes = -1
+                    if size > len(self.buf):
+                        self.buf = bytearray(size)
+                    continue
+            if end < numBytes:
+                f.seek(end - numBytes, 1)
+            return self.getLines(end)
+
+
+    def feed(self, data, final = False):
+        '''Returns the list of the complete, non-blank lines of the passed bytes (e.g. a chunk of a decompressed stream, which cannot
+        be read back like a file) preceded by the partial line left by the previous call, like "readLines()" does. The new partial
+        line is kept for the next call, unless "final" is True (i.e. the data ends with a complete line). The buffer grows if the
+        partial line and the data do not fit.'''
+
+        # The lines returned by the previous call are no longer used, so the partial line can be moved to the start of the buffer.
+        numPartial = self.partialEnd - self.partialStart
+        size = numPartial + len(data)
+        if size > len(self.buf):
+            buf = bytearray(max(size, 2 * len(self.buf)))
+            buf[: numPartial] = self.buf[self.partialStart : self.partialEnd]
+            self.buf = buf
+        elif self.partialStart > 0:
+            self.buf[: numPartial] = self.buf[self.partialStart : self.partialEnd]
+        self.buf[numPartial : size] = data
+
+        end = size if final else self.buf.rfind(b'\n', 0, size) + 1
+        self.partialStart, self.partialEnd = end, size
+        return self.getLines(end)
+
+
+    def getLines(self, end):
+        '''Returns the list of the non-blank lines in the first "end" bytes of the buffer, stripped like "str.strip()" does.'''
+
+        buf, view, whitespace = self.buf, memoryview(self.buf), LineReader.WHITESPACE
+        lines, start = [], 0
+        while start < end:
+            lineEnd = buf.find(b'\n', start, end)
+            if lineEnd < 0:
+                lineEnd = end
+            nextStart = lineEnd + 1
+            while lineEnd > start and buf[lineEnd - 1] in whitespace:
+                lineEnd -= 1
+            while start < lineEnd and buf[start] in whitespace:
+                start += 1
+            if start < lineEnd:
+                lines.append(view[start : lineEnd])
+            start = nextStart
+        return lines
@@ -0,0 +1,88 @@
+import io, unittest
+
+from LineReader import LineReader
+
+
+class LineReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+
+    def tearDown(self):
+        pass
+
+
+    @staticmethod
+    def readLines(reader, f, maxBytes = -1, final = False):
+        # The lines are only valid until the next read, so we copy them.
+        return [bytes(line) for line in reader.readLines(f, maxBytes, final)]
+
+
+    def testPartialLineIsLeftForLater(self):
+        f = io.BytesIO(b'a b\n\n  c\r\n \t\nd')
+        reader = LineReader()
+        self.assertEqual([b'a b', b'c'], LineReaderTest.readLines(reader, f))
+        self.assertEqual(13, f.tell())
+        self.assertEqual([], LineReaderTest.readLines(reader, f))
+        self.assertEqual(13, f.tell())
+        self.assertEqual([b'd'], LineReaderTest.readLines(reader, f, final = True))
+        self.assertEqual(14, f.tell())
+
+
+    def testReadsAreBounded(self):
+        f = io.BytesIO(b''.join(b'line %d\n' % i for i in range(100)))
+        reader = LineReader(64)
+        lines = []
+        while True:
+            chunk = LineReaderTest.readLines(reader, f)
+            if len(chunk) == 0:
+                break
+            self.assertLessEqual(sum(len(line) + 1 for line in chunk), 64)
+            lines.extend(chunk)
+        self.assertEqual([b'line %d' % i for i in range(100)], lines)
+        self.assertEqual(64, len(reader.buf))
+
+        f.seek(0)
+        self.assertEqual([b'line 0', b'line 1'], LineReaderTest.readLines(reader, f, maxBytes = 20))
+
+
+    def testLongLineGrowsBuffer(self):
+        f = io.BytesIO(b'x' * 100 + b'\ny\n')
+        reader = LineReader(16)
+        self.assertEqual([b'x' * 100, b'y'], LineReaderTest.readLines(reader, f))
+        self.assertEqual(128, len(reader.buf))
+
+
+    def testFinalReadStopsAtLimit(self):
+        # Like a byte range of a file split on line boundaries, whose last line has no line terminator.
+        f = io.BytesIO(b'a\nbb' + b'c\n')
+        reader = LineReader(16)
+        self.assertEqual([b'a', b'bb'], LineReaderTest.readLines(reader, f, maxBytes = 4, final = True))
+        self.assertEqual(4, f.tell())
+        reader = LineReader(2)
+        f.seek(0)
+        self.assertEqual([b'a'], LineReaderTest.readLines(reader, f, maxBytes = 4, final = True))
+        self.assertEqual([b'bb'], LineReaderTest.readLines(reader, f, maxBytes = 2, final = True))
+        self.assertEqual(4, f.tell())
+
+
+
+    def testFeed(self):
+        reader = LineReader(8)
+        feed = lambda data, final = False: [bytes(line) for line in reader.feed(data, final)]
+        # Lines may span chunks, and the partial line is kept between calls.
+        self.assertEqual([], feed(b'ab'))
+        self.assertEqual([b'abc'], feed(b'c\n d'))
+        self.assertEqual(8, len(reader.buf))
+        # The buffer grows to hold the partial line and the data.
+        self.assertEqual([b'def'], feed(b'ef\n\ngh ij'))
+        self.assertEqual(16, len(reader.buf))
+        self.assertEqual([b'gh ij kl mn op'], feed(b' kl mn op\r\nq'))
+        self.assertEqual(32, len(reader.buf))
+        self.assertEqual([], feed(b''))
+        self.assertEqual([b'q'], feed(b'', final = True))
+        self.assertEqual([], feed(b'', final = True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,11 @@ import os, time
 
 from watchdog.observers import Observer
 
+import AsyncRuntime, Backfill
 from LogStats import LogStats
+from Metrics import startHttpServer
+from Replay import Replayer
+from Sharding import Coordinator
 
 class LogAnalyzer:
     '''This class contains an event loop that outputs log analysis statistics at regular intervals.'''
@@ -23,6 +27,54 @@ class LogAnalyzer:
         '''Starts the main event loop. It never returns.'''
 
         stats = LogStats(self.config)
+        metricsServer = self.startMetricsServer(stats)
+        try:
+            if self.config.runtime == 'asyncio':
+                # Tail the log file, run the alerters and output stats as tasks of a single event loop.
+                AsyncRuntime.run(stats, LogAnalyzer.OUTPUT_DELAY_SECS, lambda: self.outputStats(stats))
+            else:
+                self.runWatchdog(stats)
+        finally:
+            if metricsServer is not None:
+                metricsServer.shutdown()
+            # Now that nothing is being read anymore, save the final checkpoint (if enabled).
+            if self.config.checkpointPath is not None:
+                stats.saveCheckpoint()
+
+
+    def runSharded(self, filePaths, numWorkers):
+        '''Tails the passed log files with "numWorkers" worker processes (see "Sharding.Coordinator") and outputs the statistics of
+        all of them, and of each one, at regular intervals. It never returns.'''
+
+        coordinator = Coordinator(self.config, filePaths, numWorkers)
+        metricsServer = self.startMetricsServer(coordinator.stats)
+        try:
+            nextSecs = time.time()
+            while True:
+                nextSecs += LogAnalyzer.OUTPUT_DELAY_SECS
+                coordinator.mergeDeltas(nextSecs)
+                self.outputStats(coordinator.stats)
+                print(coordinator.getFilesStr())
+        finally:
+            if metricsServer is not None:
+                metricsServer.shutdown()
+            coordinator.close()
+
+
+    def startMetricsServer(self, stats):
+        '''Starts serving the metrics about the analyzer itself (if enabled) and snapshots of the passed stats as JSON, and returns the
+        server (or None if disabled).'''
+
+        if self.config.metricsPort is None:
+            return None
+        path2getText = {'/stats': stats.getSnapshotJson}
+        if stats.metrics is not None:
+            path2getText['/metrics'] = stats.metrics.getText
+        return startHttpServer(self.config.metricsPort, path2getText, {'/stats': 'application/json'})
+
+
+    def runWatchdog(self, stats):
+        '''Tails the log file with a watchdog observer and outputs stats at regular intervals. It never returns.'''
 
         # Create and start the observer that will watch for changes in the directory in which the log file is located.
         observer = Observer()
@@ -30,16 +82,32 @@ class LogAnalyzer:
         observer.start()
 
         try:
-            # Output stats at regular intervals.
             while True:
                 time.sleep(LogAnalyzer.OUTPUT_DELAY_SECS)
-                print(str(stats))
+                self.outputStats(stats)
         finally:
             # Do not leave the observer thread hanging around.
             observer.stop()
             observer.join()
 
 
+    def outputStats(self, stats):
+        '''Outputs the passed stats (and dumps the metrics, if enabled).'''
+
+        print(str(stats))
+        if stats.metrics is not None and self.config.metricsPath is not None:
+            stats.metrics.dump(self.config.metricsPath)
+
+
+    def runBackfill(self, filePaths, numWorkers):
+        '''Computes statistics (and replays alerts) over the whole passed log files (e.g. a log and its rotated, possibly compressed,
+        predecessors) using "numWorkers" processes and outputs them once.'''
+
+        replayer = Replayer(self.config)
+        stats = Backfill.backfill(filePaths, numWorkers, self.config.useFastParser, self.config.clientSketchPrecision, [replayer])
+        print(Backfill.getReportStr(stats, replayer))
+
+
     @staticmethod
     def getDirPath(filePath):
         '''Returns the directory path for the passed file path.'''
@@ -1,33 +1,147 @@
-import argparse
+import argparse, os
 
+from Backfill import isCompressed
 from LogAnalyzer import LogAnalyzer
-from LogStats import Config
+from LogStats import ALERTER_BACKENDS, RUNTIMES, SECTION_TRACKERS, Config
+from Sharding import expandFilePaths
 
 
 # Default alerting parameters. Both can be overriden using CLI arguments.
 NUM_HITS_TO_GENERATE_ALERT = 110
 TIME_WINDOW_TO_GENERATE_ALERT_SECS = 2 * 60  # 2 minutes
 
+# Default maximum number of log lines parsed before merging them into the statistics. Can be overriden using CLI arguments.
+BATCH_SIZE = 1000
+
+# Default number of sections tracked by the "spacesaving" section tracker. Can be overriden using CLI arguments.
+SECTION_TRACKER_CAPACITY = 10000
+
+# Default minimum number of seconds between checkpoints. Can be overriden using CLI arguments.
+CHECKPOINT_INTERVAL_SECS = 5
+
+# Default width and number of the time buckets holding recent statistics. Both can be overriden using CLI arguments.
+ROLLING_BUCKET_SECS = 10
+ROLLING_NUM_BUCKETS = 30  # 5 minutes
+
+# Default per-section alerting window and maximum number of sections tracked for per-section alerts. Both can be overriden
+# using CLI arguments.
+SECTION_ALERT_WIN_LEN_SECS = 60
+SECTION_ALERT_MAX_SECTIONS = 10000
+
+# Default precision of the sketches estimating the number of distinct clients. Can be overriden using CLI arguments.
+CLIENT_SKETCH_PRECISION = 12
+
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--logFilePath', required = True, type = str,
-                        help = 'The log file path to be monitored.')
+    parser.add_argument('--logFilePath', required = True, type = str, nargs = '+',
+                        help = 'The log file path to be monitored. Several paths or (quoted) glob patterns, e.g. "/var/log/nginx/*.log", '
+                               'are tailed by "--numWorkers" worker processes, and reported on both together and one by one (or analyzed '
+                               'together with "--backfill").')
     parser.add_argument('--numHitsToGenAlert', required = False, type = int, default = NUM_HITS_TO_GENERATE_ALERT,
                         help = 'The number of hits within alerting window required to generate alert.')
     parser.add_argument('--alertWinLenSecs', required = False, type = int, default = TIME_WINDOW_TO_GENERATE_ALERT_SECS,
                         help = 'The length of the alerting window in seconds.')
     parser.add_argument('--useCurrTimestamps', action = 'store_true',
                         help = 'Use current timestamp instead of logged timestamp when generating alerts.')
+    parser.add_argument('--alerterBackend', required = False, type = str, default = 'manager', choices = sorted(ALERTER_BACKENDS),
+                        help = 'Where the alerter keeps its state: in a manager process or in this process (on a thread). The "engine" '
+                               'alerter also runs in this process, but evaluates rules only when needed and supports "--alertRules".')
+    parser.add_argument('--alertRules', required = False, type = str, nargs = '*', default = [],
+                        help = 'Alerting rules besides the hits one, each "<statusClass>:<count|ratio>:<threshold>:<winLenSecs>[:<minNumEvents>]", '
+                               'e.g. "5xx:ratio:0.05:60" (at least 5%% of the requests of the last minute fail with 5xx) or "4xx:count:100:10". '
+                               'Requires "--alerterBackend engine".')
+    parser.add_argument('--sectionAlertHits', required = False, type = int, default = None,
+                        help = 'Generate an alert when a single section gets at least this many hits within the per-section alerting '
+                               'window. By default there are no per-section alerts.')
+    parser.add_argument('--sectionAlertWinLenSecs', required = False, type = int, default = SECTION_ALERT_WIN_LEN_SECS,
+                        help = 'The length of the per-section alerting window in seconds.')
+    parser.add_argument('--sectionAlertMaxSections', required = False, type = int, default = SECTION_ALERT_MAX_SECTIONS,
+                        help = 'The maximum number of sections tracked for per-section alerts. The least recently requested ones are '
+                               'evicted first.')
+    parser.add_argument('--batchSize', required = False, type = int, default = BATCH_SIZE,
+                        help = 'The maximum number of log lines parsed before merging them into the statistics (1 disables batching).')
+    parser.add_argument('--sectionTracker', required = False, type = str, default = 'heap', choices = sorted(SECTION_TRACKERS),
+                        help = 'How sections are counted: exactly, in a heap holding every section, or approximately, in a '
+                               'bounded-memory Space-Saving summary of the sections with the most hits.')
+    parser.add_argument('--sectionTrackerCapacity', required = False, type = int, default = SECTION_TRACKER_CAPACITY,
+                        help = 'The number of sections tracked by the "spacesaving" section tracker.')
+    parser.add_argument('--checkpointPath', required = False, type = str, default = None,
+                        help = 'The file in which the read offset and statistics are periodically saved, and from which they are '
+                               'restored on startup. By default no checkpoints are saved.')
+    parser.add_argument('--checkpointIntervalSecs', required = False, type = float, default = CHECKPOINT_INTERVAL_SECS,
+                        help = 'The minimum number of seconds between checkpoints.')
+    parser.add_argument('--rollingBucketSecs', required = False, type = int, default = ROLLING_BUCKET_SECS,
+                        help = 'The length of the interval whose statistics are reported alongside the lifetime ones.')
+    parser.add_argument('--rollingNumBuckets', required = False, type = int, default = ROLLING_NUM_BUCKETS,
+                        help = 'The number of intervals making up the longer window whose statistics are also reported.')
+    parser.add_argument('--clientSketchPrecision', required = False, type = int, default = CLIENT_SKETCH_PRECISION,
+                        help = 'Distinct clients are estimated with 2^precision one-byte registers per sketch (between 4 and 16). '
+                               'The relative error is about 1.04 / sqrt(2^precision).')
+    parser.add_argument('--archivePath', required = False, type = str, default = None,
+                        help = 'Append every parsed log line to a compact columnar archive in this directory, which QueryMain.py can '
+                               'query without parsing the log again. By default nothing is archived.')
+    parser.add_argument('--noMetrics', action = 'store_true',
+                        help = 'Do not record metrics about the analyzer itself (lines read, parse time, lock waits, lag).')
+    parser.add_argument('--metricsPath', required = False, type = str, default = None,
+                        help = 'Dump the metrics about the analyzer itself to this file after every report.')
+    parser.add_argument('--metricsPort', required = False, type = int, default = None,
+                        help = 'Serve the metrics about the analyzer itself at http://127.0.0.1:<port>/metrics, and a snapshot of the '
+                               'statistics as JSON at http://127.0.0.1:<port>/stats.')
+    parser.add_argument('--runtime', required = False, type = str, default = 'watchdog', choices = RUNTIMES,
+                        help = 'How the log file is tailed: by a watchdog observer notified of every change in its directory, or by '
+                               'a single asyncio event loop woken up only for the log file itself (with inotify, or by polling where '
+                               'it is not available), which also runs the alerters and the reports. Requires an in-process alerter '
+                               '("--alerterBackend thread" or "engine").')
+    parser.add_argument('--backfill', action = 'store_true',
+                        help = 'Analyze the whole existing log files once (in parallel) instead of tailing them. Several files (e.g. a log '
+                               'and its rotated predecessors, which may be compressed with gzip, bzip2 or xz) are analyzed in chronological order.')
+    parser.add_argument('--numWorkers', required = False, type = int, default = os.cpu_count(),
+                        help = 'The number of worker processes used with "--backfill" or with several log files.')
     args = parser.parse_args()
+    logFilePaths = expandFilePaths(args.logFilePath)
+    isSharded = len(args.logFilePath) > 1 or logFilePaths != args.logFilePath
+    if len(logFilePaths) == 0:
+        parser.error('No log files match "%s"' % ' '.join(args.logFilePath))
+    if isSharded and not args.backfill and (args.checkpointPath is not None or args.archivePath is not None):
+        parser.error('"--checkpointPath" and "--archivePath" require a single log file')
+    if not args.backfill and any(isCompressed(logFilePath) for logFilePath in logFilePaths):
+        parser.error('Compressed log files can only be analyzed with "--backfill"')
+    if len(args.alertRules) > 0 and args.alerterBackend != 'engine':
+        parser.error('"--alertRules" requires "--alerterBackend engine"')
+    if args.runtime == 'asyncio' and args.alerterBackend == 'manager':
+        parser.error('"--runtime asyncio" requires "--alerterBackend thread" or "--alerterBackend engine"')
 
     analyzer = LogAnalyzer(Config(
-        logFilePath           = args.logFilePath,
+        logFilePath           = None if isSharded else logFilePaths[0],
         numHitsToGenAlert     = args.numHitsToGenAlert,
         alertWinLenSecs       = args.alertWinLenSecs,
         useCurrTimestamps     = args.useCurrTimestamps,
+        alerterBackend        = args.alerterBackend,
+        batchSize             = args.batchSize,
+        sectionTracker        = args.sectionTracker,
+        sectionTrackerCapacity = args.sectionTrackerCapacity,
+        checkpointPath        = args.checkpointPath,
+        checkpointIntervalSecs = args.checkpointIntervalSecs,
+        rollingBucketSecs     = args.rollingBucketSecs,
+        rollingNumBuckets     = args.rollingNumBuckets,
+        metricsEnabled        = not args.noMetrics,
+        metricsPath           = args.metricsPath,
+        metricsPort           = args.metricsPort,
+        clientSketchPrecision = args.clientSketchPrecision,
+        alertRules            = tuple(args.alertRules),
+        sectionAlertHits      = args.sectionAlertHits,
+        sectionAlertWinLenSecs = args.sectionAlertWinLenSecs,
+        sectionAlertMaxSections = args.sectionAlertMaxSections,
+        archivePath           = args.archivePath,
+        runtime               = args.runtime,
     ))
-    analyzer.runForever()
+    if args.backfill:
+        analyzer.runBackfill(logFilePaths, args.numWorkers)
+    elif isSharded:
+        analyzer.runSharded(logFilePaths, args.numWorkers)
+    else:
+        analyzer.runForever()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,49 @@
+import apache_log_parser
+
+from ClfParser import ClfParser
+
+
+class LogParser:
+    '''Parses log lines into LogRecord objects. Lines are parsed with the fast ClfParser first (unless disabled), and the lines
+    it cannot handle are parsed with "apache_log_parser".'''
+
+    # https://en.wikipedia.org/wiki/Common_Log_Format
+    # https://github.com/rory/apache-log-parser
+    LOG_FORMAT = '%a %l %u %t "%m %U %H" %s %b'
+    LOG_FORMAT_ALT = '%a %l %u %t "-" %s %b'  # In my experiments all log lines that failed the first format parsed using this one.
+
+
+    def __init__(self, useFastParser = True):
+        # This parser handles the vast majority of log lines (unless disabled).
+        self.clfParser = ClfParser() if useFastParser else None
+        # This parser is used to parse log lines the fast parser could not handle.
+        self.logParser = apache_log_parser.make_parser(LogParser.LOG_FORMAT)
+        # If the first parser fails, we try this one.
+        self.logParserAlt = apache_log_parser.make_parser(LogParser.LOG_FORMAT_ALT)
+
+
+    def parse(self, line):
+        '''Returns a LogRecord for the passed (stripped) "line", or None if it cannot be parsed or its timestamp is out of range (e.g.
+        "31/Feb"). The line is either a string or a bytes-like object (e.g. a memoryview returned by a LineReader), which is only
+        decoded as a whole if the fast parser fails.'''
+
+        if self.clfParser is not None:
+            record = self.clfParser.parse(line)
+            if record is not None:
+                return record
+
+        if not isinstance(line, str):
+            line = str(line, 'utf-8', 'replace')
+
+        # "apache_log_parser" raises ValueError for lines whose timestamp is out of range.
+        try:
+            logTokens = self.logParser(line)
+        except apache_log_parser.LineDoesntMatchException:
+            # Try the other parser.
+            try:
+                logTokens = self.logParserAlt(line)
+            except (apache_log_parser.LineDoesntMatchException, ValueError):
+                return None
+        except ValueError:
+            return None
+        return ClfParser.fromApacheTokens(logTokens)
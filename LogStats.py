@@ -1,11 +1,25 @@
-import apache_log_parser, calendar, multiprocessing, time
-from collections import defaultdict, namedtuple
+import json, os, time
+from collections import namedtuple
 from datetime import datetime as dt
-from threading import Lock
+from threading import Lock, Thread
 from watchdog.events import FileSystemEventHandler
 
-from Alerter import Alerter
+from AlertEngine import AlertEngine, parseRuleSpec
+from Archive import ArchiveWriter
+from Alerter import Alerter, InProcessAlerter
+from Checkpoint import Checkpoint, loadCheckpoint, saveCheckpoint
+from DDSketch import DDSketch
 from Heap import Heap
+from HyperLogLog import HyperLogLog
+from Interner import IdCounter, IdentityInterner, Interner
+from KeyedAlerter import KeyedAlerter
+from LineReader import LineReader
+from LogParser import LogParser
+from Metrics import Metrics
+from RollingStats import RollingStats
+from Snapshot import Snapshot, getWindows, toDict as snapshotToDict
+from SpaceSaving import SpaceSaving
+from StatsBatch import StatsBatch
 
 
 # Codes for showing colored output.
@@ -19,8 +33,57 @@ def color(s, c):
     return '%s1;%dm%s%s' % (C_OPEN, c, str(s), C_CLOSE)
 
 
-# This defines a configuration for the program.
-Config = namedtuple('Config', ('logFilePath', 'numHitsToGenAlert', 'alertWinLenSecs', 'useCurrTimestamps'))
+# This defines a configuration for the program. Fields after "useCurrTimestamps" are optional and take the defaults below.
+Config = namedtuple('Config', ('logFilePath', 'numHitsToGenAlert', 'alertWinLenSecs', 'useCurrTimestamps', 'useFastParser',
+                               'alerterBackend', 'batchSize', 'sectionTracker', 'sectionTrackerCapacity', 'checkpointPath',
+                               'checkpointIntervalSecs', 'rollingBucketSecs', 'rollingNumBuckets', 'metricsEnabled', 'metricsPath',
+                               'metricsPort', 'clientSketchPrecision', 'alertRules', 'sectionAlertHits', 'sectionAlertWinLenSecs',
+                               'sectionAlertMaxSections', 'archivePath', 'runtime'))
+Config.__new__.__defaults__ = (
+    True,       # useFastParser: parse lines with ClfParser first and only fall back to "apache_log_parser" if that fails.
+    'manager',  # alerterBackend: one of the keys of "ALERTER_BACKENDS" below.
+    1000,       # batchSize: the maximum number of lines parsed before merging into the shared statistics. 1 disables batching.
+    'heap',     # sectionTracker: one of the keys of "SECTION_TRACKERS" below.
+    10000,      # sectionTrackerCapacity: the number of sections tracked by the "spacesaving" tracker.
+    None,       # checkpointPath: where to periodically save the read offset and statistics, and resume from on startup. None disables.
+    5,          # checkpointIntervalSecs: the minimum number of seconds between checkpoints.
+    10,         # rollingBucketSecs: the width of the time buckets for recent statistics (the "last interval" in reports).
+    30,         # rollingNumBuckets: the number of time buckets kept for recent statistics (the "last N minutes" in reports).
+    True,       # metricsEnabled: whether to record metrics about the analyzer itself (see "Metrics").
+    None,       # metricsPath: where to dump the metrics after every report. None disables.
+    None,       # metricsPort: the local port on which the metrics and snapshots of the statistics are served over HTTP. None disables.
+    12,         # clientSketchPrecision: the distinct clients are estimated with 2**clientSketchPrecision registers (see "HyperLogLog").
+    (),         # alertRules: specs of alerting rules besides the "hits" one (see "AlertEngine.parseRuleSpec()"). Needs the "engine" backend.
+    None,       # sectionAlertHits: the number of hits of a single section within "sectionAlertWinLenSecs" that generates an alert. None disables.
+    60,         # sectionAlertWinLenSecs: the length of the per-section alerting window in seconds.
+    10000,      # sectionAlertMaxSections: the maximum number of sections tracked for per-section alerts (see "KeyedAlerter").
+    None,       # archivePath: the directory to which parsed lines are appended for later queries (see "Archive"). None disables.
+    'watchdog', # runtime: how the log file is tailed, one of "RUNTIMES" below.
+)
+
+
+# The ways the analyzer can tail the log file (see "LogAnalyzer.runForever()").
+RUNTIMES = (
+    'watchdog',  # A watchdog observer thread calls "on_modified()", and the alerters run in their own threads (or process).
+    'asyncio',   # Reading, alerting and reporting are tasks of a single asyncio event loop (see "AsyncRuntime").
+)
+
+
+# Alerter implementations that can be selected with "Config.alerterBackend".
+ALERTER_BACKENDS = {
+    'manager': Alerter,            # State lives in a manager process and the alerter runs in its own process.
+    'thread' : InProcessAlerter,   # State lives in this process and the alerter runs on a thread.
+    'engine' : AlertEngine,        # Like "thread", but evaluates any number of rules when needed instead of polling.
+}
+
+
+# Section count trackers that can be selected with "Config.sectionTracker". Each entry creates a tracker from the config, with
+# the interner of the sections it counts (see "Interner"). A Heap keeps every section anyway, but interning every section ever
+# seen would defeat the bounded memory of SpaceSaving, so its sections are their own IDs.
+SECTION_TRACKERS = {
+    'heap'       : lambda config: (Heap(), Interner()),                                               # Exact counts, unbounded memory.
+    'spacesaving': lambda config: (SpaceSaving(config.sectionTrackerCapacity), IdentityInterner()),   # Approximate counts, bounded memory.
+}
 
 
 class LogStats(FileSystemEventHandler):
@@ -29,79 +92,319 @@ class LogStats(FileSystemEventHandler):
 
     NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW = 3
 
-    # https://en.wikipedia.org/wiki/Common_Log_Format
-    # https://github.com/rory/apache-log-parser
-    LOG_FORMAT = '%a %l %u %t "%m %U %H" %s %b'
-    LOG_FORMAT_ALT = '%a %l %u %t "-" %s %b'  # In my experiments all log lines that failed the first format parsed using this one.
-
     # How to format datetime objects for printing.
     DATETIME_FMT = '%Y-%m-%d %H:%M:%S'
 
+    # The maximum age of the snapshot served as JSON while the statistics keep changing.
+    SNAPSHOT_JSON_MAX_AGE_SECS = 1
+
+    # Checkpoints only keep the sketches of this many sections with the most hits, so that they stay cheap to take however many
+    # sections there are. The other sections keep their counts, and get new sketches if they are requested again.
+    NUM_CHECKPOINT_SECTION_SKETCHES = 1000
+
 
     def __init__(self, config):
         super().__init__()
 
         self.config = config
 
-        # Open the log file for reading and seek to the end of it.
-        self.logHandle = open(self.config.logFilePath)
-        self.logHandle.seek(0, 2)
-
         # This parser is used to parse every log line.
-        self.logParser = apache_log_parser.make_parser(LogStats.LOG_FORMAT)
-        # If the first parser fails, we try this one.
-        self.logParserAlt = apache_log_parser.make_parser(LogStats.LOG_FORMAT_ALT)
+        self.logParser = LogParser(self.config.useFastParser)
+
+        # Metrics about the analyzer itself, or None if they are disabled.
+        self.metrics = Metrics() if self.config.metricsEnabled else None
 
         # This lock grants exclusive access to data structures below.
         self.lock = Lock()
+        if self.metrics is not None:
+            self.lock = self.metrics.wrapLock(self.lock, 'logstats_lock_wait_seconds', 'Time spent waiting for the statistics lock.')
+
+        # Status codes and methods are interned: the statistics below are keyed by their IDs, and their names are only looked up
+        # when the statistics are shown (or copied into a StatsBatch). So are sections, unless the section tracker bounds memory
+        # (see "SECTION_TRACKERS"), in which case they are their own IDs.
+        self.statusIds, self.methodIds = Interner(), Interner()
 
         # Various statistics.
         self.numHits = 0  # Total number of requests.
         self.numBadLines = 0  # Number of log lines that could not be parsed.
         self.responseBytesTot = 0  # Total response bytes sent.
-        self.retCode2count = defaultdict(int)  # Count for each status code.
-        self.method2count = defaultdict(int)  # Count for each request method.
+        self.retCode2count = IdCounter(self.statusIds)  # Count for each status code.
+        self.method2count = IdCounter(self.methodIds)  # Count for each request method.
+
+        # This keeps track of the section IDs we have seen so far and their counts. Depending on the config, it is either a Heap
+        # holding all sections, or a SpaceSaving object holding (approximate counts of) the sections with the most hits. The
+        # interner of the sections comes with it.
+        self.sectionTracker, self.sectionIds = SECTION_TRACKERS[self.config.sectionTracker](self.config)
+
+        # Sketches of the distinct clients and of the response sizes, overall and of each section (by ID) in the section tracker.
+        # The sketches of sections no longer in the tracker (i.e. evicted from a "spacesaving" tracker) are dropped from time to time.
+        self.clients = HyperLogLog(self.config.clientSketchPrecision)
+        self.sectionId2clients = {}
+        self.responseBytes = DDSketch()
+        self.sectionId2responseBytes = {}
+
+        # The statistics above are lifetime totals. These are the statistics of recent time intervals (by arrival time).
+        self.rollingStats = RollingStats(self.config.rollingBucketSecs, self.config.rollingNumBuckets, self.config.clientSketchPrecision)
+
+        # The number of times the statistics above changed, and the last Snapshot taken of them (with its JSON rendering, once
+        # it was rendered), which is reused until they change again.
+        self.generation = 0
+        self.snapshot = None
+        self.snapshotJson = None
+
+        # Create the alerter and start its event loop in a separate process (or thread, depending on the backend).
+        self.alerter = ALERTER_BACKENDS[self.config.alerterBackend](self.config.numHitsToGenAlert, self.config.alertWinLenSecs)
+        for spec in self.config.alertRules:
+            self.alerter.addRule(parseRuleSpec(spec))
+        if self.metrics is not None:
+            self.alerter.lock = self.metrics.wrapLock(self.alerter.lock, 'alerter_lock_wait_seconds', 'Time spent waiting for the alerter lock.')
+            # With the "manager" backend, "genAlert()" runs in another process and this histogram stays empty here.
+            self.alerter.genAlertHistogram = self.metrics.histogram('alerter_genalert_seconds', 'Duration of the alerter\'s periodic check.')
+        # With the "asyncio" runtime, the alerters run as tasks of the event loop instead of being started here.
+        if self.config.runtime != 'asyncio':
+            self.alerterProc = self.alerter.makeRunner()
+            self.alerterProc.start()
+
+        # Per-section alerts, or None if they are disabled. Thousands of sections share one alerter, which runs on a thread.
+        self.sectionAlerter = None
+        if self.config.sectionAlertHits is not None:
+            self.sectionAlerter = KeyedAlerter(self.config.sectionAlertHits, self.config.sectionAlertWinLenSecs, self.config.sectionAlertMaxSections)
+            if self.metrics is not None:
+                self.sectionAlerter.genAlertHistogram = self.metrics.histogram('section_alerter_genalert_seconds',
+                                                                               'Duration of the per-section alerter\'s periodic check.')
+            if self.config.runtime != 'asyncio':
+                self.sectionAlerterThread = self.sectionAlerter.makeRunner()
+                self.sectionAlerterThread.start()
+
+        # New lines are read into this reader's buffer, a buffer at a time, so that a burst of lines does not take more memory.
+        self.lineReader = LineReader()
+
+        # Open the log file for reading. Without a checkpoint, we seek to the end of it. Otherwise, we restore the statistics and
+        # resume reading where the checkpoint left off.
+        checkpoint = None if self.config.checkpointPath is None else loadCheckpoint(self.config.checkpointPath)
+        self.lastCheckpointSecs = time.time()
+        # The thread writing the last checkpoint (see "saveCheckpoint()"), or None, and the exception it failed with, or None.
+        self.checkpointThread = None
+        self.checkpointError = None
+
+        # Parsed lines are appended to this archive, or it is None if they are not archived. Lines archived after the checkpoint
+        # we resume from are dropped, since they will be read again.
+        self.archiveWriter = None if self.config.archivePath is None else ArchiveWriter(self.config.archivePath)
+        if self.archiveWriter is not None and checkpoint is not None and checkpoint.archiveNumRecords is not None:
+            self.archiveWriter.truncate(min(checkpoint.archiveNumRecords, self.archiveWriter.numRecords))
+
+        if self.config.logFilePath is None:
+            # There is no log file to read: the statistics are merged in by someone else (see "Sharding.Coordinator").
+            pass
+        elif checkpoint is None:
+            self.openLogFile()
+            self.logHandle.seek(0, 2)
+        else:
+            self.mergeBatch(checkpoint.stats, isRecent = False)
+            self.resumeFromCheckpoint(checkpoint)
 
-        # This heap keeps track of all sections we have seen so far and their counts.
-        self.heap = Heap()
 
-        # Create the alerter and start its event loop in a separate process.
-        self.alerter = Alerter(self.config.numHitsToGenAlert, self.config.alertWinLenSecs)
-        self.alerterProc = multiprocessing.Process(target = self.alerter.runAlerter)
-        self.alerterProc.start()
+    def __del__(self):
+        # Stop the alerters and wait for them to finish. Their runners are missing if "__init__()" failed, or if the "asyncio"
+        # runtime runs them instead.
+        if hasattr(self, 'alerterProc'):
+            self.alerter.stopRunner(self.alerterProc)
+        if hasattr(self, 'sectionAlerterThread'):
+            self.sectionAlerter.stopRunner(self.sectionAlerterThread)
+        if hasattr(self, 'logHandle'):
+            self.logHandle.close()
+        if getattr(self, 'archiveWriter', None) is not None:
+            self.archiveWriter.flush()
 
 
-    def __del__(self):
-        # Terminate the alerter process and wait for it to finish.
-        self.alerterProc.terminate()
-        self.alerterProc.join()
+    def __str__(self):
+        '''Returns a formatted string showing various statistics and alerts. Only taking a snapshot of the statistics holds our lock.'''
+
+        snapshot = self.getSnapshot()
+        ret = LogStats.getStatsStr(snapshot.section2count, snapshot.numSections, snapshot.numHits, snapshot.responseBytesTot,
+                                   snapshot.numBadLines, snapshot.retCode2count, snapshot.method2count, snapshot.clients.getCount(),
+                                   LogStats.getSection2numClients(snapshot.section2count, snapshot.section2clients),
+                                   snapshot.responseBytes, snapshot.section2responseBytes)
+        # Show the last complete interval and the longest window we keep, both with the interval being filled.
+        for windowSecs, window in getWindows(snapshot):
+            ret += LogStats.getWindowStr(window, windowSecs)
+
+        # Append alerts (if any). Alerters are thread-safe, so we don't need to have our lock acquired.
+        ret += LogStats.getRuleAlertsStr(self.alerter.getRuleAlerts(), self.config.numHitsToGenAlert)
+        if self.sectionAlerter is not None:
+            ret += LogStats.getSectionAlertsStr(self.sectionAlerter.getAlerts(), self.config.sectionAlertHits)
+        return ret
 
-        self.logHandle.close()
 
+    def getSnapshot(self, maxAgeSecs = 0):
+        '''Returns a Snapshot of our statistics. Our lock is only held while the counters, the sketches of the sections with the most
+        hits and the rolling buckets are copied (or referenced, if complete), not while they are formatted. The same snapshot is returned
+        until the current rolling bucket ends, and until the statistics change or (if they keep changing) it is "maxAgeSecs" old.'''
 
-    def __str__(self):
-        '''Returns a formatted string showing various statistics and alerts.'''
+        nowSecs = time.time()
+        bucketId = int(nowSecs // self.config.rollingBucketSecs)
+        snapshot = self.snapshot
+        # Reading "self.generation" without the lock is fine: at worst, we return the snapshot of the previous generation.
+        if (snapshot is not None and snapshot.bucketId == bucketId and
+            (snapshot.generation == self.generation or nowSecs - snapshot.tsSecs < maxAgeSecs)):
+            return snapshot
 
         with self.lock:
-            section2Count = self.heap.getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)
-            ret = (color('SECTIONS WITH THE MOST HITS   : %s\n' % LogStats.getVal2CountStr(section2Count), GREEN) +
-                         'Number of sections requested  : %d\n' % self.heap.getNumObjs() +
-                         'Total number of hits          : %d\n' % self.numHits +
-                         'Total response bytes          : %d\n' % self.responseBytesTot +
-                         'Number of bad log lines       : %d\n' % self.numBadLines +
-                         'Status code counts            : %s\n' % LogStats.getVal2CountStr(self.retCode2count) +
-                         'Method counts                 : %s\n' % LogStats.getVal2CountStr(self.method2count))
-
-        # Append alerts (if any). Alerter is thread-safe, so we don't need to have our lock acquired.
-        for transition, tsSecs in self.alerter.getAlerts():
+            sectionId2count = self.sectionTracker.getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)
+            snapshot = Snapshot(
+                generation            = self.generation,
+                bucketId              = bucketId,
+                tsSecs                = nowSecs,
+                numHits               = self.numHits,
+                numBadLines           = self.numBadLines,
+                responseBytesTot      = self.responseBytesTot,
+                numSections           = self.sectionTracker.getNumObjs(),
+                section2count         = self.sectionIds.decode(sectionId2count),
+                retCode2count         = dict(self.retCode2count.items()),
+                method2count          = dict(self.method2count.items()),
+                clients               = self.clients.copy(),
+                section2clients       = self.sectionIds.decode({sectionId: self.sectionId2clients[sectionId].copy()
+                                                                for sectionId in sectionId2count if sectionId in self.sectionId2clients}),
+                responseBytes         = self.responseBytes.copy(),
+                section2responseBytes = self.sectionIds.decode({sectionId: self.sectionId2responseBytes[sectionId].copy()
+                                                                for sectionId in sectionId2count if sectionId in self.sectionId2responseBytes}),
+                rollingBuckets        = self.rollingStats.getBuckets(self.config.rollingNumBuckets, nowSecs),
+                rollingBucketSecs     = self.config.rollingBucketSecs,
+                rollingNumBuckets     = self.config.rollingNumBuckets,
+                clientSketchPrecision = self.config.clientSketchPrecision,
+            )
+        self.snapshot = snapshot
+        return snapshot
+
+
+    def getSnapshotJson(self):
+        '''Returns a snapshot of our statistics (at most SNAPSHOT_JSON_MAX_AGE_SECS old) as JSON (see "Snapshot.toDict()"). It is
+        rendered once per snapshot, so however many clients poll it, it costs at most one snapshot and rendering per
+        SNAPSHOT_JSON_MAX_AGE_SECS seconds, and never holds our lock for more than taking a snapshot.'''
+
+        snapshot = self.getSnapshot(LogStats.SNAPSHOT_JSON_MAX_AGE_SECS)
+        snapshotJson = self.snapshotJson
+        if snapshotJson is None or snapshotJson[0] is not snapshot:
+            snapshotJson = self.snapshotJson = (snapshot, json.dumps(snapshotToDict(snapshot, LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)))
+        return snapshotJson[1]
+
+
+    @staticmethod
+    def getStatsStr(section2Count, numSections, numHits, responseBytesTot, numBadLines, retCode2count, method2count, numClients,
+                    section2numClients, responseBytes, section2responseBytes):
+        '''Returns a formatted string showing the passed statistics. "section2numClients" maps each of the sections in "section2Count"
+        to its (estimated) number of distinct clients, and "section2responseBytes" maps them to the DDSketch of their response sizes
+        ("responseBytes" is the one of all responses).'''
+
+        sections = [section for section, count in sorted(section2Count.items(), reverse = True, key = lambda t: t[1])]
+        sectionsStr = ', '.join('%s: %d (~%d clients)' % (section, section2Count[section], section2numClients.get(section, 0))
+                                for section in sections)
+        sectionQuantilesStr = ', '.join('%s: %s' % (section, LogStats.getQuantilesStr(section2responseBytes[section]))
+                                        for section in sections if section in section2responseBytes)
+        return (color('SECTIONS WITH THE MOST HITS   : %s\n' % sectionsStr, GREEN) +
+                      'Number of sections requested  : %d\n' % numSections +
+                      'Total number of hits          : %d\n' % numHits +
+                      'Distinct clients (approx.)    : %d\n' % numClients +
+                      'Total response bytes          : %d\n' % responseBytesTot +
+                      'Response bytes p50/p90/p99/max: %s\n' % LogStats.getQuantilesStr(responseBytes) +
+                      'Response bytes by section     : %s\n' % sectionQuantilesStr +
+                      'Number of bad log lines       : %d\n' % numBadLines +
+                      'Status code counts            : %s\n' % LogStats.getVal2CountStr(retCode2count) +
+                      'Method counts                 : %s\n' % LogStats.getVal2CountStr(method2count))
+
+
+    @staticmethod
+    def getSection2numClients(section2count, section2clients):
+        '''Returns a dict mapping each section in "section2count" to the estimated number of distinct clients in its sketch
+        (if "section2clients" has one).'''
+
+        return {section: section2clients[section].getCount() for section in section2count if section in section2clients}
+
+
+    @staticmethod
+    def getQuantilesStr(sketch):
+        '''Returns the p50, p90, p99 and maximum of the values in the passed DDSketch, formatted as "p50/p90/p99/max".'''
+
+        if sketch.count == 0:
+            return '-'
+        return '/'.join('%d' % round(sketch.getQuantile(q)) for q in (0.5, 0.9, 0.99)) + '/%d' % sketch.max
+
+
+    @staticmethod
+    def getWindowStr(window, windowSecs):
+        '''Returns a formatted one-line summary of the passed StatsBatch holding the statistics of the last "windowSecs" seconds.'''
+
+        numMins, numSecs = divmod(int(windowSecs), 60)
+        windowStr = '%d s' % numSecs if numMins == 0 else '%d min' % numMins if numSecs == 0 else '%d min %d s' % (numMins, numSecs)
+        section2count = {section: count for section, count in sorted(window.section2count.items(), key = lambda t: t[1], reverse = True)
+                         [: LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW]}
+        return ('%-30s: %d hits (%.1f/s), ~%d clients, %d bytes, sections: %s, status codes: %s\n' %
+                ('Last %s' % windowStr, window.numHits, window.numHits / windowSecs, window.clients.getCount(), window.responseBytesTot,
+                 LogStats.getVal2CountStr(section2count), LogStats.getVal2CountStr(window.retCode2count)))
+
+
+    @staticmethod
+    def getFileStr(filePath, stats, section2count = None):
+        '''Returns a formatted one-line summary of the passed StatsBatch holding the statistics of the passed log file. The sections
+        shown are the ones with the most hits in "section2count", which defaults to "stats.section2count".'''
+
+        if section2count is None:
+            section2count = stats.section2count
+        section2count = {section: count for section, count in sorted(section2count.items(), key = lambda t: t[1], reverse = True)
+                         [: LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW]}
+        return ('%-30s: %d hits, ~%d clients, %d bytes, %d bad lines, sections: %s, status codes: %s\n' %
+                (filePath, stats.numHits, stats.clients.getCount(), stats.responseBytesTot, stats.numBadLines,
+                 LogStats.getVal2CountStr(section2count), LogStats.getVal2CountStr(stats.retCode2count)))
+
+
+    @staticmethod
+    def getAlertsStr(alerts, numHitsToGenAlert):
+        '''Returns a formatted string showing the passed alerts, as returned by "Alerter.getAlerts()".'''
+
+        ret = ''
+        for transition, tsSecs in alerts:
             if transition == 'EnterHigh':
                 ret += color('High traffic generated an alert - hits >= %d, triggered at %s\n' %
-                             (self.config.numHitsToGenAlert, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), RED)
+                             (numHitsToGenAlert, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), RED)
             elif transition == 'EnterLow':
                 ret += color('High traffic alert recovered at %s\n' % dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT), MAGENTA)
             else:
                 raise NotImplementedError('Unknown transition: "%s"' % str(transition))
+        return ret
+
 
+    @staticmethod
+    def getRuleAlertsStr(ruleAlerts, numHitsToGenAlert):
+        '''Returns a formatted string showing the passed alerts of all rules, as returned by "AlertEngine.getRuleAlerts()". Alerts
+        of the "hits" rule look like the ones "getAlertsStr()" shows.'''
+
+        ret = ''
+        for ruleName, transition, tsSecs in ruleAlerts:
+            if ruleName == Alerter.HITS_RULE_NAME:
+                ret += LogStats.getAlertsStr([(transition, tsSecs)], numHitsToGenAlert)
+            elif transition == 'EnterHigh':
+                ret += color('Rule "%s" generated an alert, triggered at %s\n' % (ruleName, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), RED)
+            elif transition == 'EnterLow':
+                ret += color('Rule "%s" alert recovered at %s\n' % (ruleName, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), MAGENTA)
+            else:
+                raise NotImplementedError('Unknown transition: "%s"' % str(transition))
+        return ret
+
+
+    @staticmethod
+    def getSectionAlertsStr(sectionAlerts, sectionAlertHits):
+        '''Returns a formatted string showing the passed per-section alerts, as returned by "KeyedAlerter.getAlerts()".'''
+
+        ret = ''
+        for section, transition, tsSecs in sectionAlerts:
+            if transition == 'EnterHigh':
+                ret += color('High traffic of section %s generated an alert - hits >= %d, triggered at %s\n' %
+                             (section, sectionAlertHits, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), RED)
+            elif transition == 'EnterLow':
+                ret += color('High traffic alert of section %s recovered at %s\n' %
+                             (section, dt.fromtimestamp(tsSecs).strftime(LogStats.DATETIME_FMT)), MAGENTA)
+            else:
+                raise NotImplementedError('Unknown transition: "%s"' % str(transition))
         return ret
 
 
@@ -116,64 +419,371 @@ class LogStats(FileSystemEventHandler):
         '''This method gets called every time the directory containing our log file changes (as reported by the OS).'''
 
         super().on_modified(event)
+        self.consumeLogFile()
+
+
+    def on_created(self, event):
+        '''This method gets called every time a file is created in the directory containing our log file. This is how we notice
+        that the log file was rotated before anything is written to the new one.'''
+
+        super().on_created(event)
+        self.consumeLogFile()
+
+
+    def consumeLogFile(self, maxBytes = -1):
+        '''Processes all new lines in the log file (switching to a new log file if it was rotated), and saves a checkpoint if it
+        is due. If "maxBytes" is positive, only about that many bytes of lines are processed, and True is returned if there may be
+        more left. This method must not be called concurrently.'''
+
+        self.checkRotation()
+        startOffset = self.logHandle.tell()
+        numLines = self.processFileLines(self.logHandle, maxBytes)
+        if self.archiveWriter is not None:
+            self.archiveWriter.flush()
+
+        if self.metrics is not None:
+            self.metrics.counter('consume_calls_total', 'Number of times the log file was read.').inc()
+            self.metrics.counter('lines_read_total', 'Number of log lines read.').inc(numLines)
+            self.metrics.histogram('lines_per_consume', 'Number of log lines read per change notification.').observe(numLines)
+            self.metrics.gauge('lag_bytes', 'Number of bytes in the log file not read yet.').set(self.getLagBytes())
+            if self.sectionAlerter is not None:
+                self.metrics.gauge('section_alerter_sections', 'Number of sections tracked for per-section alerts.').set(
+                    self.sectionAlerter.getNumKeys())
+                self.metrics.gauge('section_alerter_evicted_sections', 'Number of sections with recent hits evicted to bound memory.').set(
+                    self.sectionAlerter.numEvictedKeys)
+
+        if self.config.checkpointPath is not None and time.time() - self.lastCheckpointSecs >= self.config.checkpointIntervalSecs:
+            self.saveCheckpoint(wait = False)
+
+        # Otherwise we stopped because only a partial line (if anything) is left.
+        return maxBytes > 0 and self.logHandle.tell() - startOffset >= maxBytes
+
+
+    def getLagBytes(self):
+        '''Returns the number of bytes in the log file not read yet.'''
 
-        # Read all new lines in the log file and process each.
-        for line in self.logHandle.readlines():
-            line = line.strip()
-            if len(line) > 0:
+        return os.fstat(self.logHandle.fileno()).st_size - self.logHandle.tell()
+
+
+    def processFileLines(self, f, maxBytes = -1, final = False):
+        '''Processes the complete lines of the passed binary file from its current position, a buffer of "self.lineReader" at a
+        time, until none are left or (if "maxBytes" is positive) about "maxBytes" bytes were read. A partial line at the end of the
+        file is left for later, unless "final" is True (i.e. nothing will be appended to the file anymore). Returns the number of
+        lines processed.'''
+
+        numLines, startOffset = 0, f.tell()
+        while True:
+            offset = f.tell()
+            if maxBytes > 0 and offset - startOffset >= maxBytes:
+                break
+            lines = self.lineReader.readLines(f, -1 if maxBytes <= 0 else maxBytes - (offset - startOffset), final)
+            if f.tell() == offset:
+                break
+            # The lines are views of the reader's buffer, so they must be processed before the next read.
+            self.processNewLines(lines)
+            numLines += len(lines)
+        return numLines
+
+
+    def processNewLines(self, lines):
+        '''Processes the passed lines, as returned by "LineReader.readLines()" (or stripped, non-blank strings), either one by one
+        or in batches.'''
+
+        if self.config.batchSize > 1:
+            for i in range(0, len(lines), self.config.batchSize):
+                self.processLogLines(lines[i : i + self.config.batchSize])
+        else:
+            for line in lines:
                 self.processLogLine(line)
 
 
-    def processLogLine(self, line):
-        '''Parse the passed "line". If it cannot be parsed, the line is ignored.'''
+    def openLogFile(self):
+        '''Opens the log file for reading (in binary mode, so that offsets are byte offsets, and unbuffered, since "self.lineReader"
+        has a buffer of its own) and remembers its inode.'''
+
+        self.logHandle = open(self.config.logFilePath, 'rb', buffering = 0)
+        self.logInode = os.fstat(self.logHandle.fileno()).st_ino
+
+
+    def checkRotation(self):
+        '''If the log file was rotated (i.e. the path now refers to a different file) or truncated, finishes reading the old file
+        and switches to the new one.'''
 
         try:
-            logTokens = self.logParser(line)
-        except apache_log_parser.LineDoesntMatchException:
-            # Try the other parser.
+            stat = os.stat(self.config.logFilePath)
+        except FileNotFoundError:
+            # The log file was moved away and the new one has not been created yet. Keep reading the old one.
+            return
+
+        if stat.st_ino != self.logInode:
+            # The old file may still have had lines appended to it before it was rotated.
+            self.processFileLines(self.logHandle, final = True)
+            self.logHandle.close()
+            self.openLogFile()
+        elif stat.st_size < self.logHandle.tell():
+            # The file was truncated in place (e.g. logrotate's "copytruncate"), so start over.
+            self.logHandle.seek(0)
+
+
+    def resumeFromCheckpoint(self, checkpoint):
+        '''Opens the log file and positions it according to the passed checkpoint.'''
+
+        self.openLogFile()
+        if checkpoint.inode == self.logInode:
+            if checkpoint.offset <= os.fstat(self.logHandle.fileno()).st_size:
+                self.logHandle.seek(checkpoint.offset)
+            # Otherwise the file was truncated while we were down and we read it from the start.
+            return
+
+        # The log file was rotated while we were down. If the old file is still around in the same directory (typically under
+        # a name like "access.log.1"), we first process whatever was appended to it after the checkpoint.
+        dirPath = os.path.dirname(self.config.logFilePath) or '.'
+        for fileName in os.listdir(dirPath):
+            filePath = os.path.join(dirPath, fileName)
             try:
-                logTokens = self.logParserAlt(line)
-            except apache_log_parser.LineDoesntMatchException:
-                with self.lock:
-                    self.numBadLines += 1
-                    return
-        self.updateStats(logTokens)
-
-
-    def updateStats(self, toks):
-        '''Update our statistics based on the passed log line tokens.'''
-
-        # Get the request timestamp.
-        # https://github.com/rory/apache-log-parser
-        # https://stackoverflow.com/questions/8777753/converting-datetime-date-to-utc-timestamp-in-python/8778548#8778548
-        tsSecs = calendar.timegm(toks['time_received_utc_datetimeobj'].timetuple())
-        self.alerter.addEvent(time.time() if self.config.useCurrTimestamps else tsSecs)  # Alerter has its own lock.
-
-        # Extract the section. Find the second '/' and keep everything before it. If there is no second '/', keep everything.
-        # This code is outside of critical section below since it doesn't require the lock to be held.
-        if 'url_path' in toks:  # URL path will be missing if LOG_FORMAT_ALT was used to parse the log line.
-            uri = toks['url_path']
-            idx = uri.find('/', 1)  # Start searching after the first slash.
-            section = uri if idx == -1 else uri[: idx]
-            # Strip the query if present.
-            idx = section.find('?')
-            if idx != -1:
-                section = section[ : idx]
+                if os.stat(filePath).st_ino == checkpoint.inode:
+                    with open(filePath, 'rb', buffering = 0) as f:
+                        f.seek(checkpoint.offset)
+                        self.processFileLines(f, final = True)
+                    break
+            except OSError:
+                continue
+
+
+    def saveCheckpoint(self, wait = True):
+        '''Saves the current read offset and statistics to the checkpoint file. Only copying the statistics happens on the calling
+        thread (see "getStatsBatch()"): serializing and writing them happens on a thread of its own, without our lock. Unless "wait"
+        is False, this waits until the checkpoint is written. Otherwise, nothing is saved (and False is returned) while the previous
+        checkpoint is still being written. An error writing a checkpoint is raised by the next call. This method must not be called
+        concurrently with "consumeLogFile()", since the offset must correspond to the statistics.'''
+
+        if not wait and self.checkpointThread is not None and self.checkpointThread.is_alive():
+            return False
+        self.joinCheckpointThread()
+
+        offset = self.logHandle.tell()
+        archiveNumRecords = None
+        if self.archiveWriter is not None:
+            self.archiveWriter.flush()
+            archiveNumRecords = self.archiveWriter.numRecords
+        checkpoint = Checkpoint(self.logInode, offset, self.getStatsBatch(LogStats.NUM_CHECKPOINT_SECTION_SKETCHES), archiveNumRecords)
+        self.checkpointThread = Thread(target = self.writeCheckpoint, args = (checkpoint,))
+        self.checkpointThread.start()
+        self.lastCheckpointSecs = time.time()
+        if wait:
+            self.joinCheckpointThread()
+        return True
+
+
+    def joinCheckpointThread(self):
+        '''Waits until the last checkpoint (if any) is written, and raises the exception writing it failed with (if any).'''
+
+        if self.checkpointThread is not None:
+            self.checkpointThread.join()
+            self.checkpointThread = None
+        if self.checkpointError is not None:
+            error, self.checkpointError = self.checkpointError, None
+            raise error
+
+
+    def writeCheckpoint(self, checkpoint):
+        '''Writes the passed Checkpoint to the checkpoint file, remembering the exception it fails with (if any) in
+        "self.checkpointError". Runs on a thread of its own (see "saveCheckpoint()").'''
+
+        try:
+            saveCheckpoint(self.config.checkpointPath, checkpoint)
+        except Exception as e:
+            self.checkpointError = e
+
+
+    def getStatsBatch(self, numSectionSketches = None):
+        '''Returns a StatsBatch holding a copy of our statistics (without timestamps), with the sketches of only the
+        "numSectionSketches" sections with the most hits (or of all sections we have sketches of, if None).'''
+
+        batch = StatsBatch(self.config.clientSketchPrecision)
+        with self.lock:
+            batch.numHits, batch.numBadLines, batch.responseBytesTot = self.numHits, self.numBadLines, self.responseBytesTot
+            sectionId2count = self.sectionTracker.getObjs()
+            batch.retCode2count.update(self.retCode2count.items())
+            batch.method2count.update(self.method2count.items())
+            batch.clients = self.clients.copy()
+            batch.responseBytes = self.responseBytes.copy()
+            sectionIds = self.sectionId2clients.keys() | self.sectionId2responseBytes.keys()
+            if numSectionSketches is not None:
+                sectionIds = self.sectionTracker.getMaxObjs(numSectionSketches)
+            sectionId2clients = {sectionId: self.sectionId2clients[sectionId].copy() for sectionId in sectionIds
+                                 if sectionId in self.sectionId2clients}
+            sectionId2responseBytes = {sectionId: self.sectionId2responseBytes[sectionId].copy() for sectionId in sectionIds
+                                       if sectionId in self.sectionId2responseBytes}
+        # Sections are only looked up by name once our lock is released: IDs are never reassigned.
+        batch.section2count.update(self.sectionIds.decode(sectionId2count))
+        batch.section2clients = self.sectionIds.decode(sectionId2clients)
+        batch.section2responseBytes = self.sectionIds.decode(sectionId2responseBytes)
+        return batch
+
+
+    def processLogLines(self, lines):
+        '''Parse the passed "lines" into a local batch and merge it into our statistics (and the alerter) at once.
+        Lines that cannot be parsed are ignored.'''
+
+        if self.metrics is None:
+            batch = LogStats.parseLogLines(lines, self.logParser, self.config.useCurrTimestamps, self.config.clientSketchPrecision, self.archiveWriter)
+        else:
+            startSecs = time.perf_counter()
+            batch = LogStats.parseLogLines(lines, self.logParser, self.config.useCurrTimestamps, self.config.clientSketchPrecision, self.archiveWriter)
+            if len(lines) > 0:
+                # Timing every line would cost more than parsing it, so we record the average over the batch.
+                self.metrics.histogram('parse_seconds_per_line', 'Time spent parsing a log line.').observe(
+                    (time.perf_counter() - startSecs) / len(lines))
+        self.mergeBatch(batch)
+
+
+    @staticmethod
+    def parseLogLines(lines, logParser, useCurrTimestamps = False, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION, archiveWriter = None):
+        '''Parses the passed "lines" (strings, or bytes-like lines as returned by "LineReader.readLines()") with the passed LogParser
+        and returns their statistics as a StatsBatch. The parsed lines are also added to "archiveWriter", unless it is None.'''
+
+        batch = StatsBatch(clientSketchPrecision)
+        for line in lines:
+            if isinstance(line, str):
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+            record = logParser.parse(line)
+            if record is None:
+                batch.numBadLines += 1
+            else:
+                section = LogStats.getSection(record.urlPath)
+                batch.addRecord(record, section, time.time() if useCurrTimestamps else record.tsSecs)
+                if archiveWriter is not None:
+                    archiveWriter.addRecord(record, section)
+        return batch
+
+
+    def mergeBatch(self, batch, isRecent = True):
+        '''Merges the passed StatsBatch into our statistics under a single lock acquisition, and passes its timestamps to the alerter.
+        Unless "isRecent" is False (e.g. for statistics restored from a checkpoint), the batch also counts towards the current interval.'''
+
+        getSectionId = self.sectionIds.getId
+        with self.lock:
+            for section, count in batch.section2count.items():
+                self.sectionTracker.addObj(getSectionId(section), count)
+            self.numHits += batch.numHits
+            self.numBadLines += batch.numBadLines
+            self.responseBytesTot += batch.responseBytesTot
+            for retCode, count in batch.retCode2count.items():
+                self.retCode2count.add(retCode, count)
+            for method, count in batch.method2count.items():
+                self.method2count.add(method, count)
+            self.clients.merge(batch.clients)
+            StatsBatch.mergeSketches(self.sectionId2clients, {getSectionId(section): sketch for section, sketch in batch.section2clients.items()})
+            self.responseBytes.merge(batch.responseBytes)
+            StatsBatch.mergeSketches(self.sectionId2responseBytes,
+                                     {getSectionId(section): sketch for section, sketch in batch.section2responseBytes.items()})
+            self.pruneSectionSketches()
+            if isRecent:
+                self.rollingStats.addBatch(batch, time.time())
+            self.generation += 1
+
+        if len(batch.tss) > 0:
+            self.alerter.addEvents(batch.tss, batch.statuses)  # Alerters have their own locks.
+            if self.sectionAlerter is not None:
+                self.sectionAlerter.addEvents(batch.tss, batch.sections)
+
+
+    def processLogLine(self, line):
+        '''Parse the passed "line". If it cannot be parsed, the line is ignored.'''
+
+        if self.metrics is None:
+            record = self.parseLogLine(line)
         else:
-            section = None
+            startSecs = time.perf_counter()
+            record = self.parseLogLine(line)
+            self.metrics.histogram('parse_seconds_per_line', 'Time spent parsing a log line.').observe(time.perf_counter() - startSecs)
+        if record is None:
+            with self.lock:
+                self.numBadLines += 1
+                self.generation += 1
+                return
+        self.updateStats(record)
+
+
+    def parseLogLine(self, line):
+        '''Returns a LogRecord for the passed "line", or None if it cannot be parsed.'''
+
+        return self.logParser.parse(line)
+
+
+    def updateStats(self, record):
+        '''Update our statistics based on the passed LogRecord.'''
+
+        tsSecs = time.time() if self.config.useCurrTimestamps else record.tsSecs
+        self.alerter.addEvent(tsSecs, record.status)  # Alerters have their own locks.
+
+        # These are outside of critical section below since they don't require the lock to be held. Only this thread assigns
+        # IDs, and IDs are never reassigned, so interning does not need the lock either. From here on, the section is the
+        # interned copy (if sections are interned), which every statistic shares (and whose hash is already computed).
+        section = LogStats.getSection(record.urlPath)
+        sectionId = None
+        if section is not None:
+            sectionId = self.sectionIds.getId(section)
+            section = self.sectionIds.getValue(sectionId)
+        statusId = self.statusIds.getId(record.status)
+        methodId = None if record.method is None else self.methodIds.getId(record.method)
+        if self.sectionAlerter is not None and section is not None:
+            self.sectionAlerter.addEvent(tsSecs, section)
+        if self.archiveWriter is not None:
+            self.archiveWriter.addRecord(record, section)
+        clientHash = None if record.remoteHost is None else HyperLogLog.hash(record.remoteHost)
 
         with self.lock:
-            if section is not None:
-                # Update the heap.
-                self.heap.addObj(section)
+            if sectionId is not None:
+                # Update the section counts.
+                self.sectionTracker.addObj(sectionId)
 
             # Update various stats.
             self.numHits += 1
-            self.retCode2count[toks['status']] += 1
-            if 'method' in toks:  # Method will be missing if LOG_FORMAT_ALT was used to parse the log line.
-                self.method2count[toks['method']] += 1
-            try:
-                self.responseBytesTot += int(toks['response_bytes_clf'])
-            except ValueError:
-                # Raised if the string cannot be interpreted as an integer. In that case, it should be a '-'.
-                pass
+            self.retCode2count.addId(statusId)
+            if methodId is not None:  # Method will be missing if the log line has no request line.
+                self.method2count.addId(methodId)
+            if record.responseBytes is not None:  # The log shows '-' instead of 0 when no bytes are sent.
+                self.responseBytesTot += record.responseBytes
+                StatsBatch.addResponseBytes(record.responseBytes, sectionId, self.responseBytes, self.sectionId2responseBytes)
+            if clientHash is not None:
+                self.clients.addHash(clientHash)
+                if sectionId is not None:
+                    sketch = self.sectionId2clients.get(sectionId)
+                    if sketch is None:
+                        sketch = self.sectionId2clients[sectionId] = HyperLogLog(self.config.clientSketchPrecision)
+                    sketch.addHash(clientHash)
+            self.pruneSectionSketches()
+            self.rollingStats.addRecord(record, section, time.time())
+            self.generation += 1
+
+
+    def pruneSectionSketches(self):
+        '''Drops the sketches of sections that are no longer in the section tracker, once there are twice as many sketches as
+        tracked sections (so that this takes amortized O(1) time). This method assumes the caller has acquired the lock.'''
+
+        if max(len(self.sectionId2clients), len(self.sectionId2responseBytes)) > 2 * self.sectionTracker.getNumObjs():
+            sectionId2count = self.sectionTracker.getObjs()
+            self.sectionId2clients = {sectionId: sketch for sectionId, sketch in self.sectionId2clients.items() if sectionId in sectionId2count}
+            self.sectionId2responseBytes = {sectionId: sketch for sectionId, sketch in self.sectionId2responseBytes.items()
+                                            if sectionId in sectionId2count}
+
+
+    @staticmethod
+    def getSection(urlPath):
+        '''Returns the section of the passed URL path, or None if the URL path is None (i.e. the log line has no request line).'''
+
+        if urlPath is None:
+            return None
+
+        # Find the second '/' and keep everything before it. If there is no second '/', keep everything.
+        idx = urlPath.find('/', 1)  # Start searching after the first slash.
+        section = urlPath if idx == -1 else urlPath[: idx]
+        # Strip the query if present.
+        idx = section.find('?')
+        if idx != -1:
+            section = section[ : idx]
+        return section
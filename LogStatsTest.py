@@ -0,0 +1,346 @@
+import json, os, shutil, stat, tempfile, unittest
+from unittest.mock import patch
+
+from Archive import Archive
+from Checkpoint import loadCheckpoint
+from LineReader import LineReader
+from LogStats import Config, LogStats
+
+
+class LogStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirPath = tempfile.mkdtemp()
+        self.logFilePath = os.path.join(self.dirPath, 'access.log')
+        self.checkpointPath = os.path.join(self.dirPath, 'checkpoint.json')
+        open(self.logFilePath, 'w').close()
+        with open('source.log') as f:
+            self.lines = f.readlines()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dirPath)
+
+
+    def makeStats(self, **kwargs):
+        '''Returns a LogStats object tailing our temporary log file, with the in-process alerter and the passed config overrides.'''
+
+        config = Config(logFilePath = self.logFilePath, numHitsToGenAlert = 10, alertWinLenSecs = 60, useCurrTimestamps = False,
+                        alerterBackend = 'thread')
+        return LogStats(config._replace(**kwargs))
+
+
+    def appendLines(self, lines):
+        with open(self.logFilePath, 'a') as f:
+            f.writelines(lines)
+
+
+    @staticmethod
+    def getState(stats):
+        decode = stats.sectionIds.decode
+        return (stats.numHits, stats.numBadLines, stats.responseBytesTot, dict(stats.retCode2count), dict(stats.method2count),
+                decode(stats.sectionTracker.getMaxObjs(stats.sectionTracker.getNumObjs())), stats.clients, decode(stats.sectionId2clients),
+                stats.responseBytes, decode(stats.sectionId2responseBytes), list(stats.alerter.tss), stats.alerter.idx.value)
+
+
+    def testBatchedMatchesPerLine(self):
+        perLineStats, batchedStats = self.makeStats(batchSize = 1), self.makeStats(batchSize = 1000)
+        self.appendLines(self.lines + ['this is not a log line\n', '\n'])
+        perLineStats.on_modified(None)
+        batchedStats.on_modified(None)
+
+        self.assertEqual(len(self.lines), batchedStats.numHits)
+        self.assertEqual(1, batchedStats.numBadLines)
+        self.assertEqual(LogStatsTest.getState(perLineStats), LogStatsTest.getState(batchedStats))
+
+
+    def testSpaceSavingMatchesHeapWhenCapacitySuffices(self):
+        heapStats, spaceSavingStats = self.makeStats(), self.makeStats(sectionTracker = 'spacesaving', sectionTrackerCapacity = 1000)
+        self.appendLines(self.lines)
+        heapStats.on_modified(None)
+        spaceSavingStats.on_modified(None)
+        self.assertEqual(LogStatsTest.getState(heapStats), LogStatsTest.getState(spaceSavingStats))
+
+
+    def testBurstIsReadInBoundedChunks(self):
+        for batchSize in (1, 1000):
+            stats, expectedStats = self.makeStats(batchSize = batchSize), self.makeStats(batchSize = batchSize)
+            # The longest line of source.log is about 1 KB.
+            stats.lineReader = LineReader(2000)
+            self.appendLines(self.lines)
+            stats.on_modified(None)
+            self.assertEqual(2000, len(stats.lineReader.buf))
+            expectedStats.processNewLines([line.strip() for line in self.lines])
+            self.assertEqual(LogStatsTest.getState(expectedStats), LogStatsTest.getState(stats))
+
+
+    def testOnlyNewLinesAreRead(self):
+        self.appendLines(self.lines[: 10])
+        stats = self.makeStats()
+        self.appendLines(self.lines[10 : 15])
+        stats.on_modified(None)
+        self.assertEqual(5, stats.numHits)
+
+
+    def testPartialLineIsLeftForLater(self):
+        stats = self.makeStats()
+        self.appendLines([self.lines[0], self.lines[1][: 20]])
+        stats.on_modified(None)
+        self.assertEqual((1, 0), (stats.numHits, stats.numBadLines))
+        self.appendLines([self.lines[1][20 :]])
+        stats.on_modified(None)
+        self.assertEqual((2, 0), (stats.numHits, stats.numBadLines))
+
+
+    def testResumeFromCheckpoint(self):
+        stats = self.makeStats(checkpointPath = self.checkpointPath)
+        self.appendLines(self.lines[: 100])
+        stats.on_modified(None)
+        stats.saveCheckpoint()
+        expected = LogStatsTest.getState(stats)[: 10]
+        del stats
+
+        # Lines written while the analyzer was down are not lost.
+        self.appendLines(self.lines[100 : 150])
+        stats = self.makeStats(checkpointPath = self.checkpointPath)
+        self.assertEqual(expected, LogStatsTest.getState(stats)[: 10])
+        stats.on_modified(None)
+        self.assertEqual(150, stats.numHits)
+
+
+    def testCheckpointRenameIsSynced(self):
+        stats = self.makeStats(checkpointPath = self.checkpointPath)
+        # Whether every synced file descriptor is a directory.
+        fsync, syncedDirs = os.fsync, []
+        with patch.object(os, 'fsync', side_effect = lambda fd: (syncedDirs.append(stat.S_ISDIR(os.fstat(fd).st_mode)), fsync(fd))):
+            stats.saveCheckpoint()
+        # The checkpoint is synced before it is renamed, and its directory after.
+        self.assertEqual([False, True], syncedDirs)
+
+
+    def testCheckpointKeepsTopSectionSketches(self):
+        with patch.object(LogStats, 'NUM_CHECKPOINT_SECTION_SKETCHES', 2):
+            stats = self.makeStats(checkpointPath = self.checkpointPath, checkpointIntervalSecs = 0)
+            self.appendLines(self.lines)
+            # The checkpoint is written by another thread.
+            stats.on_modified(None)
+            stats.joinCheckpointThread()
+        checkpoint = loadCheckpoint(self.checkpointPath)
+        self.assertEqual(stats.numHits, checkpoint.stats.numHits)
+        self.assertEqual(stats.sectionIds.decode(stats.sectionTracker.getObjs()), checkpoint.stats.section2count)
+        topSections = set(stats.sectionIds.decode(stats.sectionTracker.getMaxObjs(2)))
+        self.assertGreater(len(checkpoint.stats.section2count), 2)
+        self.assertEqual(topSections, set(checkpoint.stats.section2clients))
+        self.assertEqual(topSections, set(checkpoint.stats.section2responseBytes))
+
+        # An error writing a checkpoint is raised on the thread saving it.
+        stats.config = stats.config._replace(checkpointPath = os.path.join(self.dirPath, 'missing', 'checkpoint.json'))
+        with self.assertRaises(FileNotFoundError):
+            stats.saveCheckpoint()
+
+
+    def testArchive(self):
+        archivePath = os.path.join(self.dirPath, 'archive')
+        for batchSize in (1, 1000):
+            shutil.rmtree(archivePath, ignore_errors = True)
+            stats = self.makeStats(batchSize = batchSize, checkpointPath = self.checkpointPath, archivePath = archivePath)
+            self.appendLines(self.lines[: 100])
+            stats.on_modified(None)
+            stats.saveCheckpoint()
+            self.appendLines(self.lines[100 : 150])
+            stats.on_modified(None)
+            del stats
+
+            # The lines archived after the checkpoint are archived again, but only once.
+            stats = self.makeStats(batchSize = batchSize, checkpointPath = self.checkpointPath, archivePath = archivePath)
+            self.assertEqual(100, stats.archiveWriter.numRecords)
+            stats.on_modified(None)
+            with Archive(archivePath) as archive:
+                self.assertEqual(150, archive.count())
+                self.assertEqual(dict(stats.retCode2count), archive.groupBy('status'))
+            del stats
+            os.remove(self.checkpointPath)
+            os.remove(self.logFilePath)
+            open(self.logFilePath, 'w').close()
+
+
+    def testResumeAfterRotationWhileDown(self):
+        stats = self.makeStats(checkpointPath = self.checkpointPath)
+        self.appendLines(self.lines[: 100])
+        stats.on_modified(None)
+        stats.saveCheckpoint()
+        del stats
+
+        self.appendLines(self.lines[100 : 120])
+        os.rename(self.logFilePath, self.logFilePath + '.1')
+        self.appendLines(self.lines[120 : 150])
+        stats = self.makeStats(checkpointPath = self.checkpointPath)
+        stats.on_modified(None)
+        self.assertEqual(150, stats.numHits)
+
+
+    def testRotation(self):
+        stats = self.makeStats()
+        self.appendLines(self.lines[: 10])
+        stats.on_modified(None)
+        self.assertEqual(10, stats.numHits)
+
+        # Lines appended to the old file after its last read, but before it was rotated, are not lost.
+        self.appendLines(self.lines[10 : 15])
+        os.rename(self.logFilePath, self.logFilePath + '.1')
+        stats.on_modified(None)
+        self.assertEqual(15, stats.numHits)
+
+        self.appendLines(self.lines[15 : 18])
+        stats.on_created(None)
+        self.assertEqual(18, stats.numHits)
+
+        # Truncation in place.
+        open(self.logFilePath, 'w').close()
+        self.appendLines(self.lines[18 : 20])
+        stats.on_modified(None)
+        self.assertEqual(20, stats.numHits)
+
+
+    def testReportShowsRecentIntervals(self):
+        stats = self.makeStats(rollingBucketSecs = 10, rollingNumBuckets = 6)
+        self.appendLines(self.lines[: 10])
+        stats.on_modified(None)
+        report = str(stats)
+        # Both windows include the interval being filled, and are labelled with the time they cover.
+        self.assertRegex(report, r'Last 1\d s *: 10 hits')
+        self.assertRegex(report, r'Last 1 min( 1?\d s)? *: 10 hits')
+
+
+    def testSnapshot(self):
+        stats = self.makeStats(rollingBucketSecs = 3600)
+        self.appendLines(self.lines[: 10])
+        stats.on_modified(None)
+
+        # The snapshot (and its JSON) is reused until the statistics change.
+        snapshot, snapshotJson = stats.getSnapshot(), stats.getSnapshotJson()
+        self.assertIs(snapshot, stats.getSnapshot())
+        self.assertIs(snapshotJson, stats.getSnapshotJson())
+        self.assertEqual(10, snapshot.numHits)
+        self.assertEqual(stats.sectionIds.decode(stats.sectionTracker.getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)),
+                         snapshot.section2count)
+        # Reading the top sections leaves the heap intact.
+        self.assertEqual(len(stats.sectionIds.decode(stats.sectionTracker.getObjs())), snapshot.numSections)
+
+        self.appendLines(self.lines[10 : 15])
+        stats.on_modified(None)
+        self.assertIsNot(snapshot, stats.getSnapshot())
+        self.assertEqual(10, snapshot.numHits)
+        dct = json.loads(stats.getSnapshotJson())
+        self.assertEqual(15, dct['numHits'])
+        self.assertEqual(stats.clients.getCount(), dct['numClients'])
+        self.assertEqual(dict(stats.retCode2count), dct['retCode2count'])
+        self.assertEqual(list(snapshot.section2count)[0], dct['topSections'][0]['section'])
+        # The windows also cover the elapsed part of the current hour, whose hits they include.
+        for numHours, window in zip((1, 30), dct['windows']):
+            self.assertAlmostEqual(3600 * numHours + dct['tsSecs'] % 3600, window['windowSecs'], places = 3)
+        self.assertEqual([15, 15], [window['numHits'] for window in dct['windows']])
+        self.assertIn('Total number of hits          : 15', str(stats))
+
+        # While the statistics keep changing, the JSON is only rendered again once its snapshot is old enough.
+        snapshotJson = stats.getSnapshotJson()
+        self.appendLines(self.lines[15 : 20])
+        stats.on_modified(None)
+        self.assertIs(snapshotJson, stats.getSnapshotJson())
+        with patch.object(LogStats, 'SNAPSHOT_JSON_MAX_AGE_SECS', 0):
+            self.assertEqual(20, json.loads(stats.getSnapshotJson())['numHits'])
+
+
+    def testMetrics(self):
+        stats, unmeteredStats = self.makeStats(), self.makeStats(metricsEnabled = False)
+        self.appendLines(self.lines[: 10])
+        stats.on_modified(None)
+        unmeteredStats.on_modified(None)
+        self.assertEqual(LogStatsTest.getState(stats), LogStatsTest.getState(unmeteredStats))
+        self.assertIsNone(unmeteredStats.metrics)
+
+        self.assertEqual(10, stats.metrics.counter('lines_read_total', '').value)
+        self.assertEqual(0, stats.metrics.gauge('lag_bytes', '').value)
+        self.assertEqual(1, stats.metrics.histogram('parse_seconds_per_line', '').count)
+        self.assertGreater(stats.metrics.histogram('logstats_lock_wait_seconds', '').count, 0)
+        self.assertGreater(stats.metrics.histogram('alerter_lock_wait_seconds', '').count, 0)
+
+
+    def testDistinctClients(self):
+        stats = self.makeStats()
+        self.appendLines(self.lines)
+        stats.on_modified(None)
+
+        section2hosts = {}
+        for line in self.lines:
+            record = stats.parseLogLine(line.strip())
+            section2hosts.setdefault(LogStats.getSection(record.urlPath), set()).add(record.remoteHost)
+        numHosts = len(set.union(*section2hosts.values()))
+        self.assertLess(abs(stats.clients.getCount() - numHosts), 0.05 * numHosts)
+        for section, sketch in stats.sectionIds.decode(stats.sectionId2clients).items():
+            self.assertLess(abs(sketch.getCount() - len(section2hosts[section])), 0.05 * len(section2hosts[section]) + 1)
+        self.assertIn('Distinct clients (approx.)    : %d' % stats.clients.getCount(), str(stats))
+
+
+    def testResponseBytesQuantiles(self):
+        stats = self.makeStats()
+        self.appendLines(self.lines)
+        stats.on_modified(None)
+
+        responseBytes = sorted(record.responseBytes for record in (stats.parseLogLine(line.strip()) for line in self.lines)
+                               if record.responseBytes is not None)
+        for q in (0.5, 0.9, 0.99):
+            expected = responseBytes[int(q * (len(responseBytes) - 1))]
+            self.assertLessEqual(abs(stats.responseBytes.getQuantile(q) - expected), 0.01 * expected)
+        self.assertEqual(responseBytes[-1], stats.responseBytes.max)
+        self.assertEqual(set(stats.sectionId2clients), set(stats.sectionId2responseBytes))
+        self.assertIn('Response bytes p50/p90/p99/max: %s' % LogStats.getQuantilesStr(stats.responseBytes), str(stats))
+
+
+    def testSectionSketchesAreBoundedBySectionTracker(self):
+        stats = self.makeStats(sectionTracker = 'spacesaving', sectionTrackerCapacity = 5)
+        self.appendLines(self.lines)
+        stats.on_modified(None)
+        for sectionId2sketch in (stats.sectionId2clients, stats.sectionId2responseBytes):
+            self.assertLessEqual(len(sectionId2sketch), 2 * 5)
+            self.assertTrue(set(stats.sectionTracker.getObjs()) <= set(sectionId2sketch))
+        # Sections are not interned either, which would keep every section ever seen.
+        self.assertGreater(len(LogStats.parseLogLines(self.lines, stats.logParser).section2count), 2 * 5)
+        self.assertEqual(0, len(stats.sectionIds))
+
+
+    def testAlertRules(self):
+        stats = self.makeStats(alerterBackend = 'engine', useCurrTimestamps = True, alertRules = ('2xx:count:5:60', '5xx:ratio:0.5:60'))
+        self.appendLines(self.lines[: 10])
+        stats.on_modified(None)
+        report = str(stats)
+        self.assertIn('High traffic generated an alert - hits >= 10', report)
+        self.assertIn('Rule "2xx:count:5:60" generated an alert', report)
+        self.assertNotIn('5xx:ratio', report)
+
+        with self.assertRaises(NotImplementedError):
+            self.makeStats(alertRules = ('2xx:count:5:60',))
+
+
+    def testSectionAlerts(self):
+        for batchSize in (1, 1000):
+            stats = self.makeStats(batchSize = batchSize, useCurrTimestamps = True, sectionAlertHits = 5, sectionAlertWinLenSecs = 60)
+            # 5 of the first 10 lines request the "/css" section, and none requests another section more than twice.
+            self.appendLines(self.lines[: 10])
+            stats.on_modified(None)
+            report = str(stats)
+            self.assertIn('High traffic of section /css generated an alert - hits >= 5', report)
+            self.assertEqual(1, report.count('High traffic of section'))
+            self.assertEqual(5, stats.sectionAlerter.getNumKeys())
+            self.assertNotIn('High traffic of section', str(stats))
+
+
+    def testGetSection(self):
+        self.assertEqual('/transits', LogStats.getSection('/transits/moon-trine-mercury/'))
+        self.assertEqual('/index.php', LogStats.getSection('/index.php?page=1'))
+        self.assertEqual('/', LogStats.getSection('/'))
+        self.assertIsNone(LogStats.getSection(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
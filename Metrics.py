@@ -0,0 +1,213 @@
+import math, os, threading, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class Counter:
+    '''A monotonically increasing count.'''
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.value = 0
+
+
+    def inc(self, amount = 1):
+        self.value += amount
+
+
+    def getText(self):
+        return '# HELP %s %s\n# TYPE %s counter\n%s %s\n' % (self.name, self.help, self.name, self.name, self.value)
+
+
+class Gauge:
+    '''A value that can go up and down.'''
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.value = 0
+
+
+    def set(self, value):
+        self.value = value
+
+
+    def getText(self):
+        return '# HELP %s %s\n# TYPE %s gauge\n%s %s\n' % (self.name, self.help, self.name, self.name, self.value)
+
+
+class Histogram:
+    '''A distribution of observed values in buckets whose upper bounds are powers of 2. Observing a value takes O(1) time and memory
+    is bounded by the range of exponents of the observed values, so histograms are cheap enough to be updated all the time.'''
+
+    # Values smaller than 2**MIN_EXP (including 0) all go to the lowest bucket.
+    MIN_EXP = -40
+
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.exp2count = {}  # Maps exponent e to the number of values v with 2**(e - 1) <= v < 2**e (or v < 2**e for the lowest bucket).
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+
+    def observe(self, value):
+        # "math.frexp()" returns (m, e) such that value == m * 2**e and 0.5 <= m < 1, so value < 2**e.
+        exp = max(math.frexp(value)[1], Histogram.MIN_EXP) if value > 0 else Histogram.MIN_EXP
+        self.exp2count[exp] = self.exp2count.get(exp, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+    def getQuantile(self, q):
+        '''Returns an upper bound of the passed quantile (between 0 and 1), which is within a factor of 2 of the true value.'''
+
+        rank, seen = q * self.count, 0
+        for exp in sorted(self.exp2count):
+            seen += self.exp2count[exp]
+            if seen >= rank:
+                return min(2.0 ** exp, self.max)
+        return self.max
+
+
+    def getText(self):
+        '''Returns the histogram in the Prometheus text exposition format. A histogram may only have "_bucket", "_sum" and "_count"
+        samples, so the maximum and the quantile bounds are exposed as gauges of their own.'''
+
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        seen = 0
+        # Copy the dict, since it may be updated concurrently.
+        for exp, count in sorted(dict(self.exp2count).items()):
+            seen += count
+            lines.append('%s_bucket{le="%g"} %d' % (self.name, 2.0 ** exp, seen))
+        lines.append('%s_bucket{le="+Inf"} %d' % (self.name, self.count))
+        lines.append('%s_sum %g' % (self.name, self.sum))
+        lines.append('%s_count %d' % (self.name, self.count))
+        lines.append('# HELP %s_max The largest value of %s' % (self.name, self.name))
+        lines.append('# TYPE %s_max gauge' % self.name)
+        lines.append('%s_max %g' % (self.name, self.max))
+        lines.append('# HELP %s_quantile_bound Upper bounds (within a factor of 2) of quantiles of %s' % (self.name, self.name))
+        lines.append('# TYPE %s_quantile_bound gauge' % self.name)
+        for q in (0.5, 0.99):
+            lines.append('%s_quantile_bound{q="%g"} %g' % (self.name, q, self.getQuantile(q)))
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedLock:
+    '''Wraps a lock (including a "multiprocessing.Manager" lock proxy) and records in a Histogram how long each acquisition waited.'''
+
+    def __init__(self, lock, histogram):
+        self.lock, self.histogram = lock, histogram
+
+
+    def acquire(self):
+        startSecs = time.perf_counter()
+        ret = self.lock.acquire()
+        self.histogram.observe(time.perf_counter() - startSecs)
+        return ret
+
+
+    def release(self):
+        self.lock.release()
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+
+
+class Metrics:
+    '''A registry of counters, gauges and histograms describing the analyzer itself (as opposed to the analyzed traffic).
+    Instruments are updated without locking: under the GIL a concurrent update may very rarely be lost, which is an acceptable
+    price for keeping the updates cheap.'''
+
+    # All metric names start with this.
+    PREFIX = 'loganalyzer_'
+
+
+    def __init__(self):
+        self.name2instrument = {}
+
+
+    def getInstrument(self, instrumentClass, name, help):
+        '''Returns the instrument with the passed name, creating it if it does not exist yet.'''
+
+        name = Metrics.PREFIX + name
+        instrument = self.name2instrument.get(name)
+        if instrument is None:
+            instrument = self.name2instrument[name] = instrumentClass(name, help)
+        return instrument
+
+
+    def counter(self, name, help):
+        return self.getInstrument(Counter, name, help)
+
+
+    def gauge(self, name, help):
+        return self.getInstrument(Gauge, name, help)
+
+
+    def histogram(self, name, help):
+        return self.getInstrument(Histogram, name, help)
+
+
+    def wrapLock(self, lock, name, help):
+        '''Returns the passed lock wrapped so that the time spent waiting for it is recorded in the histogram with the passed name.'''
+
+        return InstrumentedLock(lock, self.histogram(name, help))
+
+
+    def getText(self):
+        '''Returns all metrics in the Prometheus text exposition format.'''
+
+        return ''.join(instrument.getText() for name, instrument in sorted(self.name2instrument.items()))
+
+
+    def dump(self, filePath):
+        '''Atomically replaces the passed file with the text returned by "getText()".'''
+
+        tmpFilePath = filePath + '.tmp'
+        with open(tmpFilePath, 'w') as f:
+            f.write(self.getText())
+        os.replace(tmpFilePath, filePath)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    '''An HTTP server handling each request in a new thread ("http.server.ThreadingHTTPServer" requires Python 3.7).'''
+
+    daemon_threads = True
+
+
+def startHttpServer(port, path2getText, path2contentType = {}):
+    '''Starts serving, on a daemon thread, text responses on the passed port of the loopback interface. "path2getText" maps each URL
+    path to a function returning the text to serve for it, which is plain text unless "path2contentType" maps the path to another
+    content type. Returns the server, whose "shutdown()" method stops it.'''
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            getText = path2getText.get(self.path)
+            if getText is None:
+                self.send_error(404)
+                return
+            body = getText().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', '%s; charset=utf-8' % path2contentType.get(self.path, 'text/plain'))
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+        def log_message(self, format, *args):
+            # Do not clutter stdout, where the statistics are printed.
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
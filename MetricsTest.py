@@ -0,0 +1,93 @@
+import os, shutil, tempfile, threading, unittest
+from urllib.request import urlopen
+
+from Metrics import Histogram, Metrics, startHttpServer
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+
+    def tearDown(self):
+        pass
+
+
+    def testHistogramQuantiles(self):
+        histogram = Histogram('h', 'help')
+        for value in range(1, 101):
+            histogram.observe(value)
+        histogram.observe(0)
+        self.assertEqual(101, histogram.count)
+        self.assertEqual(5050, histogram.sum)
+        self.assertEqual(100, histogram.max)
+        # Quantiles are upper bounds within a factor of 2 of the true value.
+        self.assertEqual(64, histogram.getQuantile(0.5))
+        self.assertEqual(100, histogram.getQuantile(0.99))
+
+
+    def testInstrumentsAreCreatedOnce(self):
+        self.metrics.counter('lines_total', 'help').inc(3)
+        self.metrics.counter('lines_total', 'help').inc()
+        self.assertEqual(4, self.metrics.counter('lines_total', 'help').value)
+
+
+    def testInstrumentedLock(self):
+        lock = self.metrics.wrapLock(threading.Lock(), 'lock_wait_seconds', 'help')
+        with lock:
+            pass
+        lock.acquire()
+        lock.release()
+        self.assertEqual(2, self.metrics.histogram('lock_wait_seconds', 'help').count)
+
+
+    def testGetText(self):
+        self.metrics.gauge('lag_bytes', 'Lag.').set(42)
+        self.metrics.histogram('parse_seconds', 'Parse time.').observe(0.75)
+        text = self.metrics.getText()
+        self.assertIn('# TYPE loganalyzer_lag_bytes gauge\nloganalyzer_lag_bytes 42\n', text)
+        self.assertIn('loganalyzer_parse_seconds_bucket{le="1"} 1\n', text)
+        self.assertIn('loganalyzer_parse_seconds_count 1\n', text)
+        self.assertIn('# TYPE loganalyzer_parse_seconds_max gauge\nloganalyzer_parse_seconds_max 0.75\n', text)
+        self.assertIn('loganalyzer_parse_seconds_quantile_bound{q="0.5"} 0.75\n', text)
+
+        # Every sample belongs to the family declared last, and histograms only have the samples they may have.
+        name2type = {}
+        for line in text.splitlines():
+            if line.startswith('# TYPE '):
+                name, type = line.split()[2 :]
+                name2type[name] = type
+            elif not line.startswith('#'):
+                sampleName = line.split('{')[0].split()[0]
+                familyName = list(name2type)[-1]
+                suffixes = ('_bucket', '_sum', '_count') if name2type[familyName] == 'histogram' else ('',)
+                self.assertIn(sampleName, [familyName + suffix for suffix in suffixes])
+
+
+    def testDumpAndServe(self):
+        self.metrics.counter('lines_total', 'help').inc()
+        dirPath = tempfile.mkdtemp()
+        try:
+            filePath = os.path.join(dirPath, 'metrics.txt')
+            self.metrics.dump(filePath)
+            with open(filePath) as f:
+                self.assertEqual(self.metrics.getText(), f.read())
+        finally:
+            shutil.rmtree(dirPath)
+
+        server = startHttpServer(0, {'/metrics': self.metrics.getText, '/stats': lambda: '{}'}, {'/stats': 'application/json'})
+        try:
+            with urlopen('http://127.0.0.1:%d/metrics' % server.server_address[1]) as response:
+                self.assertEqual(self.metrics.getText(), response.read().decode('utf-8'))
+                self.assertEqual('text/plain; charset=utf-8', response.headers['Content-Type'])
+            with urlopen('http://127.0.0.1:%d/stats' % server.server_address[1]) as response:
+                self.assertEqual('{}', response.read().decode('utf-8'))
+                self.assertEqual('application/json; charset=utf-8', response.headers['Content-Type'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
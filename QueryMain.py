@@ -0,0 +1,56 @@
+import argparse, time
+from datetime import datetime as dt
+
+from Archive import DICT_COLUMNS, Archive
+from LogStats import LogStats
+
+
+def parseTime(s):
+    '''Returns the timestamp in seconds of the passed local time formatted like in reports (e.g. "2018-04-21 12:00:00"), or of the
+    passed number of seconds since the epoch.'''
+
+    try:
+        return float(s)
+    except ValueError:
+        return time.mktime(dt.strptime(s, LogStats.DATETIME_FMT).timetuple())
+
+
+def parseWhere(s):
+    '''Returns the tuple (column, value) of the passed "<column>=<value>" filter. The value "-" stands for None.'''
+
+    column, sep, value = s.partition('=')
+    if len(sep) == 0 or column not in DICT_COLUMNS:
+        raise argparse.ArgumentTypeError('Expected "<column>=<value>" with one of the columns %s: "%s"' % (', '.join(DICT_COLUMNS), s))
+    return column, None if value == '-' else value
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Queries the parsed log lines archived by the analyzer (see "--archivePath" of LogAnalyzerMain.py).')
+    parser.add_argument('--archivePath', required = True, type = str,
+                        help = 'The archive directory.')
+    parser.add_argument('--startTime', required = False, type = parseTime, default = None,
+                        help = 'Only count the requests at or after this local time ("%s") or timestamp in seconds.' %
+                               LogStats.DATETIME_FMT.replace('%', '%%'))
+    parser.add_argument('--endTime', required = False, type = parseTime, default = None,
+                        help = 'Only count the requests before this local time or timestamp in seconds.')
+    parser.add_argument('--where', required = False, type = parseWhere, nargs = '*', default = [],
+                        help = 'Only count the requests with these values, each "<column>=<value>", e.g. "status=500" or "method=POST".')
+    parser.add_argument('--groupBy', required = False, type = str, default = None, choices = DICT_COLUMNS,
+                        help = 'Show the values of this column with the most requests.')
+    parser.add_argument('--topK', required = False, type = int, default = 10,
+                        help = 'The number of values shown with "--groupBy".')
+    args = parser.parse_args()
+
+    startSecs = time.perf_counter()
+    with Archive(args.archivePath) as archive:
+        where = dict(args.where)
+        print('Matching requests   : %d (of %d)' % (archive.count(args.startTime, args.endTime, where), archive.numRecords))
+        print('Total response bytes: %d' % archive.sumResponseBytes(args.startTime, args.endTime, where))
+        if args.groupBy is not None:
+            for value, count in archive.topK(args.groupBy, args.topK, args.startTime, args.endTime, where):
+                print('  %-40s %d' % ('-' if value is None else value, count))
+    print('Query took %.1f ms' % (1000 * (time.perf_counter() - startSecs)))
+
+
+if __name__ == '__main__':
+    main()
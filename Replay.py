@@ -0,0 +1,175 @@
+import math
+from collections import namedtuple
+
+from AlertEngine import AlertEngine, parseRuleSpec
+from Alerter import Alerter, InProcessAlerter
+from Clock import SimulatedClock
+from KeyedAlerter import KeyedAlerter
+from LogStats import ALERTER_BACKENDS, LogStats
+
+
+# The name under which the transitions of per-section alerts are reported.
+SECTION_RULE_NAME = 'section hits'
+
+# A transition of an alert during a replay. "ruleName" is the name of the rule (e.g. "hits"), or SECTION_RULE_NAME for per-section
+# alerts, in which case "section" is the section (and None otherwise). "tsSecs" is the event time at which it occurred.
+Transition = namedtuple('Transition', ('tsSecs', 'ruleName', 'section', 'transition'))
+
+
+class Replayer:
+    '''Feeds events (e.g. the requests of an old log file) through the alerters of a config in event time, as fast as the CPU allows.
+    The alerters read a SimulatedClock, which jumps from one evaluation to the next: every "Alerter.SAMPLING_DELAY_SECS" seconds
+    of event time, like their runners do in real time, and at the deadlines of an AlertEngine. The events up to an evaluation are
+    added right before it. Stretches of time in which no alerter can change state without new events are skipped. The resulting
+    timeline only depends on the events and the config, not on how fast they are fed or how they are split into calls.'''
+
+    def __init__(self, config):
+        '''Only the alerting fields of the passed config are used. The "manager" backend is replayed with an InProcessAlerter,
+        which behaves the same without a manager process.'''
+
+        self.config = config
+        self.clock = SimulatedClock()
+
+        alerterClass = InProcessAlerter if self.config.alerterBackend == 'manager' else ALERTER_BACKENDS[self.config.alerterBackend]
+        self.alerter = alerterClass(self.config.numHitsToGenAlert, self.config.alertWinLenSecs, clock = self.clock)
+        for spec in self.config.alertRules:
+            self.alerter.addRule(parseRuleSpec(spec))
+        self.sectionAlerter = None
+        if self.config.sectionAlertHits is not None:
+            self.sectionAlerter = KeyedAlerter(self.config.sectionAlertHits, self.config.sectionAlertWinLenSecs,
+                                               self.config.sectionAlertMaxSections, clock = self.clock)
+
+        # The events with timestamps up to the next evaluation, which are added to the alerters right before it.
+        self.tss, self.statuses, self.sections = [], [], []
+        self.firstTsSecs = None  # The timestamp of the first event.
+        self.tickSecs = None  # The next evaluation on the "Alerter.SAMPLING_DELAY_SECS" grid, which starts at the first event.
+        self.lastEvalSecs = None  # When the alerters were last evaluated.
+        self.numEvents = 0
+
+        # The chronologically ordered list of Transitions generated so far.
+        self.transitions = []
+
+
+    def addEvents(self, tss, statuses, sections):
+        '''Adds events with the passed timestamps, status codes and sections (lists as long as "tss", e.g. those of a StatsBatch),
+        evaluating the alerters whenever their timestamps pass an evaluation time.'''
+
+        i = 0
+        while i < len(tss):
+            if self.tickSecs is None:
+                self.firstTsSecs = tss[i]
+                self.tickSecs = tss[i] + Alerter.SAMPLING_DELAY_SECS
+            evalSecs = self.getNextEvalSecs()
+            j = i
+            while j < len(tss) and tss[j] <= evalSecs:
+                j += 1
+            self.tss.extend(tss[i : j])
+            self.statuses.extend(statuses[i : j])
+            self.sections.extend(sections[i : j])
+            self.numEvents += j - i
+            if j == len(tss):
+                # The next call may add more events up to "evalSecs".
+                break
+            self.evaluate(evalSecs, tss[j])
+            i = j
+
+
+    def finish(self):
+        '''Evaluates the alerters until all alerts are silenced, as if no more events arrived, and returns "self.transitions".'''
+
+        if self.tickSecs is None:
+            return self.transitions
+        self.evaluate(self.getNextEvalSecs())
+        while True:
+            deadlineSecs = self.getDeadlineSecs()
+            if self.needsTicks():
+                self.evaluate(self.getNextEvalSecs())
+            elif deadlineSecs is not None:
+                # Only the deadlines of an AlertEngine are left, so the ticks in between are skipped.
+                self.evaluate(deadlineSecs)
+            else:
+                return self.transitions
+
+
+    def getDeadlineSecs(self):
+        '''Returns when an AlertEngine needs to be evaluated next (see "AlertEngine.nextDeadlineSecs"), or None.'''
+
+        if not isinstance(self.alerter, AlertEngine):
+            return None
+        deadlineSecs = self.alerter.nextDeadlineSecs
+        # A deadline that already passed cannot be met anymore (and would keep us evaluating at the same time).
+        if deadlineSecs is None or (self.lastEvalSecs is not None and deadlineSecs <= self.lastEvalSecs):
+            return None
+        return deadlineSecs
+
+
+    def getNextEvalSecs(self):
+        '''Returns when the alerters are evaluated next: at the next tick, or at the next deadline of an AlertEngine if earlier.'''
+
+        deadlineSecs = self.getDeadlineSecs()
+        return self.tickSecs if deadlineSecs is None else min(self.tickSecs, deadlineSecs)
+
+
+    def needsTicks(self):
+        '''Returns whether evaluating the alerters on the next tick may change their state even without new events. An AlertEngine
+        never needs ticks, since it has deadlines instead.'''
+
+        if not isinstance(self.alerter, AlertEngine) and self.alerter.state.value == 'High':
+            return True
+        return self.sectionAlerter is not None and len(self.sectionAlerter.highKeys) > 0
+
+
+    def evaluate(self, evalSecs, nextTsSecs = None):
+        '''Adds the pending events to the alerters and evaluates them at "evalSecs", then moves to the next tick, skipping the
+        ticks before the next event (with timestamp "nextTsSecs", if any) if they cannot change anything.'''
+
+        self.clock.set(evalSecs)
+        self.lastEvalSecs = evalSecs
+        if len(self.tss) > 0:
+            self.alerter.addEvents(self.tss, self.statuses)
+            if self.sectionAlerter is not None:
+                self.sectionAlerter.addEvents(self.tss, self.sections)
+            self.tss, self.statuses, self.sections = [], [], []
+
+        with self.alerter.lock:
+            self.alerter.genAlert(evalSecs)
+        self.transitions.extend(Transition(tsSecs, ruleName, None, transition) for ruleName, transition, tsSecs in self.alerter.getRuleAlerts())
+        if self.sectionAlerter is not None:
+            with self.sectionAlerter.lock:
+                self.sectionAlerter.genAlert(evalSecs)
+            self.transitions.extend(Transition(tsSecs, SECTION_RULE_NAME, section, transition)
+                                    for section, transition, tsSecs in self.sectionAlerter.getAlerts())
+
+        if evalSecs >= self.tickSecs:
+            self.tickSecs += (math.floor((evalSecs - self.tickSecs) / Alerter.SAMPLING_DELAY_SECS) + 1) * Alerter.SAMPLING_DELAY_SECS
+        if nextTsSecs is not None and nextTsSecs > self.tickSecs and not self.needsTicks():
+            # Nothing can happen until the next event arrives, so jump to the first tick at or after it.
+            self.tickSecs += math.ceil((nextTsSecs - self.tickSecs) / Alerter.SAMPLING_DELAY_SECS) * Alerter.SAMPLING_DELAY_SECS
+
+
+def getTimelineStr(transitions, config):
+    '''Returns a formatted string showing the passed Transitions one per line, like the alerts in reports.'''
+
+    ret = ''
+    for tsSecs, ruleName, section, transition in transitions:
+        if ruleName == SECTION_RULE_NAME:
+            ret += LogStats.getSectionAlertsStr([(section, transition, tsSecs)], config.sectionAlertHits)
+        else:
+            ret += LogStats.getRuleAlertsStr([(ruleName, transition, tsSecs)], config.numHitsToGenAlert)
+    return ret
+
+
+def getSummary(transitions):
+    '''Returns a dict mapping the name of every rule with alerts among the passed Transitions (which must all be silenced) to a tuple
+    (numAlerts, highSecs): the number of alerts and the total number of seconds they lasted. The alerts of all sections are summed
+    under SECTION_RULE_NAME.'''
+
+    name2summary, key2startSecs = {}, {}
+    for tsSecs, ruleName, section, transition in transitions:
+        numAlerts, highSecs = name2summary.get(ruleName, (0, 0))
+        if transition == 'EnterHigh':
+            key2startSecs[(ruleName, section)] = tsSecs
+            name2summary[ruleName] = (numAlerts + 1, highSecs)
+        else:
+            name2summary[ruleName] = (numAlerts, highSecs + tsSecs - key2startSecs.pop((ruleName, section)))
+    return name2summary
@@ -0,0 +1,73 @@
+import argparse, itertools, os, time
+
+import Backfill
+from LogAnalyzerMain import NUM_HITS_TO_GENERATE_ALERT, SECTION_ALERT_MAX_SECTIONS, SECTION_ALERT_WIN_LEN_SECS, TIME_WINDOW_TO_GENERATE_ALERT_SECS
+from LogStats import ALERTER_BACKENDS, Config
+from Replay import getSummary, getTimelineStr
+from Sharding import expandFilePaths
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replays an existing log file through the alerters in event time, as fast as possible, '
+                                                   'and shows the alerts they would have generated.')
+    parser.add_argument('--logFilePath', required = True, type = str, nargs = '+',
+                        help = 'The log file to replay. Several paths or (quoted) glob patterns, e.g. "access.log*", are replayed in '
+                               'chronological order, and rotated files may be compressed with gzip, bzip2 or xz.')
+    parser.add_argument('--numHitsToGenAlert', required = False, type = int, nargs = '+', default = [NUM_HITS_TO_GENERATE_ALERT],
+                        help = 'The number of hits within alerting window required to generate alert. With several values (or several '
+                               '"--alertWinLenSecs"), every combination is replayed, while parsing the log file only once.')
+    parser.add_argument('--alertWinLenSecs', required = False, type = int, nargs = '+', default = [TIME_WINDOW_TO_GENERATE_ALERT_SECS],
+                        help = 'The length of the alerting window in seconds.')
+    parser.add_argument('--alerterBackend', required = False, type = str, default = 'thread', choices = sorted(ALERTER_BACKENDS),
+                        help = 'The alerter to replay. The "manager" alerter is replayed in this process, where it behaves like the '
+                               '"thread" one.')
+    parser.add_argument('--alertRules', required = False, type = str, nargs = '*', default = [],
+                        help = 'Alerting rules besides the hits one, like for LogAnalyzerMain.py. Requires "--alerterBackend engine".')
+    parser.add_argument('--sectionAlertHits', required = False, type = int, default = None,
+                        help = 'Also replay per-section alerts with this threshold. By default there are no per-section alerts.')
+    parser.add_argument('--sectionAlertWinLenSecs', required = False, type = int, default = SECTION_ALERT_WIN_LEN_SECS,
+                        help = 'The length of the per-section alerting window in seconds.')
+    parser.add_argument('--sectionAlertMaxSections', required = False, type = int, default = SECTION_ALERT_MAX_SECTIONS,
+                        help = 'The maximum number of sections tracked for per-section alerts.')
+    parser.add_argument('--numWorkers', required = False, type = int, default = os.cpu_count(),
+                        help = 'The number of worker processes parsing the log file.')
+    parser.add_argument('--summaryOnly', action = 'store_true',
+                        help = 'Only show the number and total duration of the alerts of every rule, not every transition.')
+    args = parser.parse_args()
+    logFilePaths = expandFilePaths(args.logFilePath)
+    if len(logFilePaths) == 0:
+        parser.error('No log files match "%s"' % ' '.join(args.logFilePath))
+    if len(args.alertRules) > 0 and args.alerterBackend != 'engine':
+        parser.error('"--alertRules" requires "--alerterBackend engine"')
+
+    configs = [Config(
+        logFilePath             = None,
+        numHitsToGenAlert       = numHitsToGenAlert,
+        alertWinLenSecs         = alertWinLenSecs,
+        useCurrTimestamps       = False,
+        alerterBackend          = args.alerterBackend,
+        alertRules              = tuple(args.alertRules),
+        sectionAlertHits        = args.sectionAlertHits,
+        sectionAlertWinLenSecs  = args.sectionAlertWinLenSecs,
+        sectionAlertMaxSections = args.sectionAlertMaxSections,
+    ) for numHitsToGenAlert, alertWinLenSecs in itertools.product(args.numHitsToGenAlert, args.alertWinLenSecs)]
+
+    startSecs = time.perf_counter()
+    replayers = Backfill.replayFiles(logFilePaths, configs, args.numWorkers)
+    elapsedSecs = time.perf_counter() - startSecs
+
+    for replayer in replayers:
+        config = replayer.config
+        print('Alerts with --numHitsToGenAlert %d --alertWinLenSecs %d:' % (config.numHitsToGenAlert, config.alertWinLenSecs))
+        if not args.summaryOnly:
+            print(getTimelineStr(replayer.transitions, config), end = '')
+        for ruleName, (numAlerts, highSecs) in sorted(getSummary(replayer.transitions).items()):
+            print('  %-30s %6d alerts, high for %.1f minutes in total' % (ruleName, numAlerts, highSecs / 60))
+        print()
+    replayer = replayers[0]
+    spanSecs = 0 if replayer.numEvents == 0 else replayer.lastEvalSecs - replayer.firstTsSecs
+    print('Replayed %d requests (%.1f hours of event time) %d times in %.1f s' % (replayer.numEvents, spanSecs / 3600, len(replayers), elapsedSecs))
+
+
+if __name__ == '__main__':
+    main()
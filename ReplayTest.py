@@ -0,0 +1,78 @@
+import unittest
+
+import Backfill
+from LogParser import LogParser
+from LogStats import Config, LogStats
+from Replay import SECTION_RULE_NAME, Replayer, Transition, getSummary, getTimelineStr
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('source.log') as f:
+            self.stats = LogStats.parseLogLines(f.readlines(), LogParser())
+
+
+    def tearDown(self):
+        pass
+
+
+    @staticmethod
+    def replay(config, tss, sections = None, batchSize = None):
+        '''Returns the Transitions of replaying the passed events with the passed config, "batchSize" events per call (all at once
+        if None).'''
+
+        replayer = Replayer(config)
+        sections = [None] * len(tss) if sections is None else sections
+        batchSize = max(1, len(tss)) if batchSize is None else batchSize
+        for i in range(0, len(tss), batchSize):
+            replayer.addEvents(tss[i : i + batchSize], ['200'] * len(tss[i : i + batchSize]), sections[i : i + batchSize])
+        return replayer.finish()
+
+
+    def testAlertEngineDeadlines(self):
+        # The engine is evaluated when the events arrive (on the ticks at 5 and 7), then at its deadlines: the hits rule enters
+        # "Low" once the bucket of the event at 5 leaves the window, not on the next tick.
+        config = Config(None, 3, 4, False, alerterBackend = 'engine')
+        self.assertEqual([Transition(7, 'hits', None, 'EnterHigh'), Transition(10.001, 'hits', None, 'EnterLow')],
+                         ReplayTest.replay(config, [4, 5, 7, 8]))
+        self.assertEqual([], ReplayTest.replay(config, []))
+
+
+    def testSectionAlerts(self):
+        config = Config(None, 100, 4, False, alerterBackend = 'thread', sectionAlertHits = 2, sectionAlertWinLenSecs = 12)
+        transitions = ReplayTest.replay(config, [4, 5, 5, 30], ['/a', '/a', '/b', '/a'])
+        # The per-section alerter is ticked until "/a" leaves "High" state, then skips to the last event.
+        self.assertEqual([Transition(5, SECTION_RULE_NAME, '/a', 'EnterHigh'), Transition(17, SECTION_RULE_NAME, '/a', 'EnterLow')],
+                         transitions)
+        self.assertEqual({SECTION_RULE_NAME: (1, 12)}, getSummary(transitions))
+        self.assertIn('High traffic alert of section /a recovered at', getTimelineStr(transitions, config))
+
+
+    def testResultDoesNotDependOnBatching(self):
+        for config in (Config(None, 10, 60, False, alerterBackend = 'thread', sectionAlertHits = 5),
+                       Config(None, 10, 60, False, alerterBackend = 'engine', alertRules = ('3xx:count:20:30', '2xx:ratio:0.9:60'))):
+            transitions = ReplayTest.replay(config, self.stats.tss, self.stats.sections)
+            self.assertGreater(len(transitions), 0)
+            self.assertEqual(transitions, sorted(transitions, key = lambda transition: transition.tsSecs))
+            self.assertEqual(transitions, ReplayTest.replay(config, self.stats.tss, self.stats.sections, batchSize = 7))
+
+            # Every alert is silenced in the end.
+            name2summary = getSummary(transitions)
+            self.assertEqual(len(transitions), 2 * sum(numAlerts for numAlerts, highSecs in name2summary.values()))
+
+
+    def testReplayFiles(self):
+        configs = [Config(None, numHitsToGenAlert, 60, False, alerterBackend = 'thread', sectionAlertHits = 20)
+                   for numHitsToGenAlert in (10, 100)]
+        for numWorkers in (1, 2):
+            replayers = Backfill.replayFiles(['source.log'], configs, numWorkers)
+            for config, replayer in zip(configs, replayers):
+                self.assertEqual(len(self.stats.tss), replayer.numEvents)
+                self.assertEqual(ReplayTest.replay(config, self.stats.tss, self.stats.sections), replayer.transitions)
+        # A lower threshold generates more alerts.
+        self.assertGreater(getSummary(replayers[0].transitions)['hits'][0], getSummary(replayers[1].transitions)['hits'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
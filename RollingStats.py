@@ -0,0 +1,90 @@
+from HyperLogLog import HyperLogLog
+from StatsBatch import StatsBatch
+
+
+class RollingStats:
+    '''Keeps statistics for recent fixed-width time buckets in a ring, so that statistics over the last few buckets can be reported
+    alongside the lifetime ones. Adding to the statistics takes O(1) time, and memory is bounded by the number of buckets.
+    Each bucket is a StatsBatch without timestamps.'''
+
+    def __init__(self, bucketSecs, numBuckets, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION):
+        '''Keeps "numBuckets" complete buckets of "bucketSecs" seconds each, plus the bucket currently being filled.'''
+
+        assert bucketSecs > 0 and numBuckets > 0
+        self.bucketSecs, self.numBuckets, self.clientSketchPrecision = bucketSecs, numBuckets, clientSketchPrecision
+        self.buckets = [StatsBatch(clientSketchPrecision) for i in range(numBuckets + 1)]
+        self.bucketIds = [None] * (numBuckets + 1)  # The bucket ID (time divided by bucket width) each slot currently holds.
+
+
+    def getBucket(self, nowSecs):
+        '''Returns the bucket for the passed time, recycling the slot if it holds an expired bucket.'''
+
+        bucketId = int(nowSecs // self.bucketSecs)
+        slot = bucketId % len(self.buckets)
+        if self.bucketIds[slot] != bucketId:
+            self.buckets[slot] = StatsBatch(self.clientSketchPrecision)
+            self.bucketIds[slot] = bucketId
+        return self.buckets[slot]
+
+
+    def addRecord(self, record, section, nowSecs):
+        '''Adds a parsed log line (see "StatsBatch.addRecord()") to the bucket for the passed time.'''
+
+        self.getBucket(nowSecs).addRecord(record, section)
+
+
+    def addBatch(self, batch, nowSecs):
+        '''Adds the statistics in the passed StatsBatch (but not its timestamps) to the bucket for the passed time.'''
+
+        self.getBucket(nowSecs).merge(batch, mergeTss = False)
+
+
+    def getWindow(self, numBuckets, nowSecs):
+        '''Returns a StatsBatch with the statistics of the last "numBuckets" complete buckets before the passed time and of the
+        bucket that contains "nowSecs", which is still being filled. They cover "getWindowSecs()" seconds.'''
+
+        return RollingStats.mergeBuckets(self.getBuckets(numBuckets, nowSecs), self.clientSketchPrecision)
+
+
+    def getWindowSecs(self, numBuckets, nowSecs):
+        '''Returns the number of seconds covered by the window of the last "numBuckets" complete buckets before the passed time and
+        the elapsed part of the current bucket (see "getWindow()").'''
+
+        return RollingStats.getCoveredSecs(numBuckets, self.bucketSecs, nowSecs)
+
+
+    @staticmethod
+    def getCoveredSecs(numBuckets, bucketSecs, nowSecs):
+        '''Returns the number of seconds covered by "numBuckets" complete buckets of "bucketSecs" seconds and the elapsed part of the
+        bucket that contains "nowSecs".'''
+
+        return numBuckets * bucketSecs + nowSecs - int(nowSecs // bucketSecs) * bucketSecs
+
+
+    def getBuckets(self, numBuckets, nowSecs):
+        '''Returns a list of tuples (bucketId, bucket) of the last "numBuckets" complete buckets before the passed time and of the
+        bucket that contains it, that hold statistics. A complete bucket is never modified again (its slot gets a new StatsBatch when
+        it is recycled), unless the clock goes back, and the current one is copied, so the buckets can be merged later without
+        holding whatever lock protects this object.'''
+
+        assert numBuckets <= self.numBuckets
+        currBucketId = int(nowSecs // self.bucketSecs)
+        buckets = []
+        for bucketId in range(currBucketId - numBuckets, currBucketId + 1):
+            slot = bucketId % len(self.buckets)
+            if self.bucketIds[slot] == bucketId:
+                bucket = self.buckets[slot]
+                if bucketId == currBucketId:
+                    bucket = RollingStats.mergeBuckets([(bucketId, bucket)], self.clientSketchPrecision)
+                buckets.append((bucketId, bucket))
+        return buckets
+
+
+    @staticmethod
+    def mergeBuckets(buckets, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION):
+        '''Returns a StatsBatch with the statistics of the passed buckets, as returned by "getBuckets()".'''
+
+        window = StatsBatch(clientSketchPrecision)
+        for bucketId, bucket in buckets:
+            window.merge(bucket, mergeTss = False)
+        return window
@@ -0,0 +1,64 @@
+import unittest
+
+from ClfParser import LogRecord
+from RollingStats import RollingStats
+from StatsBatch import StatsBatch
+
+
+class RollingStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rollingStats = RollingStats(10, 3)
+
+
+    def tearDown(self):
+        pass
+
+
+    @staticmethod
+    def makeRecord(status = '200', responseBytes = 100):
+        return LogRecord(0, 'GET', '/a/b', status, responseBytes)
+
+
+    def testCurrentBucketIsReported(self):
+        self.rollingStats.addRecord(RollingStatsTest.makeRecord(), '/a', 105)
+        # The bucket being filled is part of every window, which covers the elapsed part of it.
+        self.assertEqual(1, self.rollingStats.getWindow(1, 109).numHits)
+        self.assertEqual(19, self.rollingStats.getWindowSecs(1, 109))
+        self.assertEqual(1, self.rollingStats.getWindow(1, 110).numHits)
+        self.assertEqual(0, self.rollingStats.getWindow(1, 120).numHits)
+        self.assertEqual(1, self.rollingStats.getWindow(3, 120).numHits)
+        self.assertEqual(30, self.rollingStats.getWindowSecs(3, 120))
+
+        # The current bucket is copied, so it can be merged while more is added to it.
+        buckets = self.rollingStats.getBuckets(1, 109)
+        self.rollingStats.addRecord(RollingStatsTest.makeRecord(), '/a', 109)
+        self.assertEqual(1, RollingStats.mergeBuckets(buckets).numHits)
+        self.assertEqual(2, self.rollingStats.getWindow(1, 109).numHits)
+
+
+    def testWindow(self):
+        for nowSecs in (100, 105, 112, 125, 127, 131):
+            self.rollingStats.addRecord(RollingStatsTest.makeRecord(), '/a', nowSecs)
+        batch = StatsBatch()
+        batch.addRecord(RollingStatsTest.makeRecord('404', None), '/b', 7)
+        self.rollingStats.addBatch(batch, 133)
+
+        window = self.rollingStats.getWindow(3, 140)  # Buckets [110, 120), [120, 130), [130, 140) and the empty [140, 150).
+        self.assertEqual(5, window.numHits)
+        self.assertEqual(400, window.responseBytesTot)
+        self.assertEqual({'/a': 4, '/b': 1}, window.section2count)
+        self.assertEqual({'200': 4, '404': 1}, window.retCode2count)
+        self.assertEqual([], window.tss)
+
+
+    def testExpiredBucketsAreRecycled(self):
+        self.rollingStats.addRecord(RollingStatsTest.makeRecord(), '/a', 100)
+        # This lands in the same slot as the bucket [100, 110), which must not be counted anymore.
+        self.rollingStats.addRecord(RollingStatsTest.makeRecord(), '/a', 140)
+        self.assertEqual(1, self.rollingStats.getWindow(3, 150).numHits)
+        self.assertEqual(4, len(self.rollingStats.buckets))
+
+
+if __name__ == '__main__':
+    unittest.main()
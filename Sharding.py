@@ -0,0 +1,315 @@
+import asyncio, glob, multiprocessing, os, queue, signal, time
+
+import AsyncRuntime
+from AsyncRuntime import FileWatcher
+from LineReader import LineReader
+from LogParser import LogParser
+from LogStats import LogStats
+from SpaceSaving import SpaceSaving
+from StatsBatch import StatsBatch
+
+
+# How often the workers send the statistics of the lines they parsed (their deltas) to the coordinator. Events reach the alerters
+# up to this much later than with a single process.
+DELTA_INTERVAL_SECS = 1
+
+# How long the coordinator waits for the workers to start tailing their files.
+WORKER_START_TIMEOUT_SECS = 60
+
+
+def expandFilePaths(patterns):
+    '''Returns the sorted, distinct paths of the files matching the passed paths or glob patterns. A path without glob characters
+    is kept even if the file does not exist (yet).'''
+
+    filePaths = set()
+    for pattern in patterns:
+        if glob.escape(pattern) == pattern:
+            filePaths.add(pattern)
+        else:
+            filePaths.update(filePath for filePath in glob.glob(pattern) if os.path.isfile(filePath))
+    return sorted(filePaths)
+
+
+def assignShards(filePaths, numShards):
+    '''Spreads the passed files across at most "numShards" shards, so that the shards have about as many bytes to read (judging
+    by the current file sizes, since busy logs tend to stay busy). Returns the list of the file paths of every shard.'''
+
+    def getSize(filePath):
+        try:
+            return os.path.getsize(filePath)
+        except OSError:
+            return 0
+
+    numShards = max(1, min(numShards, len(filePaths)))
+    shards, shardSizes = [[] for i in range(numShards)], [0] * numShards
+    # Each file goes to the smallest shard so far, largest files first. Empty files count as one byte, so they are spread too.
+    for filePath in sorted(filePaths, key = getSize, reverse = True):
+        i = shardSizes.index(min(shardSizes))
+        shards[i].append(filePath)
+        shardSizes[i] += max(1, getSize(filePath))
+    return shards
+
+
+class FileTailer:
+    '''Reads the lines appended to a log file the way LogStats does: it starts at the end of the file, finishes reading the old
+    file when the log is rotated, and starts over when it is truncated. The file does not need to exist yet.'''
+
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self.lineReader = LineReader()
+        self.logHandle = None
+        self.logInode = None
+        if self.openLogFile():
+            self.logHandle.seek(0, 2)
+
+
+    def close(self):
+        if self.logHandle is not None:
+            self.logHandle.close()
+            self.logHandle = None
+
+
+    def openLogFile(self):
+        '''Opens the log file (see "LogStats.openLogFile()"). Returns False if it does not exist.'''
+
+        try:
+            self.logHandle = open(self.filePath, 'rb', buffering = 0)
+        except FileNotFoundError:
+            return False
+        self.logInode = os.fstat(self.logHandle.fileno()).st_ino
+        return True
+
+
+    def readLines(self, processLines, maxBytes = -1):
+        '''Calls "processLines()" with the complete lines appended to the log file since the last call, a list at a time as returned
+        by "LineReader.readLines()", switching to a new log file if it was rotated. If "maxBytes" is positive, only about that many
+        bytes of lines are read, and True is returned if there may be more left.'''
+
+        try:
+            stat = os.stat(self.filePath)
+        except FileNotFoundError:
+            # The log file was moved away and the new one has not been created yet. Keep reading the old one (if any).
+            stat = None
+
+        if self.logHandle is None:
+            # A log file created after we started is read from the start.
+            if stat is None or not self.openLogFile():
+                return False
+        elif stat is not None and stat.st_ino != self.logInode:
+            self.readFileLines(processLines, final = True)
+            self.close()
+            if not self.openLogFile():
+                return False
+        elif stat is not None and stat.st_size < self.logHandle.tell():
+            self.logHandle.seek(0)
+        return self.readFileLines(processLines, maxBytes)
+
+
+    def readFileLines(self, processLines, maxBytes = -1, final = False):
+        '''Reads the lines of the open log file like "LogStats.processFileLines()" does. Returns True if "maxBytes" was reached.'''
+
+        startOffset = self.logHandle.tell()
+        while True:
+            offset = self.logHandle.tell()
+            if maxBytes > 0 and offset - startOffset >= maxBytes:
+                return True
+            lines = self.lineReader.readLines(self.logHandle, -1 if maxBytes <= 0 else maxBytes - (offset - startOffset), final)
+            if self.logHandle.tell() == offset:
+                return False
+            processLines(lines)
+
+
+class ShardWorker:
+    '''Tails a shard of the log files and keeps the statistics of the lines parsed since the last delta was sent, in a StatsBatch
+    per file. Runs in a worker process (see "runWorker()").'''
+
+    def __init__(self, config, filePaths):
+        self.config = config
+        self.logParser = LogParser(self.config.useFastParser)
+        self.filePath2tailer = {filePath: FileTailer(filePath) for filePath in filePaths}
+        self.filePath2delta = {}  # The statistics of each file with lines parsed since the last delta.
+
+
+    def close(self):
+        for tailer in self.filePath2tailer.values():
+            tailer.close()
+
+
+    def consumeFile(self, filePath, maxBytes = -1):
+        '''Parses the new lines of the passed file into its delta. Returns True if "maxBytes" was reached (see "FileTailer.readLines()").'''
+
+        return self.filePath2tailer[filePath].readLines(lambda lines: self.processLines(filePath, lines), maxBytes)
+
+
+    def processLines(self, filePath, lines):
+        batch = LogStats.parseLogLines(lines, self.logParser, clientSketchPrecision = self.config.clientSketchPrecision)
+        if self.config.useCurrTimestamps:
+            # The lines read together arrived together, and sharing a timestamp keeps their events compact.
+            batch.tss = [time.time()] * len(batch.tss)
+        delta = self.filePath2delta.get(filePath)
+        if delta is None:
+            self.filePath2delta[filePath] = batch
+        else:
+            delta.merge(batch)
+
+
+    def popDeltas(self):
+        '''Returns the deltas of the files with new lines, as a list of tuples (filePath, batch, eventCounts), and starts new ones.
+        The timestamps, status codes and sections of the requests (the alert events) are taken out of each batch and compacted into
+        "eventCounts" (see "StatsBatch.popEventCounts()"). Every section keeps its count, even with the "spacesaving" section
+        tracker: a section with too few hits to make the top of any delta may still have the most hits overall, and only the
+        coordinator can tell.'''
+
+        deltas = []
+        for filePath, batch in self.filePath2delta.items():
+            batch.addedClients.clear()
+            deltas.append((filePath, batch, batch.popEventCounts(withSections = self.config.sectionAlertHits is not None)))
+        self.filePath2delta = {}
+        return deltas
+
+
+    async def tailFiles(self, watcher):
+        '''Parses the lines appended to the files, at first and whenever the passed FileWatcher tells us they changed. Files with
+        many new lines take turns, "AsyncRuntime.READ_SIZE_BYTES" at a time, so that they do not delay each other or the deltas.'''
+
+        filePaths = set(self.filePath2tailer)
+        while True:
+            while len(filePaths) > 0:
+                filePaths = {filePath for filePath in filePaths if self.consumeFile(filePath, AsyncRuntime.READ_SIZE_BYTES)}
+                await asyncio.sleep(0)
+            filePaths = await watcher.wait()
+
+
+    async def run(self, deltaQueue, usePolling = False):
+        '''Tails the files and puts their deltas into "deltaQueue" every DELTA_INTERVAL_SECS seconds (if there are any). Runs until
+        cancelled.'''
+
+        def sendDeltas():
+            deltas = self.popDeltas()
+            if len(deltas) > 0:
+                deltaQueue.put(deltas)
+
+        watcher = FileWatcher(self.filePath2tailer, usePolling)
+        watcher.start()
+        # Tell the coordinator that lines appended from now on will be counted.
+        deltaQueue.put([])
+        loop = asyncio.get_event_loop()
+        tasks = [loop.create_task(self.tailFiles(watcher)), loop.create_task(AsyncRuntime.runPeriodically(sendDeltas, DELTA_INTERVAL_SECS))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions = True)
+            watcher.close()
+
+
+def runWorker(config, filePaths, deltaQueue, usePolling = False):
+    '''The main function of a worker process: runs a ShardWorker for the passed files on a new event loop until the process is
+    terminated by the coordinator.'''
+
+    # Ctrl+C reaches the whole process group, but it is up to the coordinator to stop us.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = ShardWorker(config, filePaths)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(worker.run(deltaQueue, usePolling))
+
+
+class Coordinator:
+    '''Tails many log files (e.g. one per virtual host) with a pool of worker processes, each parsing a shard of the files, so that
+    parsing is not limited to a single core by the GIL. The workers send compact deltas, which the coordinator merges into the
+    global statistics (a LogStats object without a log file of its own, which also runs the alerters) and into the statistics of
+    every file. Merging a delta is far cheaper than parsing its lines, so throughput grows with the number of workers.'''
+
+    def __init__(self, config, filePaths, numWorkers, usePolling = False):
+        '''"config.logFilePath" is ignored. The worker processes are started right away, and have started tailing their files when
+        this returns.'''
+
+        self.config = config
+        self.filePath2stats = {filePath: StatsBatch(self.config.clientSketchPrecision) for filePath in filePaths}
+        # With the "spacesaving" section tracker, the sections of every file are counted by a SpaceSaving of their own instead of
+        # in its StatsBatch, which only keeps the sketches of the sections tracked, so that memory does not grow with the number
+        # of distinct sections.
+        self.filePath2sectionTracker = None
+        if self.config.sectionTracker == 'spacesaving':
+            self.filePath2sectionTracker = {filePath: SpaceSaving(self.config.sectionTrackerCapacity) for filePath in filePaths}
+
+        # The workers are spawned rather than forked, since this process may already be running threads (e.g. alerters).
+        context = multiprocessing.get_context('spawn')
+        self.deltaQueue = context.Queue()
+        self.workers = [context.Process(target = runWorker, args = (self.config, shard, self.deltaQueue, usePolling), daemon = True)
+                        for shard in assignShards(filePaths, numWorkers)]
+        for worker in self.workers:
+            worker.start()
+        numStarted, timeoutSecs = 0, time.time() + WORKER_START_TIMEOUT_SECS
+        while numStarted < len(self.workers):
+            try:
+                self.deltaQueue.get(timeout = 1)
+                numStarted += 1
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers) or time.time() > timeoutSecs:
+                    self.close()
+                    raise RuntimeError('The worker processes failed to start.')
+
+        # The alerters are run by this process, on threads (or in a manager process), whatever the runtime of the workers.
+        self.stats = LogStats(self.config._replace(logFilePath = None, runtime = 'watchdog'))
+
+
+    def close(self):
+        '''Terminates the worker processes.'''
+
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+
+
+    def mergeDeltas(self, untilSecs):
+        '''Merges the deltas sent by the workers until "time.time()" reaches "untilSecs". Raises RuntimeError if a worker exited.'''
+
+        while True:
+            timeoutSecs = untilSecs - time.time()
+            if timeoutSecs <= 0:
+                break
+            try:
+                deltas = self.deltaQueue.get(timeout = timeoutSecs)
+            except queue.Empty:
+                break
+            self.mergeDeltaList(deltas)
+
+        if not all(worker.is_alive() for worker in self.workers):
+            raise RuntimeError('A worker process exited unexpectedly.')
+
+
+    def mergeDeltaList(self, deltas):
+        '''Merges the passed list of deltas, as returned by "ShardWorker.popDeltas()".'''
+
+        for filePath, batch, eventCounts in deltas:
+            fileStats = self.filePath2stats[filePath]
+            fileStats.merge(batch, mergeTss = False)
+            if self.filePath2sectionTracker is not None:
+                sectionTracker = self.filePath2sectionTracker[filePath]
+                for section, count in fileStats.section2count.items():
+                    sectionTracker.addObj(section, count)
+                fileStats.section2count.clear()
+                # Like "LogStats.pruneSectionSketches()", once there are twice as many sketches as tracked sections.
+                if max(len(fileStats.section2clients), len(fileStats.section2responseBytes)) > 2 * sectionTracker.getNumObjs():
+                    fileStats.pruneSectionSketches(sectionTracker.getObjs())
+            batch.addEventCounts(eventCounts)
+            self.stats.mergeBatch(batch)
+            if self.stats.metrics is not None:
+                self.stats.metrics.counter('lines_read_total', 'Number of log lines read.').inc(batch.numHits + batch.numBadLines)
+                self.stats.metrics.counter('deltas_merged_total', 'Number of deltas merged from the worker processes.').inc()
+
+
+    def getFilesStr(self):
+        '''Returns a formatted string showing the statistics of every log file.'''
+
+        ret = ''
+        for filePath, stats in sorted(self.filePath2stats.items()):
+            section2count = None
+            if self.filePath2sectionTracker is not None:
+                section2count = self.filePath2sectionTracker[filePath].getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)
+            ret += LogStats.getFileStr(filePath, stats, section2count)
+        return ret
@@ -0,0 +1,178 @@
+import os, shutil, tempfile, time, unittest
+
+from LogParser import LogParser
+from LogStats import Config, LogStats
+from Sharding import Coordinator, FileTailer, assignShards, expandFilePaths
+
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirPath = tempfile.mkdtemp()
+        self.logFilePaths = [os.path.join(self.dirPath, 'site%d.log' % i) for i in range(3)]
+        for logFilePath in self.logFilePaths:
+            open(logFilePath, 'w').close()
+        with open('source.log') as f:
+            self.lines = f.readlines()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.dirPath)
+
+
+    def appendLines(self, lines, filePath):
+        with open(filePath, 'a') as f:
+            f.writelines(lines)
+
+
+    def testExpandFilePaths(self):
+        missingPath = os.path.join(self.dirPath, 'missing.log')
+        self.assertEqual(sorted(self.logFilePaths + [missingPath]),
+                         expandFilePaths([os.path.join(self.dirPath, 'site*.log'), missingPath, self.logFilePaths[0]]))
+        self.assertEqual([], expandFilePaths([os.path.join(self.dirPath, '*.gz')]))
+
+
+    def testAssignShards(self):
+        self.appendLines(self.lines, self.logFilePaths[1])
+        self.appendLines(self.lines[: 10], self.logFilePaths[2])
+        # The largest file gets a shard of its own.
+        self.assertEqual([[self.logFilePaths[1]], [self.logFilePaths[2], self.logFilePaths[0]]], assignShards(self.logFilePaths, 2))
+        self.assertEqual(3, len(assignShards(self.logFilePaths, 8)))
+        self.assertEqual([sorted(self.logFilePaths)], [sorted(shard) for shard in assignShards(self.logFilePaths, 1)])
+
+
+    def testFileTailer(self):
+        logFilePath = self.logFilePaths[0]
+        self.appendLines(self.lines[: 5], logFilePath)
+        tailer, readLines = FileTailer(logFilePath), []
+        read = lambda maxBytes = -1: tailer.readLines(lambda lines: readLines.extend(bytes(line).decode() for line in lines), maxBytes)
+
+        # Lines already in the file are skipped, and a partial line is left for later.
+        self.appendLines(self.lines[5 : 10] + ['partial'], logFilePath)
+        self.assertFalse(read())
+        self.assertEqual([line.strip() for line in self.lines[5 : 10]], readLines)
+
+        # Lines appended to the old file before the rotation are read first, then the new file from its start.
+        del readLines[:]
+        self.appendLines([' line\n'], logFilePath)
+        os.rename(logFilePath, logFilePath + '.1')
+        self.appendLines(self.lines[10 : 12], logFilePath)
+        self.assertFalse(read())
+        self.assertEqual(['partial line'] + [line.strip() for line in self.lines[10 : 12]], readLines)
+
+        # A budget is honored, and truncation starts over.
+        del readLines[:]
+        self.appendLines(self.lines[12 : 20], logFilePath)
+        self.assertTrue(read(len(self.lines[12])))
+        self.assertEqual(1, len(readLines))
+        open(logFilePath, 'w').close()
+        self.appendLines(self.lines[: 1], logFilePath)
+        self.assertFalse(read())
+        self.assertEqual(self.lines[0].strip(), readLines[-1])
+        tailer.close()
+
+
+    def testEventCounts(self):
+        batch = LogStats.parseLogLines(self.lines, LogParser())
+        tss, statuses, sections = batch.tss, batch.statuses, batch.sections
+        eventCounts = batch.popEventCounts()
+        self.assertLess(len(eventCounts), len(tss))
+        self.assertEqual([], batch.tss)
+        batch.addEventCounts(eventCounts)
+        # Requests are only moved next to earlier ones with the same timestamp, so timestamps stay in order.
+        self.assertEqual(tss, batch.tss)
+        self.assertEqual(sorted(zip(tss, statuses, sections)), sorted(zip(batch.tss, batch.statuses, batch.sections)))
+
+
+    def testCoordinatorMatchesSingleProcess(self):
+        config = Config(logFilePath = None, numHitsToGenAlert = 10, alertWinLenSecs = 60, useCurrTimestamps = True, alerterBackend = 'thread',
+                        sectionAlertHits = 5)
+        coordinator = Coordinator(config, self.logFilePaths, 2, usePolling = True)
+        try:
+            self.assertEqual(2, len(coordinator.workers))
+            for logFilePath in self.logFilePaths[: 2]:
+                self.appendLines(self.lines + ['this is not a log line\n'], logFilePath)
+            untilSecs = time.time() + 10
+            while coordinator.stats.numHits < 2 * len(self.lines) and time.time() < untilSecs:
+                coordinator.mergeDeltas(time.time() + 0.1)
+
+            expected = LogStats.parseLogLines(self.lines + ['this is not a log line\n'], LogParser())
+            stats = coordinator.stats.getStatsBatch()
+            self.assertEqual(2 * expected.numHits, stats.numHits)
+            self.assertEqual(2, stats.numBadLines)
+            self.assertEqual({section: 2 * count for section, count in expected.section2count.items()}, dict(stats.section2count))
+            self.assertEqual(expected.clients.getCount(), stats.clients.getCount())
+            self.assertEqual(2 * (len(self.lines) + 1), coordinator.stats.metrics.counter('lines_read_total', '').value)
+
+            # Every file is reported on its own.
+            for logFilePath in self.logFilePaths[: 2]:
+                self.assertEqual(expected.numHits, coordinator.filePath2stats[logFilePath].numHits)
+                self.assertEqual(dict(expected.section2count), dict(coordinator.filePath2stats[logFilePath].section2count))
+            self.assertEqual(0, coordinator.filePath2stats[self.logFilePaths[2]].numHits)
+            self.assertIn(LogStats.getFileStr(self.logFilePaths[2], coordinator.filePath2stats[self.logFilePaths[2]]), coordinator.getFilesStr())
+
+            # The alerts are generated from the events of all files.
+            coordinator.stats.sectionAlerter.genAlert(time.time())
+            report = str(coordinator.stats)
+            self.assertIn('High traffic of section /css generated an alert - hits >= 5', report)
+        finally:
+            coordinator.close()
+        self.assertFalse(any(worker.is_alive() for worker in coordinator.workers))
+
+
+    def appendAndMerge(self, coordinator, lines, filePath):
+        '''Appends the passed lines to the passed file and merges deltas until the coordinator has counted them.'''
+
+        numHits = coordinator.stats.numHits + len(lines)
+        self.appendLines(lines, filePath)
+        untilSecs = time.time() + 10
+        while coordinator.stats.numHits < numHits and time.time() < untilSecs:
+            coordinator.mergeDeltas(time.time() + 0.1)
+        self.assertEqual(numHits, coordinator.stats.numHits)
+
+
+    def testCoordinatorFindsSectionsBelowTheTopOfEveryShard(self):
+        config = Config(logFilePath = None, numHitsToGenAlert = 10, alertWinLenSecs = 60, useCurrTimestamps = True, alerterBackend = 'thread',
+                        sectionTracker = 'spacesaving', sectionTrackerCapacity = 2)
+        coordinator = Coordinator(config, self.logFilePaths, 3, usePolling = True)
+        try:
+            # "/top" is third in every file, behind two sections of its own, but has the most hits overall.
+            for i, logFilePath in enumerate(self.logFilePaths):
+                self.appendAndMerge(coordinator, ['10.0.0.1 - - [21/Apr/2018:01:50:25 -0400] "GET %s/x HTTP/1.1" 200 1\n' % section
+                                                  for section, count in (('/a%d' % i, 10), ('/b%d' % i, 10), ('/top', 9)) for _ in range(count)],
+                                    logFilePath)
+
+            tracker = coordinator.stats.sectionTracker
+            self.assertEqual(['/top'], list(tracker.getMaxObjs(1)))
+            # Its count is overestimated by at most its error, like any count of a SpaceSaving.
+            self.assertLessEqual(tracker.getMaxObjs(1)['/top'] - tracker.getError('/top'), 27)
+            self.assertGreaterEqual(tracker.getMaxObjs(1)['/top'], 27)
+            self.assertIn('/top', coordinator.getFilesStr())
+        finally:
+            coordinator.close()
+
+
+    def testCoordinatorBoundsFileSections(self):
+        config = Config(logFilePath = None, numHitsToGenAlert = 10, alertWinLenSecs = 60, useCurrTimestamps = True, alerterBackend = 'thread',
+                        sectionTracker = 'spacesaving', sectionTrackerCapacity = 2)
+        coordinator = Coordinator(config, self.logFilePaths[: 1], 1, usePolling = True)
+        try:
+            # Every delta has different sections, so that the file's statistics would keep all of them if they were not bounded.
+            for i in range(5):
+                self.appendAndMerge(coordinator, [line.replace('GET /', 'GET /delta%d' % i) for line in self.lines], self.logFilePaths[0])
+
+            fileStats = coordinator.filePath2stats[self.logFilePaths[0]]
+            self.assertEqual(5 * len(self.lines), fileStats.numHits)
+            self.assertEqual(0, len(fileStats.section2count))
+            self.assertEqual(2, coordinator.filePath2sectionTracker[self.logFilePaths[0]].getNumObjs())
+            self.assertLessEqual(len(fileStats.section2clients), 4)
+            self.assertLessEqual(len(fileStats.section2responseBytes), 4)
+            self.assertIn(LogStats.getFileStr(self.logFilePaths[0], fileStats, coordinator.filePath2sectionTracker[self.logFilePaths[0]]
+                                              .getMaxObjs(LogStats.NUM_HIGHEST_TRAFFIC_SECTIONS_TO_SHOW)),
+                          coordinator.getFilesStr())
+        finally:
+            coordinator.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
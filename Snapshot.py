@@ -0,0 +1,68 @@
+import heapq
+from collections import namedtuple
+
+from RollingStats import RollingStats
+
+
+# A copy of the statistics of a LogStats object at one point (see "LogStats.getSnapshot()"), which can be formatted and served
+# without holding the lock of the LogStats object. It is never modified once taken:
+#   - "generation" is the number of times the statistics had changed, and "bucketId" the ID of the rolling bucket being filled
+#     (the snapshot of the same generation and bucket is reused);
+#   - the counters are copies, and "section2count" only holds the sections with the most hits, keyed by name;
+#   - the sketches (HyperLogLog for clients, DDSketch for response bytes) are copies, and only those of these sections are kept;
+#   - "rollingBuckets" holds the complete buckets of the longest rolling window and a copy of the current one, as returned by
+#     "RollingStats.getBuckets()".
+Snapshot = namedtuple('Snapshot', ('generation', 'bucketId', 'tsSecs', 'numHits', 'numBadLines', 'responseBytesTot', 'numSections',
+                                   'section2count', 'retCode2count', 'method2count', 'clients', 'section2clients', 'responseBytes',
+                                   'section2responseBytes', 'rollingBuckets', 'rollingBucketSecs', 'rollingNumBuckets',
+                                   'clientSketchPrecision'))
+
+
+def getWindows(snapshot):
+    '''Returns a list of tuples (windowSecs, window) of the rolling windows shown in reports, i.e. the last complete bucket and the
+    longest window we keep, each with the current bucket up to the snapshot, where "window" is a StatsBatch of the statistics of
+    the last "windowSecs" seconds.'''
+
+    windows = []
+    for numBuckets in sorted({1, snapshot.rollingNumBuckets}):
+        buckets = [(bucketId, bucket) for bucketId, bucket in snapshot.rollingBuckets if bucketId >= snapshot.bucketId - numBuckets]
+        windows.append((RollingStats.getCoveredSecs(numBuckets, snapshot.rollingBucketSecs, snapshot.tsSecs),
+                        RollingStats.mergeBuckets(buckets, snapshot.clientSketchPrecision)))
+    return windows
+
+
+def getQuantilesDict(sketch):
+    '''Returns a JSON-serializable dict of the p50, p90, p99 and maximum of the values in the passed DDSketch (None if it is empty).'''
+
+    if sketch.count == 0:
+        return None
+    return {'p50': sketch.getQuantile(0.5), 'p90': sketch.getQuantile(0.9), 'p99': sketch.getQuantile(0.99), 'max': sketch.max}
+
+
+def toDict(snapshot, numSections):
+    '''Returns a JSON-serializable dict holding the statistics in the passed snapshot, as served at "/stats", with the "numSections"
+    sections with the most hits of every rolling window.'''
+
+    sections = sorted(snapshot.section2count, key = lambda section: snapshot.section2count[section], reverse = True)
+    return {
+        'generation': snapshot.generation,
+        'tsSecs': snapshot.tsSecs,
+        'numHits': snapshot.numHits,
+        'numBadLines': snapshot.numBadLines,
+        'responseBytesTot': snapshot.responseBytesTot,
+        'responseBytes': getQuantilesDict(snapshot.responseBytes),
+        'numSections': snapshot.numSections,
+        'numClients': snapshot.clients.getCount(),
+        'retCode2count': snapshot.retCode2count,
+        'method2count': snapshot.method2count,
+        'topSections': [{'section': section, 'numHits': snapshot.section2count[section],
+                         'numClients': snapshot.section2clients[section].getCount() if section in snapshot.section2clients else 0,
+                         'responseBytes': getQuantilesDict(snapshot.section2responseBytes[section])
+                                          if section in snapshot.section2responseBytes else None}
+                        for section in sections],
+        'windows': [{'windowSecs': windowSecs, 'numHits': window.numHits, 'numClients': window.clients.getCount(),
+                     'responseBytesTot': window.responseBytesTot,
+                     'section2count': dict(heapq.nlargest(numSections, window.section2count.items(), key = lambda t: t[1])),
+                     'retCode2count': dict(window.retCode2count)}
+                    for windowSecs, window in getWindows(snapshot)],
+    }
@@ -0,0 +1,140 @@
+class Bucket:
+    '''A node of the doubly linked list of buckets kept by SpaceSaving. All objects in a bucket have the same count.'''
+
+    __slots__ = ('count', 'objs', 'prev', 'next')
+
+    def __init__(self, count):
+        self.count = count
+        self.objs = {}  # Used as an insertion-ordered set.
+        self.prev = self.next = None
+
+
+class SpaceSaving:
+    '''Tracks the objects with the highest counts using at most "capacity" counters (the Space-Saving algorithm of Metwally et al.,
+    implemented with the Stream-Summary data structure). Unlike Heap, the memory used does not grow with the number of distinct objects.
+
+    When a new object arrives and all counters are in use, the object with the smallest count is evicted and the new object inherits
+    its count, which is remembered as the new object's error. Therefore, if N is the sum of all counts added so far:
+      - every reported count overestimates the true count by at most its error, and the error is at most N / capacity;
+      - every object whose true count exceeds N / capacity is guaranteed to be tracked.
+    As long as the number of distinct objects does not exceed "capacity", all counts are exact.'''
+
+    def __init__(self, capacity):
+        assert capacity > 0
+        self.capacity = capacity
+        self.obj2entry = {}  # Maps each tracked object to a list [bucket, error].
+        # The buckets form a doubly linked list ordered by count. "self.head" has the smallest count, "self.tail" the largest.
+        self.head = self.tail = None
+
+
+    def getNumObjs(self):
+        '''Returns the number of tracked objects, which is the number of distinct objects seen so far, but at most "capacity".'''
+
+        return len(self.obj2entry)
+
+
+    def getError(self, obj):
+        '''Returns the maximum amount by which the count of the passed tracked object may be overestimated.'''
+
+        return self.obj2entry[obj][1]
+
+
+    def addObj(self, obj, count = 1):
+        '''Adds the passed hashable object, or if it is already tracked, increments its count by "count". Incrementing by 1 takes
+        O(1) time. Larger increments take time proportional to the number of distinct counts they skip over.'''
+
+        entry = self.obj2entry.get(obj)
+        if entry is not None:
+            bucket = entry[0]
+            entry[0] = self.moveObj(obj, bucket, bucket.count + count)
+        elif len(self.obj2entry) < self.capacity:
+            self.obj2entry[obj] = [self.insertObj(obj, count), 0]
+        else:
+            # Evict an object with the smallest count and let the new object take over its counter.
+            minBucket = self.head
+            evictedObj = next(iter(minBucket.objs))
+            del self.obj2entry[evictedObj]
+            del minBucket.objs[evictedObj]
+            minBucket.objs[obj] = None
+            self.obj2entry[obj] = [self.moveObj(obj, minBucket, minBucket.count + count), minBucket.count]
+
+
+    def getObjs(self):
+        '''Returns a dict of all tracked objects and their counts.'''
+
+        return {obj: entry[0].count for obj, entry in self.obj2entry.items()}
+
+
+    def getMaxObjs(self, numObjs):
+        '''Returns a dict of "numObjs" objects with the highest counts (or fewer if fewer objects are tracked). Unlike
+        "Heap.getMaxObjs()", this does not modify the data structure and takes O(numObjs) time.'''
+
+        dct = {}
+        bucket = self.tail
+        while bucket is not None and len(dct) < numObjs:
+            for obj in bucket.objs:
+                dct[obj] = bucket.count
+                if len(dct) == numObjs:
+                    break
+            bucket = bucket.prev
+        return dct
+
+
+    def insertObj(self, obj, count):
+        '''Inserts an untracked object with the passed count into the bucket list and returns its bucket.'''
+
+        # Find the last bucket with a count not exceeding "count", starting from the smallest one.
+        prev, bucket = None, self.head
+        while bucket is not None and bucket.count <= count:
+            prev, bucket = bucket, bucket.next
+        return self.addToBucket(obj, count, prev)
+
+
+    def moveObj(self, obj, bucket, count):
+        '''Moves a tracked object from "bucket" to the bucket with the passed (larger) count and returns the latter.'''
+
+        # Find the last bucket with a count not exceeding "count", starting from the current one.
+        prev = bucket
+        while prev.next is not None and prev.next.count <= count:
+            prev = prev.next
+        newBucket = self.addToBucket(obj, count, prev)
+
+        del bucket.objs[obj]
+        if len(bucket.objs) == 0:
+            self.unlinkBucket(bucket)
+        return newBucket
+
+
+    def addToBucket(self, obj, count, prev):
+        '''Adds the object to the bucket with the passed count, which is either "prev" or a new bucket linked right after "prev"
+        ("prev" is None if the new bucket becomes the head). Returns the bucket.'''
+
+        if prev is not None and prev.count == count:
+            bucket = prev
+        else:
+            bucket = Bucket(count)
+            bucket.prev = prev
+            bucket.next = self.head if prev is None else prev.next
+            if bucket.prev is None:
+                self.head = bucket
+            else:
+                bucket.prev.next = bucket
+            if bucket.next is None:
+                self.tail = bucket
+            else:
+                bucket.next.prev = bucket
+        bucket.objs[obj] = None
+        return bucket
+
+
+    def unlinkBucket(self, bucket):
+        '''Removes the passed (empty) bucket from the bucket list.'''
+
+        if bucket.prev is None:
+            self.head = bucket.next
+        else:
+            bucket.prev.next = bucket.next
+        if bucket.next is None:
+            self.tail = bucket.prev
+        else:
+            bucket.next.prev = bucket.prev
@@ -0,0 +1,87 @@
+import random, unittest
+from collections import Counter
+
+from ClfParser import ClfParser
+from Heap import Heap
+from LogStats import LogStats
+from SpaceSaving import SpaceSaving
+
+
+class SpaceSavingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The sections of all requests in "source.log", in order.
+        parser = ClfParser()
+        with open('source.log') as f:
+            cls.sections = [LogStats.getSection(parser.parse(line.strip()).urlPath) for line in f]
+        cls.sections = [section for section in cls.sections if section is not None]
+
+
+    def setUp(self):
+        pass
+
+
+    def tearDown(self):
+        pass
+
+
+    def testEmpty(self):
+        spaceSaving = SpaceSaving(3)
+        self.assertEqual(0, spaceSaving.getNumObjs())
+        self.assertEqual({}, spaceSaving.getMaxObjs(3))
+
+
+    def testEviction(self):
+        spaceSaving = SpaceSaving(2)
+        for obj in 'aab':
+            spaceSaving.addObj(obj)
+        spaceSaving.addObj('c')  # Evicts "b" and inherits its count of 1.
+        self.assertEqual({'a': 2, 'c': 2}, spaceSaving.getMaxObjs(3))
+        self.assertEqual(1, spaceSaving.getError('c'))
+        self.assertEqual(0, spaceSaving.getError('a'))
+        spaceSaving.addObj('a', 5)
+        self.assertEqual({'a': 7}, spaceSaving.getMaxObjs(1))
+
+
+    def testExactWhenCapacitySuffices(self):
+        heap, spaceSaving = Heap(), SpaceSaving(1000)
+        for section in self.sections:
+            heap.addObj(section)
+            spaceSaving.addObj(section)
+        self.assertEqual(heap.getNumObjs(), spaceSaving.getNumObjs())
+        self.assertEqual(heap.getMaxObjs(heap.getNumObjs()), spaceSaving.getMaxObjs(spaceSaving.getNumObjs()))
+        self.assertTrue(all(spaceSaving.getError(section) == 0 for section in spaceSaving.obj2entry))
+
+
+    def testTopSectionsWithSmallCapacity(self):
+        heap, spaceSaving = Heap(), SpaceSaving(20)
+        for section in self.sections:
+            heap.addObj(section)
+            spaceSaving.addObj(section)
+        self.assertEqual(20, spaceSaving.getNumObjs())
+        self.assertEqual(heap.getMaxObjs(3), spaceSaving.getMaxObjs(3))
+
+
+    def testErrorBounds(self):
+        rnd = random.Random(0)
+        capacity, counter, spaceSaving = 50, Counter(), SpaceSaving(50)
+        for i in range(20000):
+            # A skewed distribution over many more objects than the capacity.
+            obj, count = int(rnd.paretovariate(1)), rnd.randint(1, 2)
+            counter[obj] += count
+            spaceSaving.addObj(obj, count)
+
+        maxError = sum(counter.values()) / capacity
+        for obj, count in spaceSaving.getMaxObjs(capacity).items():
+            error = spaceSaving.getError(obj)
+            self.assertLessEqual(error, maxError)
+            self.assertLessEqual(count - error, counter[obj])
+            self.assertLessEqual(counter[obj], count)
+        for obj, count in counter.items():
+            if count > maxError:
+                self.assertIn(obj, spaceSaving.obj2entry)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+from collections import Counter, defaultdict
+
+from DDSketch import DDSketch
+from HyperLogLog import HyperLogLog
+
+
+class StatsBatch:
+    '''A local accumulator of statistics for a batch of log lines. It is filled without any locking and then merged into the shared
+    statistics in one go, which is far cheaper than updating the shared statistics (and the alerter) once per line.'''
+
+    # The number of recently added (client, section) pairs remembered, after which they are forgotten at once.
+    MAX_ADDED_CLIENTS = 1024
+
+
+    def __init__(self, clientSketchPrecision = HyperLogLog.DEFAULT_PRECISION):
+        self.clientSketchPrecision = clientSketchPrecision
+        self.numHits = 0  # Number of requests in the batch.
+        self.numBadLines = 0  # Number of log lines in the batch that could not be parsed.
+        self.responseBytesTot = 0  # Total response bytes sent.
+        self.section2count = defaultdict(int)  # Count for each section.
+        self.retCode2count = defaultdict(int)  # Count for each status code.
+        self.method2count = defaultdict(int)  # Count for each request method.
+        self.clients = HyperLogLog(clientSketchPrecision)  # Sketch of the distinct clients.
+        self.section2clients = {}  # Sketch of the distinct clients of each section.
+        self.responseBytes = DDSketch()  # Sketch of the response sizes (for quantiles).
+        self.section2responseBytes = {}  # Sketch of the response sizes of each section.
+        self.addedClients = set()  # Recently added (client, section) pairs. Adding them to the sketches again would change nothing.
+        self.tss = []  # Timestamps (in seconds) of the requests in the order they were added, to be passed on to the alerter.
+        self.statuses = []  # Status codes of the requests with timestamps, in the same order.
+        self.sections = []  # Sections (or None) of the requests with timestamps, in the same order.
+
+
+    def addRecord(self, record, section, tsSecs = None):
+        '''Adds a parsed log line. "section" may be None if the line has no URL path. "tsSecs" is the timestamp to be passed on
+        to the alerter, which is not necessarily the logged one. If it is None, no timestamp is kept.'''
+
+        self.numHits += 1
+        if section is not None:
+            self.section2count[section] += 1
+        self.retCode2count[record.status] += 1
+        if record.method is not None:  # Method will be missing if the log line has no request line.
+            self.method2count[record.method] += 1
+        if record.responseBytes is not None:  # The log shows '-' instead of 0 when no bytes are sent.
+            self.responseBytesTot += record.responseBytes
+            StatsBatch.addResponseBytes(record.responseBytes, section, self.responseBytes, self.section2responseBytes)
+        if record.remoteHost is not None and (record.remoteHost, section) not in self.addedClients:
+            # Clients tend to make many requests in a row, so this saves most of the hashing and sketch updates.
+            if len(self.addedClients) >= StatsBatch.MAX_ADDED_CLIENTS:
+                self.addedClients.clear()
+            self.addedClients.add((record.remoteHost, section))
+            clientHash = HyperLogLog.hash(record.remoteHost)
+            self.clients.addHash(clientHash)
+            if section is not None:
+                sketch = self.section2clients.get(section)
+                if sketch is None:
+                    sketch = self.section2clients[section] = HyperLogLog(self.clientSketchPrecision)
+                sketch.addHash(clientHash)
+        if tsSecs is not None:
+            self.tss.append(tsSecs)
+            self.statuses.append(record.status)
+            self.sections.append(section)
+
+
+    @staticmethod
+    def addResponseBytes(responseBytes, section, sketch, section2sketch):
+        '''Adds the passed response size to the passed DDSketch and, unless "section" is None, to the section's sketch in
+        "section2sketch" (which is created if needed).'''
+
+        idx = sketch.getIndex(responseBytes) if responseBytes > 0 else None
+        sketch.addIndex(idx, responseBytes)
+        if section is not None:
+            sectionSketch = section2sketch.get(section)
+            if sectionSketch is None:
+                sectionSketch = section2sketch[section] = DDSketch()
+            sectionSketch.addIndex(idx, responseBytes)
+
+
+    def merge(self, other, mergeTss = True):
+        '''Adds the statistics of the "other" batch to this one. Unless "mergeTss" is False, the timestamps (and status codes and
+        sections) of "other" are appended after ours.'''
+
+        self.numHits += other.numHits
+        self.numBadLines += other.numBadLines
+        self.responseBytesTot += other.responseBytesTot
+        for val2count, otherVal2count in ((self.section2count, other.section2count), (self.retCode2count, other.retCode2count),
+                                          (self.method2count, other.method2count)):
+            for val, count in otherVal2count.items():
+                val2count[val] += count
+        self.clients.merge(other.clients)
+        StatsBatch.mergeSketches(self.section2clients, other.section2clients)
+        self.responseBytes.merge(other.responseBytes)
+        StatsBatch.mergeSketches(self.section2responseBytes, other.section2responseBytes)
+        if mergeTss:
+            self.tss.extend(other.tss)
+            self.statuses.extend(other.statuses)
+            self.sections.extend(other.sections)
+
+
+    def pruneSectionSketches(self, sections):
+        '''Drops the sketches of the sections not in "sections" (e.g. the sections tracked by a SpaceSaving counting them instead).'''
+
+        self.section2clients = {section: sketch for section, sketch in self.section2clients.items() if section in sections}
+        self.section2responseBytes = {section: sketch for section, sketch in self.section2responseBytes.items() if section in sections}
+
+
+    def popEventCounts(self, withSections = True):
+        '''Removes the timestamps, status codes and sections (or only the first two, if "withSections" is False) from this batch and
+        returns them as a list of tuples (tsSecs, status, section, count). Requests with the same three are counted together, at the
+        position of the first one. Log timestamps only have a resolution of one second, so the list is usually far shorter than the
+        timestamps (e.g. when sending the batch to another process).'''
+
+        sections = self.sections if withSections else [None] * len(self.tss)
+        eventCounts = [event + (count,) for event, count in Counter(zip(self.tss, self.statuses, sections)).items()]
+        self.tss, self.statuses, self.sections = [], [], []
+        return eventCounts
+
+
+    def addEventCounts(self, eventCounts):
+        '''Appends the timestamps, status codes and sections in the passed list, as returned by "popEventCounts()".'''
+
+        for tsSecs, status, section, count in eventCounts:
+            self.tss.extend([tsSecs] * count)
+            self.statuses.extend([status] * count)
+            self.sections.extend([section] * count)
+
+
+    @staticmethod
+    def mergeSketches(key2sketch, otherKey2sketch):
+        '''Merges each sketch in the "otherKey2sketch" dict into the sketch with the same key in "key2sketch". Sketches missing
+        from "key2sketch" are copied, so that the two dicts never share a sketch.'''
+
+        for key, otherSketch in otherKey2sketch.items():
+            sketch = key2sketch.get(key)
+            if sketch is None:
+                key2sketch[key] = otherSketch.copy()
+            else:
+                sketch.merge(otherSketch)
+
+
+    def toDict(self):
+        '''Returns a JSON-serializable dict holding the statistics of this batch (but not its timestamps).'''
+
+        return {'numHits': self.numHits, 'numBadLines': self.numBadLines, 'responseBytesTot': self.responseBytesTot,
+                'section2count': self.section2count, 'retCode2count': self.retCode2count, 'method2count': self.method2count,
+                'clients': self.clients.toDict(),
+                'section2clients': {section: sketch.toDict() for section, sketch in self.section2clients.items()},
+                'responseBytes': self.responseBytes.toDict(),
+                'section2responseBytes': {section: sketch.toDict() for section, sketch in self.section2responseBytes.items()}}
+
+
+    @staticmethod
+    def fromDict(dct):
+        '''Returns a StatsBatch holding the statistics in the passed dict, as returned by "toDict()".'''
+
+        batch = StatsBatch()
+        batch.numHits, batch.numBadLines, batch.responseBytesTot = dct['numHits'], dct['numBadLines'], dct['responseBytesTot']
+        batch.section2count.update(dct['section2count'])
+        batch.retCode2count.update(dct['retCode2count'])
+        batch.method2count.update(dct['method2count'])
+        # Checkpoints written by older versions do not have all sketches.
+        if 'clients' in dct:
+            batch.clients = HyperLogLog.fromDict(dct['clients'])
+            batch.clientSketchPrecision = batch.clients.precision
+            batch.section2clients = {section: HyperLogLog.fromDict(sketch) for section, sketch in dct['section2clients'].items()}
+        if 'responseBytes' in dct:
+            batch.responseBytes = DDSketch.fromDict(dct['responseBytes'])
+            batch.section2responseBytes = {section: DDSketch.fromDict(sketch) for section, sketch in dct['section2responseBytes'].items()}
+        return batch